@@ -0,0 +1,714 @@
+#!/usr/bin/env python3
+"""
+Stand-in org.bluez and org.freedesktop.NetworkManager services for the benchmarks
+
+Only the objects, methods, properties and signals used by wfbt and python-networkmanager
+are implemented. Introspection data is generated with argument names since
+python-networkmanager builds its proxies from it.
+"""
+import argparse
+import itertools
+import logging
+import uuid
+from xml.sax.saxutils import quoteattr
+import dbus
+import dbus.mainloop.glib
+import dbus.service
+from gi.repository import GLib
+
+logger = logging.getLogger('wfbt-mock')
+
+NM_SERVICE_NAME = 'org.freedesktop.NetworkManager'
+NM_PATH = '/org/freedesktop/NetworkManager'
+NM_IFACE = 'org.freedesktop.NetworkManager'
+NM_SETTINGS_PATH = '/org/freedesktop/NetworkManager/Settings'
+NM_SETTINGS_IFACE = 'org.freedesktop.NetworkManager.Settings'
+NM_CONNECTION_IFACE = 'org.freedesktop.NetworkManager.Settings.Connection'
+NM_ACTIVE_CONNECTION_IFACE = 'org.freedesktop.NetworkManager.Connection.Active'
+NM_DEVICE_IFACE = 'org.freedesktop.NetworkManager.Device'
+NM_WIRELESS_IFACE = 'org.freedesktop.NetworkManager.Device.Wireless'
+NM_WIRED_IFACE = 'org.freedesktop.NetworkManager.Device.Wired'
+NM_ACCESS_POINT_IFACE = 'org.freedesktop.NetworkManager.AccessPoint'
+BLUEZ_SERVICE_NAME = 'org.bluez'
+MOCK_IFACE = 'org.wfbt.Mock'
+DBUS_PROP_IFACE = 'org.freedesktop.DBus.Properties'
+DBUS_OM_IFACE = 'org.freedesktop.DBus.ObjectManager'
+INTROSPECTABLE_IFACE = 'org.freedesktop.DBus.Introspectable'
+
+# NM enums
+NM_STATE_CONNECTED_SITE = 60
+NM_STATE_CONNECTED_GLOBAL = 70
+NM_CONNECTIVITY_FULL = 4
+NM_DEVICE_TYPE_ETHERNET = 1
+NM_DEVICE_TYPE_WIFI = 2
+NM_DEVICE_STATE_DISCONNECTED = 30
+NM_DEVICE_STATE_PREPARE = 40
+NM_DEVICE_STATE_ACTIVATED = 100
+NM_DEVICE_STATE_FAILED = 120
+NM_ACTIVE_CONNECTION_STATE_ACTIVATING = 1
+NM_ACTIVE_CONNECTION_STATE_ACTIVATED = 2
+NM_ACTIVE_CONNECTION_STATE_DEACTIVATED = 4
+NM_ACTIVE_CONNECTION_STATE_REASON_NO_SECRETS = 9
+
+WRONG_PSK = 'wrong-password'
+ACTIVATION_STEP_MS = 20
+
+
+class MockObject(dbus.service.Object):
+    """
+    Exported object with properties and generated introspection data
+
+    `INTERFACES` maps interface names to their methods as (in args, out args),
+    their signals as args and their properties as signatures
+    """
+    INTERFACES = {}
+
+    def __init__(self, bus, path, properties=None):
+        self.path = path
+        self.properties = properties or {}
+        dbus.service.Object.__init__(self, bus, path)
+
+    @dbus.service.method(INTROSPECTABLE_IFACE, out_signature='s')
+    def Introspect(self):  # pylint: disable=arguments-differ
+        """
+        Introspect
+        """
+        xml = ['<node>']
+        for interface, members in self.INTERFACES.items():
+            xml.append(f'<interface name={quoteattr(interface)}>')
+            for name, (in_args, out_args) in members.get('methods', {}).items():
+                xml.append(f'<method name={quoteattr(name)}>')
+                xml.extend(f'<arg name={quoteattr(arg)} type={quoteattr(sig)} direction="in"/>' for arg, sig in in_args)
+                xml.extend(f'<arg name={quoteattr(arg)} type={quoteattr(sig)} direction="out"/>' for arg, sig in out_args)
+                xml.append('</method>')
+            for name, args in members.get('signals', {}).items():
+                xml.append(f'<signal name={quoteattr(name)}>')
+                xml.extend(f'<arg name={quoteattr(arg)} type={quoteattr(sig)}/>' for arg, sig in args)
+                xml.append('</signal>')
+            for name, sig in members.get('properties', {}).items():
+                xml.append(f'<property name={quoteattr(name)} type={quoteattr(sig)} access="readwrite"/>')
+            xml.append('</interface>')
+        xml.append('</node>')
+        return ''.join(xml)
+
+    @dbus.service.method(DBUS_PROP_IFACE, in_signature='ss', out_signature='v')
+    def Get(self, interface, name):
+        """
+        Get property
+        """
+        return self.properties[interface][name]
+
+    @dbus.service.method(DBUS_PROP_IFACE, in_signature='s', out_signature='a{sv}')
+    def GetAll(self, interface):
+        """
+        Get all properties
+        """
+        return self.properties.get(interface, {})
+
+    @dbus.service.method(DBUS_PROP_IFACE, in_signature='ssv')
+    def Set(self, interface, name, value):
+        """
+        Set property
+        """
+        self.set_properties(interface, {name: value})
+
+    @dbus.service.signal(DBUS_PROP_IFACE, signature='sa{sv}as')
+    def PropertiesChanged(self, _interface, _changed, _invalidated):
+        """
+        Properties changed
+        """
+
+    def set_properties(self, interface, changed: dict):
+        """
+        Update properties and emit `PropertiesChanged`
+        """
+        self.properties.setdefault(interface, {}).update(changed)
+        self.PropertiesChanged(interface, changed, [])
+
+
+class MockAccessPoint(MockObject):
+    """
+    org.freedesktop.NetworkManager.AccessPoint
+    """
+    INTERFACES = {
+        NM_ACCESS_POINT_IFACE: {
+            'properties': {'Ssid': 'ay', 'Strength': 'y', 'Flags': 'u', 'WpaFlags': 'u', 'RsnFlags': 'u'},
+        },
+    }
+
+    def __init__(self, bus, path, ssid: str, strength: int):  # pylint: disable=too-many-arguments
+        MockObject.__init__(self, bus, path, {
+            NM_ACCESS_POINT_IFACE: {
+                'Ssid': dbus.ByteArray(ssid.encode()),
+                'Strength': dbus.Byte(strength),
+                'Flags': dbus.UInt32(1),
+                'WpaFlags': dbus.UInt32(0),
+                'RsnFlags': dbus.UInt32(0x188),
+            },
+        })
+
+
+class MockConnection(MockObject):
+    """
+    org.freedesktop.NetworkManager.Settings.Connection
+    """
+    INTERFACES = {
+        NM_CONNECTION_IFACE: {
+            'methods': {
+                'GetSettings': ([], [('settings', 'a{sa{sv}}')]),
+                'GetSecrets': ([('setting_name', 's')], [('secrets', 'a{sa{sv}}')]),
+                'Update': ([('properties', 'a{sa{sv}}')], []),
+                'Delete': ([], []),
+            },
+            'signals': {'Updated': [], 'Removed': []},
+        },
+    }
+
+    def __init__(self, bus, path, nm, settings):
+        MockObject.__init__(self, bus, path)
+        self.nm = nm
+        self.settings = {}
+        self.store(settings)
+
+    def store(self, settings):
+        """
+        Store settings, secrets are kept apart like NM does
+        """
+        settings = {key: dict(value) for key, value in settings.items()}
+        for ip_key in ['ipv4', 'ipv6']:
+            ip_settings = settings.setdefault(ip_key, {'method': 'auto'})
+            for key, signature in [('addresses', 'au' if ip_key == 'ipv4' else '(ayuay)'),
+                                   ('routes', 'au' if ip_key == 'ipv4' else '(ayuayu)'),
+                                   ('dns', 'u' if ip_key == 'ipv4' else 'ay')]:
+                ip_settings.setdefault(key, dbus.Array([], signature=signature))
+        self.settings = settings
+
+    def get_ssid(self):
+        """
+        Get SSID as text
+        """
+        return bytes(self.settings.get('802-11-wireless', {}).get('ssid', b'')).decode()
+
+    def get_psk(self):
+        """
+        Get pre-shared key
+        """
+        return self.settings.get('802-11-wireless-security', {}).get('psk')
+
+    @dbus.service.method(NM_CONNECTION_IFACE, out_signature='a{sa{sv}}')
+    def GetSettings(self):
+        """
+        Get settings without secrets
+        """
+        return {key: {name: value for name, value in values.items() if name != 'psk'}
+                for key, values in self.settings.items()}
+
+    @dbus.service.method(NM_CONNECTION_IFACE, in_signature='s', out_signature='a{sa{sv}}')
+    def GetSecrets(self, setting_name):
+        """
+        Get secrets
+        """
+        psk = self.get_psk()
+        return {setting_name: {'psk': psk} if psk is not None else {}}
+
+    @dbus.service.method(NM_CONNECTION_IFACE, in_signature='a{sa{sv}}')
+    def Update(self, properties):
+        """
+        Update settings
+        """
+        self.store(properties)
+        self.Updated()
+
+    @dbus.service.method(NM_CONNECTION_IFACE)
+    def Delete(self):
+        """
+        Delete connection
+        """
+        self.Removed()
+        self.nm.settings.remove_connection(self)
+
+    @dbus.service.signal(NM_CONNECTION_IFACE)
+    def Updated(self):
+        """
+        Updated
+        """
+
+    @dbus.service.signal(NM_CONNECTION_IFACE)
+    def Removed(self):
+        """
+        Removed
+        """
+
+
+class MockActiveConnection(MockObject):
+    """
+    org.freedesktop.NetworkManager.Connection.Active
+    """
+    INTERFACES = {
+        NM_ACTIVE_CONNECTION_IFACE: {
+            'signals': {'StateChanged': [('state', 'u'), ('reason', 'u')]},
+            'properties': {'State': 'u', 'Connection': 'o', 'Vpn': 'b', 'Uuid': 's', 'Id': 's', 'Type': 's'},
+        },
+    }
+
+    def __init__(self, bus, path, connection):
+        MockObject.__init__(self, bus, path, {
+            NM_ACTIVE_CONNECTION_IFACE: {
+                'State': dbus.UInt32(NM_ACTIVE_CONNECTION_STATE_ACTIVATING),
+                'Connection': dbus.ObjectPath(connection.path),
+                'Vpn': dbus.Boolean(False),
+                'Uuid': connection.settings['connection']['uuid'],
+                'Id': connection.settings['connection']['id'],
+                'Type': connection.settings['connection']['type'],
+            },
+        })
+
+    def set_state(self, state: int, reason: int = 0):
+        """
+        Change state and emit `StateChanged`
+        """
+        self.set_properties(NM_ACTIVE_CONNECTION_IFACE, {'State': dbus.UInt32(state)})
+        self.StateChanged(dbus.UInt32(state), dbus.UInt32(reason))
+
+    @dbus.service.signal(NM_ACTIVE_CONNECTION_IFACE, signature='uu')
+    def StateChanged(self, _state, _reason):
+        """
+        State changed
+        """
+
+
+class MockDevice(MockObject):
+    """
+    org.freedesktop.NetworkManager.Device, with Device.Wireless for wifi devices
+    """
+    INTERFACES = {
+        NM_DEVICE_IFACE: {
+            'signals': {'StateChanged': [('new_state', 'u'), ('old_state', 'u'), ('reason', 'u')]},
+            'properties': {'DeviceType': 'u', 'Interface': 's', 'IpInterface': 's', 'State': 'u',
+                           'StateReason': '(uu)', 'ActiveConnection': 'o'},
+        },
+        NM_WIRELESS_IFACE: {
+            'methods': {
+                'GetAllAccessPoints': ([], [('access_points', 'ao')]),
+                'RequestScan': ([('options', 'a{sv}')], []),
+            },
+            'properties': {'LastScan': 'x', 'AccessPoints': 'ao'},
+        },
+        NM_WIRED_IFACE: {},
+    }
+
+    def __init__(self, bus, path, device_type: int, interface: str):  # pylint: disable=too-many-arguments
+        MockObject.__init__(self, bus, path, {
+            NM_DEVICE_IFACE: {
+                'DeviceType': dbus.UInt32(device_type),
+                'Interface': interface,
+                'IpInterface': interface,
+                'State': dbus.UInt32(NM_DEVICE_STATE_DISCONNECTED),
+                'StateReason': dbus.Struct((dbus.UInt32(NM_DEVICE_STATE_DISCONNECTED), dbus.UInt32(0)), signature='uu'),
+                'ActiveConnection': dbus.ObjectPath('/'),
+            },
+            NM_WIRELESS_IFACE: {
+                'LastScan': dbus.Int64(0),
+                'AccessPoints': dbus.Array([], signature='o'),
+            },
+        })
+        self.access_points = []
+
+    def set_state(self, state: int, reason: int = 0):
+        """
+        Change state and emit `StateChanged`
+        """
+        old_state = self.properties[NM_DEVICE_IFACE]['State']
+        self.set_properties(NM_DEVICE_IFACE, {
+            'State': dbus.UInt32(state),
+            'StateReason': dbus.Struct((dbus.UInt32(state), dbus.UInt32(reason)), signature='uu'),
+        })
+        self.StateChanged(dbus.UInt32(state), old_state, dbus.UInt32(reason))
+
+    @dbus.service.signal(NM_DEVICE_IFACE, signature='uuu')
+    def StateChanged(self, _new_state, _old_state, _reason):
+        """
+        State changed
+        """
+
+    @dbus.service.method(NM_WIRELESS_IFACE, out_signature='ao')
+    def GetAllAccessPoints(self):
+        """
+        Get all access points
+        """
+        return dbus.Array([dbus.ObjectPath(ap.path) for ap in self.access_points], signature='o')
+
+    @dbus.service.method(NM_WIRELESS_IFACE, in_signature='a{sv}')
+    def RequestScan(self, _options):
+        """
+        Request scan, completes after a short delay
+        """
+        def complete():
+            self.set_properties(NM_WIRELESS_IFACE, {'LastScan': dbus.Int64(GLib.get_monotonic_time() // 1000)})
+            return False
+        GLib.timeout_add(ACTIVATION_STEP_MS, complete)
+
+
+class MockSettings(MockObject):
+    """
+    org.freedesktop.NetworkManager.Settings
+    """
+    INTERFACES = {
+        NM_SETTINGS_IFACE: {
+            'methods': {
+                'ListConnections': ([], [('connections', 'ao')]),
+                'AddConnection': ([('connection', 'a{sa{sv}}')], [('path', 'o')]),
+                'GetConnectionByUuid': ([('uuid', 's')], [('connection', 'o')]),
+            },
+            'signals': {'NewConnection': [('connection', 'o')], 'ConnectionRemoved': [('connection', 'o')]},
+        },
+    }
+
+    def __init__(self, bus, nm):
+        MockObject.__init__(self, bus, NM_SETTINGS_PATH)
+        self.bus = bus
+        self.nm = nm
+        self.connections = []
+        self.ids = itertools.count(1)
+
+    def add_connection(self, settings):
+        """
+        Add connection and emit `NewConnection`
+        """
+        connection = MockConnection(self.bus, f'{NM_SETTINGS_PATH}/{next(self.ids)}', self.nm, settings)
+        self.connections.append(connection)
+        self.NewConnection(dbus.ObjectPath(connection.path))
+        return connection
+
+    def remove_connection(self, connection):
+        """
+        Remove connection and emit `ConnectionRemoved`
+        """
+        self.connections.remove(connection)
+        connection.remove_from_connection()
+        self.ConnectionRemoved(dbus.ObjectPath(connection.path))
+
+    def get_connection(self, path: str):
+        """
+        Get connection by path
+        """
+        return next(conn for conn in self.connections if conn.path == path)
+
+    @dbus.service.method(NM_SETTINGS_IFACE, out_signature='ao')
+    def ListConnections(self):
+        """
+        List connections
+        """
+        return dbus.Array([dbus.ObjectPath(conn.path) for conn in self.connections], signature='o')
+
+    @dbus.service.method(NM_SETTINGS_IFACE, in_signature='a{sa{sv}}', out_signature='o')
+    def AddConnection(self, connection):
+        """
+        Add connection
+        """
+        return dbus.ObjectPath(self.add_connection(connection).path)
+
+    @dbus.service.method(NM_SETTINGS_IFACE, in_signature='s', out_signature='o')
+    def GetConnectionByUuid(self, uuid_):
+        """
+        Get connection by UUID
+        """
+        for conn in self.connections:
+            if conn.settings['connection']['uuid'] == uuid_:
+                return dbus.ObjectPath(conn.path)
+        raise dbus.exceptions.DBusException('No connection', name='org.freedesktop.NetworkManager.Settings.InvalidConnection')
+
+    @dbus.service.signal(NM_SETTINGS_IFACE, signature='o')
+    def NewConnection(self, _connection):
+        """
+        New connection
+        """
+
+    @dbus.service.signal(NM_SETTINGS_IFACE, signature='o')
+    def ConnectionRemoved(self, _connection):
+        """
+        Connection removed
+        """
+
+
+class MockNetworkManager(MockObject):
+    """
+    org.freedesktop.NetworkManager with a mock control interface
+    """
+    INTERFACES = {
+        NM_IFACE: {
+            'methods': {
+                'GetDevices': ([], [('devices', 'ao')]),
+                'GetAllDevices': ([], [('devices', 'ao')]),
+                'ActivateConnection': ([('connection', 'o'), ('device', 'o'), ('specific_object', 'o')],
+                                       [('active_connection', 'o')]),
+                'AddAndActivateConnection': ([('connection', 'a{sa{sv}}'), ('device', 'o'), ('specific_object', 'o')],
+                                             [('path', 'o'), ('active_connection', 'o')]),
+            },
+            'signals': {'StateChanged': [('state', 'u')], 'DeviceAdded': [('device_path', 'o')],
+                        'DeviceRemoved': [('device_path', 'o')]},
+            'properties': {'WirelessEnabled': 'b', 'NetworkingEnabled': 'b', 'Connectivity': 'u', 'State': 'u',
+                           'Version': 's', 'Devices': 'ao', 'AllDevices': 'ao', 'ActiveConnections': 'ao'},
+        },
+        MOCK_IFACE: {
+            'methods': {'SetState': ([('state', 'u')], [])},
+        },
+    }
+
+    def __init__(self, bus, access_points: int, connections: int):
+        MockObject.__init__(self, bus, NM_PATH, {
+            NM_IFACE: {
+                'WirelessEnabled': dbus.Boolean(True),
+                'NetworkingEnabled': dbus.Boolean(True),
+                'Connectivity': dbus.UInt32(NM_CONNECTIVITY_FULL),
+                'State': dbus.UInt32(NM_STATE_CONNECTED_GLOBAL),
+                'Version': '1.30.0',
+                'ActiveConnections': dbus.Array([], signature='o'),
+            },
+        })
+        self.bus = bus
+        self.active_ids = itertools.count(1)
+        self.devices = [
+            MockDevice(bus, f'{NM_PATH}/Devices/1', NM_DEVICE_TYPE_ETHERNET, 'eth0'),
+            MockDevice(bus, f'{NM_PATH}/Devices/2', NM_DEVICE_TYPE_WIFI, 'wlan0'),
+        ]
+        device_paths = dbus.Array([dbus.ObjectPath(device.path) for device in self.devices], signature='o')
+        self.properties[NM_IFACE]['Devices'] = device_paths
+        self.properties[NM_IFACE]['AllDevices'] = device_paths
+
+        wifi = self.devices[1]
+        wifi.access_points = [MockAccessPoint(bus, f'{NM_PATH}/AccessPoint/{idx}', f'network-{idx % 16}', 20 + idx % 80)
+                              for idx in range(access_points)]
+
+        # python-networkmanager introspects these objects on import
+        MockObject(bus, f'{NM_PATH}/Statistics')
+        MockObject(bus, f'{NM_PATH}/AgentManager')
+
+        self.settings = MockSettings(bus, self)
+        for idx in range(connections):
+            self.settings.add_connection(self.wireless_settings(f'saved-{idx}', 'saved-password'))
+
+    @staticmethod
+    def wireless_settings(ssid: str, psk: str):
+        """
+        Build wireless connection settings
+        """
+        return {
+            'connection': {'id': ssid, 'type': '802-11-wireless', 'uuid': str(uuid.uuid4())},
+            '802-11-wireless': {'ssid': dbus.ByteArray(ssid.encode())},
+            '802-11-wireless-security': {'key-mgmt': 'wpa-psk', 'psk': psk},
+        }
+
+    def get_device(self, path: str):
+        """
+        Get device by path
+        """
+        return next(device for device in self.devices if device.path == path)
+
+    def activate(self, connection, device):
+        """
+        Activate connection on device, wrong pre-shared keys fail with no secrets
+        """
+        active = MockActiveConnection(self.bus, f'{NM_PATH}/ActiveConnection/{next(self.active_ids)}', connection)
+        device.set_properties(NM_DEVICE_IFACE, {'ActiveConnection': dbus.ObjectPath(active.path)})
+        device.set_state(NM_DEVICE_STATE_PREPARE)
+
+        def complete():
+            if connection.get_psk() == WRONG_PSK:
+                active.set_state(NM_ACTIVE_CONNECTION_STATE_DEACTIVATED, NM_ACTIVE_CONNECTION_STATE_REASON_NO_SECRETS)
+                device.set_state(NM_DEVICE_STATE_FAILED, 7)
+            else:
+                active.set_state(NM_ACTIVE_CONNECTION_STATE_ACTIVATED)
+                device.set_state(NM_DEVICE_STATE_ACTIVATED)
+            return False
+        GLib.timeout_add(ACTIVATION_STEP_MS, complete)
+        return dbus.ObjectPath(active.path)
+
+    @dbus.service.method(NM_IFACE, out_signature='ao')
+    def GetDevices(self):
+        """
+        Get devices
+        """
+        return self.properties[NM_IFACE]['Devices']
+
+    @dbus.service.method(NM_IFACE, out_signature='ao')
+    def GetAllDevices(self):
+        """
+        Get all devices
+        """
+        return self.properties[NM_IFACE]['AllDevices']
+
+    @dbus.service.method(NM_IFACE, in_signature='ooo', out_signature='o')
+    def ActivateConnection(self, connection, device, _specific_object):
+        """
+        Activate connection
+        """
+        return self.activate(self.settings.get_connection(str(connection)), self.get_device(str(device)))
+
+    @dbus.service.method(NM_IFACE, in_signature='a{sa{sv}}oo', out_signature='oo')
+    def AddAndActivateConnection(self, connection, device, _specific_object):
+        """
+        Add and activate connection
+        """
+        conn = self.settings.add_connection(connection)
+        return dbus.ObjectPath(conn.path), self.activate(conn, self.get_device(str(device)))
+
+    @dbus.service.signal(NM_IFACE, signature='u')
+    def StateChanged(self, _state):
+        """
+        State changed
+        """
+
+    @dbus.service.method(MOCK_IFACE, in_signature='u')
+    def SetState(self, state):
+        """
+        Change network manager state
+        """
+        self.set_properties(NM_IFACE, {'State': dbus.UInt32(state)})
+        self.StateChanged(dbus.UInt32(state))
+
+
+class MockBluez(MockObject):
+    """
+    org.bluez root objects: object manager, agent manager and a mock control interface
+    """
+    INTERFACES = {
+        DBUS_OM_IFACE: {'methods': {'GetManagedObjects': ([], [('objects', 'a{oa{sa{sv}}}')])}},
+        MOCK_IFACE: {
+            'methods': {'GetApplications': ([], [('applications', 'a(so)')])},
+        },
+    }
+
+    def __init__(self, bus, adapters: int):
+        MockObject.__init__(self, bus, '/')
+        self.agent_manager = MockAgentManager(bus, '/org/bluez')
+        self.adapters = [MockAdapter(bus, f'/org/bluez/hci{idx}') for idx in range(adapters)]
+
+    @dbus.service.method(DBUS_OM_IFACE, out_signature='a{oa{sa{sv}}}')
+    def GetManagedObjects(self):
+        """
+        Get managed objects
+        """
+        return {dbus.ObjectPath(adapter.path): {
+            'org.bluez.Adapter1': adapter.properties['org.bluez.Adapter1'],
+            'org.bluez.GattManager1': {},
+            'org.bluez.LEAdvertisingManager1': {},
+        } for adapter in self.adapters}
+
+    @dbus.service.method(MOCK_IFACE, out_signature='a(so)')
+    def GetApplications(self):
+        """
+        Get registered GATT applications as (owner, path)
+        """
+        return dbus.Array([app for adapter in self.adapters for app in adapter.applications], signature='(so)')
+
+
+class MockAgentManager(MockObject):
+    """
+    org.bluez.AgentManager1
+    """
+    INTERFACES = {
+        'org.bluez.AgentManager1': {
+            'methods': {
+                'RegisterAgent': ([('agent', 'o'), ('capability', 's')], []),
+                'RequestDefaultAgent': ([('agent', 'o')], []),
+            },
+        },
+    }
+
+    @dbus.service.method('org.bluez.AgentManager1', in_signature='os')
+    def RegisterAgent(self, _agent, _capability):
+        """
+        Register agent
+        """
+
+    @dbus.service.method('org.bluez.AgentManager1', in_signature='o')
+    def RequestDefaultAgent(self, _agent):
+        """
+        Request default agent
+        """
+
+
+class MockAdapter(MockObject):
+    """
+    org.bluez.Adapter1, GattManager1 and LEAdvertisingManager1
+    """
+    INTERFACES = {
+        'org.bluez.Adapter1': {'properties': {'Powered': 'b', 'Discoverable': 'b', 'Pairable': 'b', 'Alias': 's'}},
+        'org.bluez.GattManager1': {'methods': {'RegisterApplication': ([('application', 'o'), ('options', 'a{sv}')], [])}},
+        'org.bluez.LEAdvertisingManager1': {
+            'methods': {
+                'RegisterAdvertisement': ([('advertisement', 'o'), ('options', 'a{sv}')], []),
+                'UnregisterAdvertisement': ([('advertisement', 'o')], []),
+            },
+        },
+    }
+
+    def __init__(self, bus, path):
+        MockObject.__init__(self, bus, path, {
+            'org.bluez.Adapter1': {
+                'Powered': dbus.Boolean(False),
+                'Discoverable': dbus.Boolean(False),
+                'Pairable': dbus.Boolean(False),
+                'Alias': path.split('/')[-1],
+            },
+        })
+        self.bus = bus
+        self.applications = []
+
+    @dbus.service.method('org.bluez.GattManager1', in_signature='oa{sv}', sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def RegisterApplication(self, application, _options, sender=None, reply_handler=None, error_handler=None):  # pylint: disable=too-many-arguments
+        """
+        Register application, its objects are fetched like bluetoothd does
+        """
+        def on_objects(_objects):
+            self.applications.append((sender, application))
+            reply_handler()
+
+        self.bus.get_object(sender, application).GetManagedObjects(
+            dbus_interface=DBUS_OM_IFACE, reply_handler=on_objects, error_handler=error_handler)
+
+    @dbus.service.method('org.bluez.LEAdvertisingManager1', in_signature='oa{sv}', sender_keyword='sender',
+                         async_callbacks=('reply_handler', 'error_handler'))
+    def RegisterAdvertisement(self, advertisement, _options, sender=None, reply_handler=None, error_handler=None):  # pylint: disable=too-many-arguments
+        """
+        Register advertisement, its properties are fetched like bluetoothd does
+        """
+        self.bus.get_object(sender, advertisement).GetAll(
+            'org.bluez.LEAdvertisement1', dbus_interface=DBUS_PROP_IFACE,
+            reply_handler=lambda _props: reply_handler(), error_handler=error_handler)
+
+    @dbus.service.method('org.bluez.LEAdvertisingManager1', in_signature='o')
+    def UnregisterAdvertisement(self, _advertisement):
+        """
+        Unregister advertisement
+        """
+
+
+def main():
+    """
+    Start mock services on the system bus given by DBUS_SYSTEM_BUS_ADDRESS
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--adapters', type=int, default=1)
+    parser.add_argument('--access-points', type=int, default=32)
+    parser.add_argument('--connections', type=int, default=16)
+    args = parser.parse_args()
+
+    dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+    bus = dbus.SystemBus()
+
+    # objects are exported before the names are requested so clients never see a partial service
+    _nm = MockNetworkManager(bus, args.access_points, args.connections)
+    nm_name = dbus.service.BusName(NM_SERVICE_NAME, bus)
+    _bluez = MockBluez(bus, args.adapters)
+    bluez_name = dbus.service.BusName(BLUEZ_SERVICE_NAME, bus)
+
+    logger.info('mock services ready')
+    GLib.MainLoop().run()
+    del nm_name, bluez_name
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Benchmark wfbt against a private dbus-daemon with mock BlueZ and NetworkManager services
+
+The daemon is started from `main.py` with DBUS_SYSTEM_BUS_ADDRESS pointing to the private bus,
+latency percentiles are measured from a client on the same bus and stored as JSON.
+
+    python3 bench/run.py --output bench/results/current.json
+    python3 bench/run.py --compare bench/results/before.json bench/results/current.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import dbus
+import dbus.mainloop.glib
+from gi.repository import GLib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ble import protocol  # pylint: disable=wrong-import-position
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MOCK_SERVICES = os.path.join(ROOT, 'bench', 'mock_services.py')
+MAIN = os.path.join(ROOT, 'main.py')
+
+GATT_CHRC_IFACE = 'org.bluez.GattCharacteristic1'
+GATT_DESC_IFACE = 'org.bluez.GattDescriptor1'
+DBUS_OM_IFACE = 'org.freedesktop.DBus.ObjectManager'
+DBUS_PROP_IFACE = 'org.freedesktop.DBus.Properties'
+MOCK_IFACE = 'org.wfbt.Mock'
+
+NM_STATE_CHRC_UUID = '22345678-1234-5678-1234-56781abcdee2'
+CONFIGURATION_CHRC_UUID = '97345678-1234-5678-1234-56781abddee2'
+PROVISIONING_STATUS_CHRC_UUID = '62345678-1234-5678-1234-56781abcdee2'
+
+PROVISIONING_EVENT_ACTIVATION = 0x03
+ACTIVE_CONNECTION_STATE_ACTIVATED = 2
+NM_STATES = [60, 70]
+
+
+def percentiles(samples: list) -> dict:
+    """
+    Summarize samples in milliseconds
+    """
+    ordered = sorted(samples)
+
+    def rank(fraction):
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+    return {
+        'count': len(ordered),
+        'mean': statistics.mean(ordered),
+        'p50': rank(0.5),
+        'p90': rank(0.9),
+        'p99': rank(0.99),
+        'max': ordered[-1],
+    }
+
+
+def timed(samples: list, func, *args, **kwargs):
+    """
+    Call func and append its duration in milliseconds to samples
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    samples.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def wait_until(predicate, timeout: float):
+    """
+    Iterate the main loop until predicate is true, return False on timeout
+    """
+    context = GLib.MainContext.default()
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        context.iteration(False) or time.sleep(0.0005)  # pylint: disable=expression-not-assigned
+    return True
+
+
+def git_revision():
+    """
+    Get current git revision
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class Benchmark:
+    """
+    Start the private bus, the mock services and the daemon, then measure
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.processes = []
+        self.bus = None
+        self.owner = None
+        self.objects = {}
+
+    def start(self):
+        """
+        Start private bus, mock services and daemon
+        The processes outlive this method so they are not managed by `with`, `stop` terminates them
+        """
+        daemon = subprocess.Popen(['dbus-daemon', '--session', '--nofork', '--print-address=1'],  # pylint: disable=consider-using-with
+                                  stdout=subprocess.PIPE, text=True)
+        self.processes.append(daemon)
+        address = daemon.stdout.readline().strip()
+        env = dict(os.environ, DBUS_SYSTEM_BUS_ADDRESS=address)
+
+        dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+        os.environ['DBUS_SYSTEM_BUS_ADDRESS'] = address
+        self.bus = dbus.SystemBus()
+
+        self.processes.append(subprocess.Popen([sys.executable, MOCK_SERVICES,  # pylint: disable=consider-using-with
+                                                '--adapters', str(self.args.adapters),
+                                                '--access-points', str(self.args.access_points),
+                                                '--connections', str(self.args.connections)], env=env))
+        if not wait_until(lambda: self.bus.name_has_owner('org.bluez') and
+                          self.bus.name_has_owner('org.freedesktop.NetworkManager'), 10):
+            raise RuntimeError('mock services did not start')
+
+        startup_start = time.perf_counter()
+        self.processes.append(subprocess.Popen([sys.executable, MAIN], env=env, cwd=ROOT))  # pylint: disable=consider-using-with
+        mock = dbus.Interface(self.bus.get_object('org.bluez', '/'), MOCK_IFACE)
+        if not wait_until(lambda: len(mock.GetApplications()) >= self.args.adapters, 30):
+            raise RuntimeError('GATT application was not registered')
+        startup_ms = (time.perf_counter() - startup_start) * 1000
+
+        self.owner, app_path = mock.GetApplications()[0]
+        app = dbus.Interface(self.bus.get_object(self.owner, app_path), DBUS_OM_IFACE)
+        self.objects = app.GetManagedObjects()
+        return startup_ms
+
+    def stop(self):
+        """
+        Stop all processes
+        """
+        for process in reversed(self.processes):
+            process.terminate()
+            process.wait()
+            if process.stdout is not None:
+                process.stdout.close()
+
+    def find_path(self, uuid: str):
+        """
+        Find characteristic path by UUID
+        """
+        return next(path for path, interfaces in self.objects.items()
+                    if interfaces.get(GATT_CHRC_IFACE, {}).get('UUID') == uuid)
+
+    def measure_reads(self, results: dict):
+        """
+        ReadValue latency of every readable characteristic and descriptor
+        """
+        for path, interfaces in sorted(self.objects.items()):
+            for interface in [GATT_CHRC_IFACE, GATT_DESC_IFACE]:
+                if 'read' not in interfaces.get(interface, {}).get('Flags', []):
+                    continue
+                proxy = dbus.Interface(self.bus.get_object(self.owner, path, introspect=False), interface)
+                samples = []
+                for _ in range(self.args.iterations):
+                    timed(samples, proxy.ReadValue, dbus.Dictionary({}, signature='sv'))
+                results[f'ReadValue {path}'] = percentiles(samples)
+
+    def measure_managed_objects(self, results: dict):
+        """
+        GetManagedObjects latency
+        """
+        mock = dbus.Interface(self.bus.get_object('org.bluez', '/'), MOCK_IFACE)
+        _owner, app_path = mock.GetApplications()[0]
+        app = dbus.Interface(self.bus.get_object(self.owner, app_path, introspect=False), DBUS_OM_IFACE)
+        samples = []
+        for _ in range(self.args.iterations):
+            timed(samples, app.GetManagedObjects)
+        results['GetManagedObjects'] = percentiles(samples)
+
+    def measure_provisioning(self, results: dict):
+        """
+        Provisioning latency, from the configuration write to the activated status notification
+        """
+        status_path = self.find_path(PROVISIONING_STATUS_CHRC_UUID)
+        status = dbus.Interface(self.bus.get_object(self.owner, status_path, introspect=False), GATT_CHRC_IFACE)
+        configuration = dbus.Interface(self.bus.get_object(self.owner, self.find_path(CONFIGURATION_CHRC_UUID),
+                                                           introspect=False), GATT_CHRC_IFACE)
+        activated = []
+
+        def on_status(_interface, changed, _invalidated):
+            value = bytes(changed.get('Value', b''))
+            if len(value) >= 2 and value[0] == PROVISIONING_EVENT_ACTIVATION and value[1] == ACTIVE_CONNECTION_STATE_ACTIVATED:
+                activated.append(time.perf_counter())
+
+        match = self.bus.add_signal_receiver(on_status, signal_name='PropertiesChanged', dbus_interface=DBUS_PROP_IFACE,
+                                             bus_name=self.owner, path=status_path)
+        status.StartNotify()
+        write_samples = []
+        e2e_samples = []
+        for idx in range(self.args.iterations):
+            frame = protocol.encode_frame({'ssid': f'bench-{idx}', 'psk': 'bench-password'})
+            count = len(activated)
+            start = time.perf_counter()
+            timed(write_samples, configuration.WriteValue, dbus.ByteArray(frame),
+                  dbus.Dictionary({'offset': dbus.UInt16(0)}, signature='sv'))
+            if wait_until(lambda count=count: len(activated) > count, 10):
+                e2e_samples.append((activated[-1] - start) * 1000)
+        status.StopNotify()
+        match.remove()
+        results['WriteValue provisioning'] = percentiles(write_samples)
+        if e2e_samples:
+            results['Provisioning end-to-end'] = percentiles(e2e_samples)
+
+    def measure_notify(self, results: dict):
+        """
+        Notification latency, from a NM state change to the state characteristic notification
+        """
+        state_path = self.find_path(NM_STATE_CHRC_UUID)
+        state = dbus.Interface(self.bus.get_object(self.owner, state_path, introspect=False), GATT_CHRC_IFACE)
+        nm_mock = dbus.Interface(self.bus.get_object('org.freedesktop.NetworkManager',
+                                                     '/org/freedesktop/NetworkManager'), MOCK_IFACE)
+        received = []
+        match = self.bus.add_signal_receiver(lambda *_args: received.append(time.perf_counter()),
+                                             signal_name='PropertiesChanged', dbus_interface=DBUS_PROP_IFACE,
+                                             bus_name=self.owner, path=state_path)
+        state.StartNotify()
+        wait_until(lambda: False, 0.5)
+        samples = []
+        for idx in range(self.args.iterations):
+            count = len(received)
+            start = time.perf_counter()
+            nm_mock.SetState(dbus.UInt32(NM_STATES[idx % 2]))
+            if wait_until(lambda count=count: len(received) > count, 5):
+                samples.append((received[-1] - start) * 1000)
+        state.StopNotify()
+        match.remove()
+        if samples:
+            results['Notify NM state'] = percentiles(samples)
+
+    def run(self):
+        """
+        Run all measurements
+        """
+        results = {}
+        try:
+            results['Startup to GATT registration'] = percentiles([self.start()])
+            self.measure_managed_objects(results)
+            self.measure_reads(results)
+            self.measure_notify(results)
+            self.measure_provisioning(results)
+        finally:
+            self.stop()
+        return {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'iterations': self.args.iterations,
+            'results': results,
+        }
+
+
+def compare(before_file: str, after_file: str):
+    """
+    Print p50 and p99 differences between two result files
+    """
+    with open(before_file, encoding='utf-8') as file:
+        before = json.load(file)
+    with open(after_file, encoding='utf-8') as file:
+        after = json.load(file)
+
+    print(f"{'benchmark':<70} {'p50':>20} {'p99':>20}")
+    for name, stats in after['results'].items():
+        old = before['results'].get(name)
+        columns = []
+        for key in ['p50', 'p99']:
+            if old is None:
+                columns.append(f"{stats[key]:.3f}")
+            else:
+                delta = (stats[key] - old[key]) / old[key] * 100 if old[key] else 0
+                columns.append(f"{stats[key]:.3f} ({delta:+.1f}%)")
+        print(f"{name:<70} {columns[0]:>20} {columns[1]:>20}")
+
+
+def main():
+    """
+    Benchmark entry point
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--adapters', type=int, default=1)
+    parser.add_argument('--access-points', type=int, default=32)
+    parser.add_argument('--connections', type=int, default=16)
+    parser.add_argument('--output', help='result file, defaults to bench/results/<revision>.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = Benchmark(args).run()
+    output = args.output or os.path.join(ROOT, 'bench', 'results', f"{report['revision']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+
+    for name, stats in report['results'].items():
+        print(f"{name:<70} p50 {stats['p50']:8.3f} ms  p99 {stats['p99']:8.3f} ms")
+    print(f'results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
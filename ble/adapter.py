@@ -10,20 +10,20 @@ class Adapter:
     Adapter implementation
     """
 
-    def __init__(self, bus, alias=None, idx=0):
-        self.path = f'{ADAPTER_ROOT}{idx}'
+    def __init__(self, bus, alias=None, idx=0, path=None):
+        self.path = path or f'{ADAPTER_ROOT}{idx}'
         self.adapter_object = bus.get_object(BLUEZ_SERVICE_NAME, self.path)
         self.adapter_props = dbus.Interface(
             self.adapter_object, dbus.PROPERTIES_IFACE)
 
-        logger.info(f"Start configuration of interface: {self.path}")
+        logger.info('Start configuration of interface: %s', self.path)
 
         self.enable_adapter()
 
         if alias is not None:
-            self.adapter_props.Set(ADAPTER_IFACE, 'Alias', alias)
+            self.set_adapter_prop(ADAPTER_IFACE, 'Alias', alias)
 
-        logger.info(f"Adapater {self.get_adapter_name()} configured...")
+        logger.info('Adapater %s configured...', self.get_adapter_name())
 
     def get_adapter_name(self):
         """
@@ -41,7 +41,7 @@ class Adapter:
         """
         Enable adapter by turning it on, make it discoverable and pairable
         """
-        logger.info(f"enable adapter {self.path}")
+        logger.info('enable adapter %s', self.path)
         self.set_adapter_prop(ADAPTER_IFACE, "Powered", dbus.Boolean(1))
         self.set_adapter_prop(ADAPTER_IFACE, "Discoverable", dbus.Boolean(1))
         self.set_adapter_prop(ADAPTER_IFACE, "Pairable", dbus.Boolean(1))
@@ -51,7 +51,7 @@ class Adapter:
         Disable by stopping discoverable and pairable
         Optionally shutdown the device
         """
-        logger.info(f"disable adapter {self.path}")
+        logger.info('disable adapter %s', self.path)
         self.set_adapter_prop(ADAPTER_IFACE, "Discoverable", dbus.Boolean(0))
         self.set_adapter_prop(ADAPTER_IFACE, "Pairable", dbus.Boolean(0))
         if (shutdown):
@@ -59,11 +59,20 @@ class Adapter:
 
     def set_adapter_prop(self, adapter_iface, key, value):
         """
-        Set property on adapter
+        Set property on adapter without waiting for the reply,
+        BlueZ handles calls in order so the adapter is powered before later registrations
 
         :adapter_iface : Adapter interface name
         :key : property name
         :value : property value
         """
-        logger.debug(f"set adapter {adapter_iface} property {key} to value {value}")
-        self.adapter_props.Set(adapter_iface, key, value)
\ No newline at end of file
+        logger.debug('set adapter %s property %s to value %s', adapter_iface, key, value)
+        self.adapter_props.Set(adapter_iface, key, value,
+                               reply_handler=lambda: None,
+                               error_handler=lambda error: self.set_adapter_prop_error_cb(key, error))
+
+    def set_adapter_prop_error_cb(self, key, error):
+        """
+        Callback for adapter property error
+        """
+        logger.error('Failed to set adapter %s property %s: %s', self.path, key, error)
\ No newline at end of file
@@ -4,26 +4,130 @@ import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
-from .constants import BLUEZ_SERVICE_NAME, DBUS_OM_IFACE
+from .adapter import Adapter
+from .constants import BLUEZ_SERVICE_NAME, DBUS_OM_IFACE, ADAPTER_IFACE
 
 logger = logging.getLogger('wfbt')
 
 
-def find_adapter(bus, adapter_interface_name, adapter_name):
+def find_adapters(bus, adapter_interface_name=ADAPTER_IFACE):
     """
-    Find bluetooth adapter
+    Find every bluetooth adapter, sorted by path
     """
     remote_om = dbus.Interface(bus.get_object(
         BLUEZ_SERVICE_NAME, '/'), DBUS_OM_IFACE)
     objects = remote_om.GetManagedObjects()
 
+    adapters = []
     for o, props in objects.items():
-        # print('checking adapter %s, keys: %s' % (o, props.keys()))
-        logger.debug('checking adapter %s' % (o,))
+        logger.debug('checking adapter %s', o)
         if adapter_interface_name in props.keys():
-            logger.debug('found adapter %s' % (o,))
-            if '/' + adapter_name in o:
-                logger.debug('returning adapter %s' % (o,))
-                return o
+            logger.debug('found adapter %s', o)
+            adapters.append(str(o))
+
+    return sorted(adapters)
+
+
+def find_adapter(bus, adapter_interface_name, adapter_name):
+    """
+    Find bluetooth adapter
+    """
+    for o in find_adapters(bus, adapter_interface_name):
+        if '/' + adapter_name in o:
+            logger.debug('returning adapter %s', o)
+            return o
 
     return None
+
+
+class AdapterManager:
+    """
+    Every bluetooth adapter exposed by BlueZ
+
+    Adapters are enumerated once then added and removed from `InterfacesAdded` and `InterfacesRemoved` signals,
+    listeners are called for every configured adapter, including the ones plugged later, and with the path
+    of every removed adapter
+    """
+
+    def __init__(self, bus, alias=None):
+        self.bus = bus
+        self.alias = alias
+        self.adapters = {}
+        self.listeners = []
+        self.remove_listeners = []
+
+        bus.add_signal_receiver(self.on_interfaces_added,
+                                signal_name='InterfacesAdded',
+                                dbus_interface=DBUS_OM_IFACE,
+                                bus_name=BLUEZ_SERVICE_NAME)
+        bus.add_signal_receiver(self.on_interfaces_removed,
+                                signal_name='InterfacesRemoved',
+                                dbus_interface=DBUS_OM_IFACE,
+                                bus_name=BLUEZ_SERVICE_NAME)
+
+        for path in find_adapters(bus):
+            self.add_adapter(path)
+        if not self.adapters:
+            logger.warning('no bluetooth adapter found')
+
+    def add_adapter(self, path: str):
+        """
+        Configure adapter and call listeners
+        """
+        if path in self.adapters:
+            return
+        adapter = Adapter(self.bus, self.alias, path=path)
+        self.adapters[path] = adapter
+        for callback in self.listeners:
+            callback(adapter)
+
+    def remove_adapter(self, path: str):
+        """
+        Forget a removed adapter
+        """
+        if self.adapters.pop(path, None) is not None:
+            logger.info('adapter %s removed', path)
+            for callback in self.remove_listeners:
+                callback(path)
+
+    def add_listener(self, callback):
+        """
+        Register callback called with every configured adapter
+        """
+        self.listeners.append(callback)
+        for adapter in list(self.adapters.values()):
+            callback(adapter)
+
+    def add_remove_listener(self, callback):
+        """
+        Register callback called with the path of every removed adapter
+        """
+        self.remove_listeners.append(callback)
+
+    def get_adapter_paths(self):
+        """
+        Get paths of configured adapters
+        """
+        return list(self.adapters)
+
+    def disable_adapters(self):
+        """
+        Disable every adapter
+        """
+        for adapter in self.adapters.values():
+            adapter.disable_adapter()
+
+    def on_interfaces_added(self, path, interfaces):
+        """
+        BlueZ `InterfacesAdded` signal handler
+        """
+        if ADAPTER_IFACE in interfaces:
+            logger.info('adapter %s added', path)
+            self.add_adapter(str(path))
+
+    def on_interfaces_removed(self, path, interfaces):
+        """
+        BlueZ `InterfacesRemoved` signal handler
+        """
+        if ADAPTER_IFACE in interfaces:
+            self.remove_adapter(str(path))
@@ -6,10 +6,44 @@ import dbus.mainloop.glib
 import dbus.service
 
 from .constants import DBUS_PROP_IFACE, LE_ADVERTISEMENT_IFACE
-from . import exceptions
+from . import exceptions, metrics
 
 logger = logging.getLogger('wfbt')
 
+# Legacy advertising and scan response payload length, extended advertising allows up to 251 bytes
+LEGACY_DATA_LENGTH = 31
+# Flags AD structure added by BlueZ to the advertising data
+FLAGS_LENGTH = 3
+
+
+def uuid_length(uuid: str):
+    """
+    Get length in bytes of a 16, 32 or 128 bit UUID
+    """
+    return {4: 2, 8: 4}.get(len(uuid), 16)
+
+
+def service_uuids_length(uuids: list):
+    """
+    Get length of service UUIDs AD structures, one per UUID size
+    """
+    sizes = [uuid_length(uuid) for uuid in uuids or []]
+    return sum(2 + size * sizes.count(size) for size in set(sizes))
+
+
+def service_data_length(service_data: dict):
+    """
+    Get length of service data AD structures
+    """
+    return sum(2 + uuid_length(uuid) + len(data) for uuid, data in (service_data or {}).items())
+
+
+def manufacturer_data_length(manufacturer_data: dict):
+    """
+    Get length of manufacturer data AD structures
+    """
+    return sum(4 + len(data) for data in (manufacturer_data or {}).values())
+
 
 class Advertisement(dbus.service.Object):
     """
@@ -26,6 +60,12 @@ class Advertisement(dbus.service.Object):
         self.solicit_uuids = None
         self.service_data = None
         self.include_tx_power = None
+        self.local_name = None
+        self.scan_response_service_data = None
+        self.min_interval = None
+        self.max_interval = None
+        self.duration = None
+        self.timeout = None
         dbus.service.Object.__init__(self, bus, self.path)
 
     def get_properties(self):
@@ -48,6 +88,19 @@ class Advertisement(dbus.service.Object):
                                                         signature='sv')
         if self.include_tx_power is not None:
             properties['IncludeTxPower'] = dbus.Boolean(self.include_tx_power)
+        if self.local_name is not None:
+            properties['LocalName'] = dbus.String(self.local_name)
+        if self.scan_response_service_data is not None:
+            properties['ScanResponseServiceData'] = dbus.Dictionary(self.scan_response_service_data,
+                                                                    signature='sv')
+        if self.min_interval is not None:
+            properties['MinInterval'] = dbus.UInt32(self.min_interval)
+        if self.max_interval is not None:
+            properties['MaxInterval'] = dbus.UInt32(self.max_interval)
+        if self.duration is not None:
+            properties['Duration'] = dbus.UInt16(self.duration)
+        if self.timeout is not None:
+            properties['Timeout'] = dbus.UInt16(self.timeout)
         return {LE_ADVERTISEMENT_IFACE: properties}
 
     def get_path(self):
@@ -88,7 +141,49 @@ class Advertisement(dbus.service.Object):
             self.service_data = dbus.Dictionary({}, signature='sv')
         self.service_data[uuid] = dbus.Array(data, signature='y')
 
+    def add_scan_response_service_data(self, uuid, data):
+        """
+        Add service data to the scan response
+        """
+        if not self.scan_response_service_data:
+            self.scan_response_service_data = dbus.Dictionary({}, signature='sv')
+        self.scan_response_service_data[uuid] = dbus.Array(data, signature='y')
+
+    def get_local_name_length(self):
+        """
+        Get length of the local name AD structure
+        """
+        return 2 + len(self.local_name.encode('utf-8')) if self.local_name else 0
+
+    def get_data_length(self, scan_response: bool = False):
+        """
+        Get length of the advertising data, the local name is counted in the scan response when there is one
+        """
+        length = FLAGS_LENGTH + service_uuids_length(self.service_uuids) + service_uuids_length(self.solicit_uuids)
+        length += manufacturer_data_length(self.manufacturer_data) + service_data_length(self.service_data)
+        length += 3 if self.include_tx_power else 0
+        return length if scan_response else length + self.get_local_name_length()
+
+    def get_scan_response_length(self):
+        """
+        Get length of the scan response data
+        """
+        return service_data_length(self.scan_response_service_data) + self.get_local_name_length()
+
+    def check_length(self, max_length: int = LEGACY_DATA_LENGTH, scan_response: bool = False):
+        """
+        Check advertising and scan response payloads fit in max_length bytes
+        """
+        data_length = self.get_data_length(scan_response)
+        if data_length > max_length:
+            raise ValueError(f'advertising data is {data_length} bytes, more than {max_length}')
+        scan_response_length = self.get_scan_response_length() if scan_response else 0
+        if scan_response_length > max_length:
+            raise ValueError(f'scan response data is {scan_response_length} bytes, more than {max_length}')
+        logger.debug('advertising data: %s bytes, scan response data: %s bytes', data_length, scan_response_length)
+
     @dbus.service.method(DBUS_PROP_IFACE, in_signature='s', out_signature='a{sv}')
+    @metrics.instrumented
     def GetAll(self, interface):
         """
         Get all
@@ -99,8 +194,9 @@ class Advertisement(dbus.service.Object):
         return self.get_properties()[LE_ADVERTISEMENT_IFACE]
 
     @dbus.service.method(LE_ADVERTISEMENT_IFACE, in_signature='', out_signature='')
+    @metrics.instrumented
     def Release(self):
         """
         Release
         """
-        logger.debug(f"{self.path}: Released!")
+        logger.debug('%s: Released!', self.path)
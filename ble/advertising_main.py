@@ -1,53 +1,281 @@
 from __future__ import print_function
 import functools
 import logging
+import os
+import uuid
 import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
-from .advertising import Advertisement
+from gi.repository import GLib
+from .advertising import Advertisement, LEGACY_DATA_LENGTH, service_data_length
+from .advertising_policy import AdvertisingPolicy
+from .service_network import NetworkService
 
 from .constants import LE_ADVERTISING_MANAGER_IFACE, BLUEZ_SERVICE_NAME
+from . import startup
 
 logger = logging.getLogger('wfbt')
 
+ADVERTISING_REFRESH_INTERVAL_MS = int(os.environ.get('ADVERTISING_REFRESH_INTERVAL_MS', '2000'))
+ADVERTISING_SCAN_RESPONSE = os.environ.get('ADVERTISING_SCAN_RESPONSE', '1') == '1'
+# 31 bytes for legacy advertising, up to 251 when the controller supports extended advertising
+ADVERTISING_MAX_LENGTH = int(os.environ.get('ADVERTISING_MAX_LENGTH', str(LEGACY_DATA_LENGTH)))
+
+MANUFACTURER_ID = 0xffff
+DEVICE_ID_UUID = '9999'
+DEVICE_ID_LENGTH = 4
+
+# Manufacturer data layout: version, flags, NMConnectivityState, NMState, wifi NMDeviceState
+STATE_DATA_VERSION = 0x01
+FLAG_WIRELESS_ENABLED = 0x01
+FLAG_NETWORKING_ENABLED = 0x02
+
+
+def encode_state(manager_state: list, wifi_state: list):
+    """
+    Encode network manager state and wifi device state as manufacturer data, unknown values are 0
+    """
+    wireless_enabled, networking_enabled, connectivity, state = manager_state or [0, 0, 0, 0]
+    flags = (FLAG_WIRELESS_ENABLED if wireless_enabled else 0) | (FLAG_NETWORKING_ENABLED if networking_enabled else 0)
+    wifi_device_state = wifi_state[0] if wifi_state else 0
+    return [STATE_DATA_VERSION, flags, connectivity & 0xff, state & 0xff, wifi_device_state & 0xff]
+
+
+def read_device_id():
+    """
+    Get short device id from the machine id, or from the hardware address if there is none
+    """
+    try:
+        with open('/etc/machine-id', encoding='ascii') as machine_id:
+            return list(bytes.fromhex(machine_id.read().strip()[:DEVICE_ID_LENGTH * 2]))
+    except (OSError, ValueError):
+        return list(uuid.getnode().to_bytes(6, 'big')[-DEVICE_ID_LENGTH:])
+
 
 class DeviceAdvertisement(Advertisement):
     """
     Advertisement class
+
+    The advertising data carries the network service UUID and the state data, the scan response carries
+    the device id and the local name so centrals can filter on them while scanning. Without scan response,
+    the device id, the local name and the TX power are only added if they fit
     """
 
-    def __init__(self, bus, index):
+    def __init__(self, bus, index, alias: str = None, scan_response: bool = ADVERTISING_SCAN_RESPONSE,  # pylint: disable=too-many-arguments
+                 max_length: int = ADVERTISING_MAX_LENGTH):
         Advertisement.__init__(self, bus, index, 'peripheral')
-        self.add_manufacturer_data(0xffff, [0x00, 0x01, 0x02, 0x03, 0x04])
-        self.add_service_data('9999', [0x00, 0x01, 0x02, 0x03, 0x04])
-        self.include_tx_power = True
+        self.add_service_uuid(NetworkService.NETWORK_SVC_UUID)
+        self.add_manufacturer_data(MANUFACTURER_ID, encode_state([], []))
+
+        device_id = read_device_id()
+        if scan_response:
+            self.add_scan_response_service_data(DEVICE_ID_UUID, device_id)
+        elif self.get_data_length() + service_data_length({DEVICE_ID_UUID: device_id}) <= max_length:
+            self.add_service_data(DEVICE_ID_UUID, device_id)
+        else:
+            logger.warning('device id does not fit in advertising data')
+
+        if alias:
+            self.set_local_name(alias, scan_response, max_length)
+        self.include_tx_power = self.get_data_length(scan_response) + 3 <= max_length
+
+        self.check_length(max_length, scan_response)
+
+    def set_local_name(self, alias: str, scan_response: bool, max_length: int):
+        """
+        Set local name, shortened to the space left in its payload
+        """
+        used = self.get_scan_response_length() if scan_response else self.get_data_length()
+        available = max_length - used - 2
+        if available <= 0:
+            logger.warning('local name %s does not fit in advertising data', alias)
+            return
+        self.local_name = alias.encode('utf-8')[:available].decode('utf-8', 'ignore')
+        if self.local_name != alias:
+            logger.warning('local name %s shortened to %s', alias, self.local_name)
+
+    def get_state_data(self):
+        """
+        Get encoded state carried by the manufacturer data
+        """
+        return list(self.manufacturer_data[MANUFACTURER_ID])
+
+    def set_state(self, manager_state: list, wifi_state: list):
+        """
+        Update manufacturer data, return True if it changed
+        """
+        data = encode_state(manager_state, wifi_state)
+        if data == self.get_state_data():
+            return False
+        self.add_manufacturer_data(MANUFACTURER_ID, data)
+        return True
 
+    def set_intervals(self, min_interval: int, max_interval: int, duration: int):
+        """
+        Update advertising intervals in ms and rotation duration in s, return True if they changed
+        """
+        if (self.min_interval, self.max_interval, self.duration) == (min_interval, max_interval, duration):
+            return False
+        self.min_interval, self.max_interval, self.duration = min_interval, max_interval, duration
+        return True
 
-def register_ad_cb():
+
+def register_ad_cb(adapter_path):
     """
     Advertisement register callback
     """
-    logger.info('Advertisement registered')
+    logger.info('Advertisement registered on %s after %.1f ms', adapter_path, startup.elapsed_ms())
 
 
-def register_ad_error_cb(mainloop, error):
+def register_ad_error_cb(mainloop, adapters, failed, adapter_path, error):  # pylint: disable=too-many-arguments
     """
-    Advertisement register error callback
+    Advertisement register error callback, quit once it failed on every adapter
     """
-    logger.error(f"Failed to register advertisement: {str(error)}")
-    mainloop.quit()
+    logger.error('Failed to register advertisement on %s: %s', adapter_path, error)
+    failed.add(adapter_path)
+    adapter_paths = adapters.get_adapter_paths()
+    if adapter_paths and failed.issuperset(adapter_paths):
+        mainloop.quit()
 
 
-def advertising_main(mainloop, bus, adapter):
+class AdvertisingManager:
     """
-    Advertising main function
+    Register the device advertisement on every adapter and keep its state data and intervals current
+
+    BlueZ reads advertisement properties on registration only, a state or mode change re-registers the
+    advertisement at most once every `ADVERTISING_REFRESH_INTERVAL_MS` with the latest properties.
+    A failed re-registration is retried on the next refresh instead of quitting
     """
-    ad_manager = dbus.Interface(bus.get_object(
-        BLUEZ_SERVICE_NAME, adapter.get_path()), LE_ADVERTISING_MANAGER_IFACE)
 
-    device_advertisement = DeviceAdvertisement(bus, 0)
+    def __init__(self, mainloop, bus, adapters, nm_state, interval_ms: int = ADVERTISING_REFRESH_INTERVAL_MS):  # pylint: disable=too-many-arguments
+        self.mainloop = mainloop
+        self.bus = bus
+        self.adapters = adapters
+        self.nm_state = nm_state
+        self.interval_ms = interval_ms
+        self.advertisement = DeviceAdvertisement(bus, 0, adapters.alias)
+        self.policy = AdvertisingPolicy(bus, nm_state)
+        self.advertisement.set_intervals(*AdvertisingPolicy.MODES[AdvertisingPolicy.FAST])
+        self.registered = {}
+        self.failed = set()
+        self.refresh_timer = None
+        self.last_refresh_time = 0
+
+        nm_state.add_manager_listener(lambda _state: self.update_state())
+        nm_state.add_device_listener(lambda _path, _state: self.update_state())
+        self.policy.add_listener(self.update_state)
+        adapters.add_listener(lambda adapter: self.register(adapter.get_path()))
+        adapters.add_remove_listener(self.on_adapter_removed)
+
+        # NM is read once the main loop is idle so registrations are not delayed
+        GLib.idle_add(self.on_idle)
+
+    def get_manager(self, adapter_path: str):
+        """
+        Get advertising manager of an adapter
+        """
+        return dbus.Interface(self.bus.get_object(BLUEZ_SERVICE_NAME, adapter_path), LE_ADVERTISING_MANAGER_IFACE)
+
+    def register(self, adapter_path: str, refresh: bool = False):
+        """
+        Register the advertisement on an adapter with its current properties
+        """
+        data = self.advertisement.get_properties()
+        if refresh:
+            error_handler = functools.partial(self.on_reregister_error, adapter_path)
+        else:
+            error_handler = functools.partial(register_ad_error_cb, self.mainloop, self.adapters, self.failed, adapter_path)
+        self.get_manager(adapter_path).RegisterAdvertisement(
+            self.advertisement.get_path(), {},
+            reply_handler=lambda: self.on_registered(adapter_path, data),
+            error_handler=error_handler)
+
+    def on_reregister_error(self, adapter_path: str, error):
+        """
+        Advertisement re-register error callback, retried on the next refresh while the adapter is present
+        """
+        if adapter_path not in self.adapters.get_adapter_paths():
+            logger.warning('Failed to re-register advertisement on removed adapter %s: %s', adapter_path, error)
+            return
+        logger.error('Failed to re-register advertisement on %s: %s', adapter_path, error)
+        # not registered anymore
+        self.registered[adapter_path] = None
+        self.schedule_refresh()
+
+    def on_adapter_removed(self, adapter_path: str):
+        """
+        Adapter removed, forget its registration
+        """
+        self.registered.pop(adapter_path, None)
+        self.failed.discard(adapter_path)
+
+    def on_registered(self, adapter_path: str, data: dict):
+        """
+        Advertisement registered, refresh it if its properties changed meanwhile
+        """
+        register_ad_cb(adapter_path)
+        self.registered[adapter_path] = data
+        self.failed.discard(adapter_path)
+        if data != self.advertisement.get_properties():
+            self.schedule_refresh()
 
-    ad_manager.RegisterAdvertisement(device_advertisement.get_path(), {},
-                                     reply_handler=register_ad_cb,
-                                     error_handler=functools.partial(register_ad_error_cb, mainloop))
+    def on_idle(self):
+        """
+        Read the initial state
+        """
+        self.update_state()
+        return False
+
+    def update_state(self):
+        """
+        Encode the current NM state and apply the policy mode, schedule a refresh if either changed
+        """
+        state_changed = self.advertisement.set_state(self.nm_state.get_manager_state(), self.nm_state.get_device_state('wifi'))
+        intervals_changed = self.advertisement.set_intervals(*self.policy.get_intervals())
+        if state_changed:
+            logger.debug('advertised state changed %r', self.advertisement.get_state_data())
+        if intervals_changed:
+            logger.info('advertising mode changed to %s', self.policy.get_mode())
+        if state_changed or intervals_changed:
+            self.schedule_refresh()
+
+    def schedule_refresh(self):
+        """
+        Schedule advertisement refresh, spaced by at least the refresh interval
+        """
+        if self.refresh_timer is None:
+            elapsed_ms = (GLib.get_monotonic_time() - self.last_refresh_time) // 1000
+            self.refresh_timer = GLib.timeout_add(max(0, self.interval_ms - elapsed_ms), self.refresh)
+
+    def refresh(self):
+        """
+        Re-register the advertisement on every adapter where it carries outdated properties
+        """
+        self.refresh_timer = None
+        self.last_refresh_time = GLib.get_monotonic_time()
+        data = self.advertisement.get_properties()
+        for adapter_path, registered_data in list(self.registered.items()):
+            if registered_data is None:
+                del self.registered[adapter_path]
+                self.register(adapter_path, True)
+            elif registered_data != data:
+                del self.registered[adapter_path]
+                self.get_manager(adapter_path).UnregisterAdvertisement(
+                    self.advertisement.get_path(),
+                    reply_handler=functools.partial(self.register, adapter_path, True),
+                    error_handler=functools.partial(self.on_unregister_error, adapter_path))
+        return False
+
+    def on_unregister_error(self, adapter_path: str, error):
+        """
+        Advertisement unregister error callback, the adapter is most likely gone
+        """
+        logger.warning('Failed to unregister advertisement on %s: %s', adapter_path, error)
+
+
+def advertising_main(mainloop, bus, adapters, nm_state):
+    """
+    Advertising main function, the advertisement is registered on every adapter
+    """
+    return AdvertisingManager(mainloop, bus, adapters, nm_state)
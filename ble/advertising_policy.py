@@ -0,0 +1,107 @@
+"""
+Advertising interval policy driven by NM state and central connections
+"""
+import logging
+import os
+from gi.repository import GLib
+from .constants import BLUEZ_SERVICE_NAME, DBUS_PROP_IFACE, DEVICE_IFACE
+
+logger = logging.getLogger('wfbt')
+
+ADVERTISING_FAST_BOOT_SECONDS = int(os.environ.get('ADVERTISING_FAST_BOOT_SECONDS', '30'))
+
+# NMDeviceState activated
+DEVICE_STATE_ACTIVATED = 100
+
+
+class AdvertisingPolicy:
+    """
+    Pick the advertising mode
+
+    Advertise fast while booting or while neither the ethernet nor the wifi device is activated so the device
+    is quickly discovered for provisioning, slow once a link is active or a central is connected.
+    Listeners are called when a boot window ends or a central connects or disconnects,
+    NM state changes are already followed by the advertising manager
+    """
+    FAST = 'fast'
+    SLOW = 'slow'
+
+    # Min interval, max interval in ms and rotation duration in s of every mode
+    MODES = {
+        FAST: (20, 30, 10),
+        SLOW: (1000, 1500, 2),
+    }
+
+    def __init__(self, bus, nm_state, boot_seconds: int = ADVERTISING_FAST_BOOT_SECONDS):
+        self.nm_state = nm_state
+        self.booting = boot_seconds > 0
+        self.connected = set()
+        self.listeners = []
+
+        bus.add_signal_receiver(self.on_properties_changed,
+                                signal_name='PropertiesChanged',
+                                dbus_interface=DBUS_PROP_IFACE,
+                                bus_name=BLUEZ_SERVICE_NAME,
+                                path_keyword='path')
+        if self.booting:
+            GLib.timeout_add_seconds(boot_seconds, self.on_boot_elapsed)
+
+    def add_listener(self, callback):
+        """
+        Register callback called when the mode may have changed
+        """
+        self.listeners.append(callback)
+
+    def is_link_active(self):
+        """
+        Check if the ethernet or the wifi device is activated
+        """
+        for device_type in ['ethernet', 'wifi']:
+            state = self.nm_state.get_device_state(device_type)
+            if state and state[0] == DEVICE_STATE_ACTIVATED:
+                return True
+        return False
+
+    def get_mode(self):
+        """
+        Get current advertising mode
+        """
+        if self.connected:
+            return self.SLOW
+        if self.booting or not self.is_link_active():
+            return self.FAST
+        return self.SLOW
+
+    def get_intervals(self):
+        """
+        Get (min interval, max interval, duration) of the current mode
+        """
+        return self.MODES[self.get_mode()]
+
+    def on_boot_elapsed(self):
+        """
+        Boot window timer
+        """
+        self.booting = False
+        self.notify()
+        return False
+
+    def on_properties_changed(self, interface, changed, _invalidated, path=None):
+        """
+        BlueZ `PropertiesChanged` signal handler, follow connected centrals
+        """
+        if interface != DEVICE_IFACE or 'Connected' not in changed:
+            return
+        if changed['Connected']:
+            self.connected.add(str(path))
+        else:
+            self.connected.discard(str(path))
+        logger.debug('central %s connected: %s', path, bool(changed["Connected"]))
+        self.notify()
+
+    def notify(self):
+        """
+        Call listeners
+        """
+        for callback in self.listeners:
+            callback()
@@ -4,6 +4,7 @@ import dbus
 import dbus.service
 import dbus.mainloop.glib
 from ble.constants import BLUEZ_SERVICE_NAME, AGENT_MANAGER_IFACE, AGENT_IFACE
+from ble import startup
 
 AGENT_PATH = '/test/agent'
 
@@ -22,18 +23,30 @@ class HeadlessAgent(dbus.service.Object):
         print("Release")
 
 
-def register_agent_cb():
+def register_agent_cb(mainloop, manager):
     """
-    Callback for agent registration
+    Callback for agent registration, then make it the default agent
     """
-    logger.info('Agent registered')
+    logger.info('Agent registered after %.1f ms', startup.elapsed_ms())
+
+    logger.info('Set registered agent as default')
+    manager.RequestDefaultAgent(AGENT_PATH,
+                                reply_handler=request_default_agent_cb,
+                                error_handler=functools.partial(register_agent_error_cb, mainloop))
+
+
+def request_default_agent_cb():
+    """
+    Callback for default agent request
+    """
+    logger.info('Agent set as default')
 
 
 def register_agent_error_cb(mainloop, error):
     """
     Callback for agent registration error
     """
-    logger.error(f"Failed to register agent: {str(error)}")
+    logger.error('Failed to register agent: %s', error)
     mainloop.quit()
 
 
@@ -48,8 +61,5 @@ def agent_main(mainloop, bus):
 
     logger.info('Registering agent...')
     manager.RegisterAgent(AGENT_PATH, "NoInputNoOutput",
-                          reply_handler=register_agent_cb,
+                          reply_handler=functools.partial(register_agent_cb, mainloop, manager),
                           error_handler=functools.partial(register_agent_error_cb, mainloop))
-
-    logger.info('Set registered agent as default')
-    manager.RequestDefaultAgent(AGENT_PATH)
@@ -0,0 +1,97 @@
+"""
+LE advertisement of the asyncio engine
+"""
+import logging
+from dbus_next import Variant
+from dbus_next.service import ServiceInterface, method, dbus_property, PropertyAccess
+from ..constants import LE_ADVERTISEMENT_IFACE
+
+logger = logging.getLogger('wfbt')
+
+
+class Advertisement(ServiceInterface):
+    """
+    org.bluez.LEAdvertisement1 interface implementation
+    """
+    PATH_BASE = '/org/bluez/example/advertisement'
+
+    def __init__(self, index, advertising_type):
+        ServiceInterface.__init__(self, LE_ADVERTISEMENT_IFACE)
+        self.path = self.PATH_BASE + str(index)
+        self.ad_type = advertising_type
+        self.service_uuids = []
+        self.manufacturer_data = {}
+        self.service_data = {}
+        self.include_tx_power = False
+
+    def add_service_uuid(self, uuid):
+        """
+        Add service UUID
+        """
+        self.service_uuids.append(uuid)
+
+    def add_manufacturer_data(self, manuf_code, data):
+        """
+        Add manufacturer data
+        """
+        self.manufacturer_data[manuf_code] = Variant('ay', bytes(data))
+
+    def add_service_data(self, uuid, data):
+        """
+        Add service data
+        """
+        self.service_data[uuid] = Variant('ay', bytes(data))
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Type(self) -> 's':
+        """
+        Advertising type
+        """
+        return self.ad_type
+
+    @dbus_property(access=PropertyAccess.READ)
+    def ServiceUUIDs(self) -> 'as':
+        """
+        Service UUIDs
+        """
+        return self.service_uuids
+
+    @dbus_property(access=PropertyAccess.READ)
+    def ManufacturerData(self) -> 'a{qv}':
+        """
+        Manufacturer data
+        """
+        return self.manufacturer_data
+
+    @dbus_property(access=PropertyAccess.READ)
+    def ServiceData(self) -> 'a{sv}':
+        """
+        Service data
+        """
+        return self.service_data
+
+    @dbus_property(access=PropertyAccess.READ)
+    def IncludeTxPower(self) -> 'b':
+        """
+        Include TX power
+        """
+        return self.include_tx_power
+
+    @method()
+    def Release(self):
+        """
+        Release
+        """
+        logger.debug('%s: Released!', self.path)
+
+
+class DeviceAdvertisement(Advertisement):
+    """
+    Advertisement class
+    """
+
+    def __init__(self, index):
+        Advertisement.__init__(self, index, 'peripheral')
+        self.add_manufacturer_data(0xffff, [0x00, 0x01, 0x02, 0x03, 0x04])
+        self.add_service_data('9999', [0x00, 0x01, 0x02, 0x03, 0x04])
+        self.include_tx_power = True
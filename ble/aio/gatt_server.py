@@ -0,0 +1,311 @@
+"""
+GATT server model of the asyncio engine, built on dbus-next
+
+dbus-next only dispatches methods decorated on the exported class, so the DBus methods
+are declared once here and subclasses override the `read_value`, `write_value`,
+`start_notify` and `stop_notify` coroutines instead
+"""
+import asyncio
+import logging
+import os
+from dbus_next import DBusError
+from dbus_next.service import ServiceInterface, method, dbus_property, PropertyAccess
+from ..constants import GATT_SERVICE_IFACE, GATT_CHRC_IFACE, GATT_DESC_IFACE
+
+logger = logging.getLogger('wfbt')
+
+NOT_SUPPORTED_ERROR = 'org.bluez.Error.NotSupported'
+
+
+class Service(ServiceInterface):
+    """
+    org.bluez.GattService1 interface implementation
+    """
+    PATH_BASE = '/org/bluez/example/gatt/service'
+
+    def __init__(self, index, uuid, primary):
+        ServiceInterface.__init__(self, GATT_SERVICE_IFACE)
+        self.path = self.PATH_BASE + str(index)
+        self.uuid = uuid
+        self.primary = primary
+        self.characteristics = []
+
+    def add_characteristic(self, characteristic):
+        """
+        Add characteristic
+        """
+        self.characteristics.append(characteristic)
+
+    def get_characteristics(self):
+        """
+        Get characteristics
+        """
+        return self.characteristics
+
+    def export(self, bus):
+        """
+        Export service, characteristics and descriptors
+        """
+        bus.export(self.path, self)
+        for chrc in self.characteristics:
+            chrc.export(bus)
+
+    @dbus_property(access=PropertyAccess.READ)
+    def UUID(self) -> 's':
+        """
+        UUID
+        """
+        return self.uuid
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Primary(self) -> 'b':
+        """
+        Primary
+        """
+        return self.primary
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Characteristics(self) -> 'ao':
+        """
+        Characteristic paths
+        """
+        return [chrc.path for chrc in self.characteristics]
+
+
+class Characteristic(ServiceInterface):
+    """
+    org.bluez.GattCharacteristic1 interface implementation
+
+    Notifications sent through `notify_value` are coalesced within `NOTIFY_DEBOUNCE_MS`
+    and only sent when the value changed
+    """
+    NOTIFY_DEBOUNCE_MS = int(os.environ.get('NOTIFY_DEBOUNCE_MS', '100'))
+
+    def __init__(self, index, uuid, flags, service):
+        ServiceInterface.__init__(self, GATT_CHRC_IFACE)
+        self.path = service.path + '/char' + str(index)
+        self.uuid = uuid
+        self.service = service
+        self.flags = flags
+        self.descriptors = []
+        self.value = b''
+        self.notifying = False
+        self.subscribers = 0
+        self.notify_handle = None
+        self.notified_value = None
+
+    def add_descriptor(self, descriptor):
+        """
+        Add descriptor to descriptor list
+        """
+        self.descriptors.append(descriptor)
+
+    def get_descriptors(self):
+        """
+        Get descriptors
+        """
+        return self.descriptors
+
+    def export(self, bus):
+        """
+        Export characteristic and descriptors
+        """
+        bus.export(self.path, self)
+        for desc in self.descriptors:
+            bus.export(desc.path, desc)
+
+    def start_notifying(self):
+        """
+        Start notifying, return False if it was already notifying
+
+        Every adapter calls StartNotify and StopNotify, notifications stop once every adapter stopped them
+        """
+        self.subscribers += 1
+        if self.notifying:
+            return False
+        self.notifying = True
+        self.notified_value = None
+        return True
+
+    def stop_notifying(self):
+        """
+        Stop notifying, return False if it was not notifying or other adapters still are
+        """
+        if self.subscribers == 0:
+            return False
+        self.subscribers -= 1
+        if self.subscribers > 0:
+            return False
+        self.notifying = False
+        return True
+
+    def notify_value(self, value: bytes):
+        """
+        Queue value notification
+        """
+        self.value = value
+        if self.notify_handle is None:
+            self.notify_handle = asyncio.get_event_loop().call_later(self.NOTIFY_DEBOUNCE_MS / 1000,
+                                                                     self.flush_notification)
+
+    def flush_notification(self):
+        """
+        Send the latest value if it changed since the last notification
+        """
+        self.notify_handle = None
+        if self.notifying and self.value != self.notified_value:
+            self.notified_value = self.value
+            self.emit_properties_changed({'Value': self.value})
+
+    async def read_value(self, _options: dict) -> bytes:
+        """
+        Read value
+        """
+        logger.error('Default ReadValue called, returning error')
+        raise DBusError(NOT_SUPPORTED_ERROR, 'Not Supported')
+
+    async def write_value(self, _value: bytes, _options: dict):
+        """
+        Write value
+        """
+        logger.error('Default WriteValue called, returning error')
+        raise DBusError(NOT_SUPPORTED_ERROR, 'Not Supported')
+
+    async def start_notify(self):
+        """
+        Start notify
+        """
+        logger.error('Default StartNotify called, returning error')
+        raise DBusError(NOT_SUPPORTED_ERROR, 'Not Supported')
+
+    async def stop_notify(self):
+        """
+        Stop notify
+        """
+        logger.error('Default StopNotify called, returning error')
+        raise DBusError(NOT_SUPPORTED_ERROR, 'Not Supported')
+
+    @method()
+    async def ReadValue(self, options: 'a{sv}') -> 'ay':
+        """
+        Read value
+        """
+        return await self.read_value(options)
+
+    @method()
+    async def WriteValue(self, value: 'ay', options: 'a{sv}'):
+        """
+        Write value
+        """
+        await self.write_value(value, options)
+
+    @method()
+    async def StartNotify(self):
+        """
+        Start notify
+        """
+        await self.start_notify()
+
+    @method()
+    async def StopNotify(self):
+        """
+        Stop notify
+        """
+        await self.stop_notify()
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Service(self) -> 'o':
+        """
+        Service path
+        """
+        return self.service.path
+
+    @dbus_property(access=PropertyAccess.READ)
+    def UUID(self) -> 's':
+        """
+        UUID
+        """
+        return self.uuid
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Flags(self) -> 'as':
+        """
+        Flags
+        """
+        return self.flags
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Descriptors(self) -> 'ao':
+        """
+        Descriptor paths
+        """
+        return [desc.path for desc in self.descriptors]
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Value(self) -> 'ay':
+        """
+        Last value, notified through `PropertiesChanged`
+        """
+        return self.value
+
+
+class Descriptor(ServiceInterface):
+    """
+    org.bluez.GattDescriptor1 interface implementation
+    """
+
+    def __init__(self, index, uuid, flags, characteristic):
+        ServiceInterface.__init__(self, GATT_DESC_IFACE)
+        self.path = characteristic.path + '/desc' + str(index)
+        self.uuid = uuid
+        self.flags = flags
+        self.chrc = characteristic
+
+    async def read_value(self, _options: dict) -> bytes:
+        """
+        Read value
+        """
+        logger.error('Default ReadValue called, returning error')
+        raise DBusError(NOT_SUPPORTED_ERROR, 'Not Supported')
+
+    async def write_value(self, _value: bytes, _options: dict):
+        """
+        Write value
+        """
+        logger.error('Default WriteValue called, returning error')
+        raise DBusError(NOT_SUPPORTED_ERROR, 'Not Supported')
+
+    @method()
+    async def ReadValue(self, options: 'a{sv}') -> 'ay':
+        """
+        Read value
+        """
+        return await self.read_value(options)
+
+    @method()
+    async def WriteValue(self, value: 'ay', options: 'a{sv}'):
+        """
+        Write value
+        """
+        await self.write_value(value, options)
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Characteristic(self) -> 'o':
+        """
+        Characteristic path
+        """
+        return self.chrc.path
+
+    @dbus_property(access=PropertyAccess.READ)
+    def UUID(self) -> 's':
+        """
+        UUID
+        """
+        return self.uuid
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Flags(self) -> 'as':
+        """
+        Flags
+        """
+        return self.flags
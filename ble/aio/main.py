@@ -0,0 +1,179 @@
+"""
+Entry point of the asyncio engine
+
+Adapter setup, NM state, the GATT application, the advertisement and the agent
+are registered concurrently on a dbus-next system bus connection
+"""
+import asyncio
+import logging
+import signal
+from dbus_next import BusType, Message, MessageType, DBusError, Variant
+from dbus_next.aio import MessageBus
+from dbus_next.service import ServiceInterface, method
+from ..constants import (BLUEZ_SERVICE_NAME, ADAPTER_IFACE, DBUS_OM_IFACE, DBUS_PROP_IFACE, GATT_MANAGER_IFACE,
+                         LE_ADVERTISING_MANAGER_IFACE, AGENT_MANAGER_IFACE, AGENT_IFACE)
+from .advertising import DeviceAdvertisement
+from .nm import NetworkManagerClient
+from .service_network import NetworkService
+
+logger = logging.getLogger('wfbt')
+
+AGENT_PATH = '/test/agent'
+
+
+class Application:
+    """
+    GATT application, dbus-next serves `GetManagedObjects` from the objects exported below its path
+    """
+    PATH = '/org/bluez/example/gatt'
+
+    def __init__(self, nm_client):
+        self.path = self.PATH
+        self.services = []
+
+        # Register network ble service
+        self.add_service(NetworkService(0, nm_client))
+
+    def add_service(self, service):
+        """
+        Add service to list services
+        """
+        self.services.append(service)
+
+    def export(self, bus):
+        """
+        Export every service
+        """
+        for service in self.services:
+            service.export(bus)
+
+
+class HeadlessAgent(ServiceInterface):
+    """
+    org.bluez.Agent1 interface implementation
+    """
+
+    def __init__(self):
+        ServiceInterface.__init__(self, AGENT_IFACE)
+
+    @method()
+    def Release(self):
+        """
+        Release
+        """
+        logger.info('agent released')
+
+
+async def call(bus, path: str, interface: str, member: str, signature: str = '', body: list = None):  # pylint: disable=too-many-arguments
+    """
+    Call a BlueZ method, errors are raised as `DBusError`
+    """
+    reply = await bus.call(Message(destination=BLUEZ_SERVICE_NAME, path=path, interface=interface, member=member,
+                                   signature=signature, body=body or []))
+    if reply.message_type == MessageType.ERROR:
+        raise DBusError(reply.error_name, reply.body[0] if reply.body else '')
+    return reply.body
+
+
+async def find_adapters(bus):
+    """
+    Find every bluetooth adapter, sorted by path
+    """
+    objects = (await call(bus, '/', DBUS_OM_IFACE, 'GetManagedObjects'))[0]
+    return sorted(path for path, interfaces in objects.items() if ADAPTER_IFACE in interfaces)
+
+
+async def set_adapter_prop(bus, path: str, key: str, value: Variant):
+    """
+    Set property on adapter
+    """
+    logger.debug('set adapter %s property %s to value %s', ADAPTER_IFACE, key, value.value)
+    await call(bus, path, DBUS_PROP_IFACE, 'Set', 'ssv', [ADAPTER_IFACE, key, value])
+
+
+async def enable_adapter(bus, path: str, alias: str = None):
+    """
+    Enable adapter by turning it on, make it discoverable and pairable
+    """
+    logger.info('enable adapter %s', path)
+    await set_adapter_prop(bus, path, 'Powered', Variant('b', True))
+    await asyncio.gather(set_adapter_prop(bus, path, 'Discoverable', Variant('b', True)),
+                         set_adapter_prop(bus, path, 'Pairable', Variant('b', True)))
+    if alias is not None:
+        await set_adapter_prop(bus, path, 'Alias', Variant('s', alias))
+
+
+async def disable_adapter(bus, path: str):
+    """
+    Disable by stopping discoverable and pairable
+    """
+    logger.info('disable adapter %s', path)
+    await asyncio.gather(set_adapter_prop(bus, path, 'Discoverable', Variant('b', False)),
+                         set_adapter_prop(bus, path, 'Pairable', Variant('b', False)))
+
+
+async def register_agent(bus):
+    """
+    Register headless agent and make it the default one
+    """
+    bus.export(AGENT_PATH, HeadlessAgent())
+    await call(bus, '/org/bluez', AGENT_MANAGER_IFACE, 'RegisterAgent', 'os', [AGENT_PATH, 'NoInputNoOutput'])
+    logger.info('Agent registered')
+    await call(bus, '/org/bluez', AGENT_MANAGER_IFACE, 'RequestDefaultAgent', 'o', [AGENT_PATH])
+
+
+async def register_advertisement(bus, adapter_path: str, advertisement):
+    """
+    Register device advertisement on an adapter
+    """
+    await call(bus, adapter_path, LE_ADVERTISING_MANAGER_IFACE, 'RegisterAdvertisement', 'oa{sv}', [advertisement.path, {}])
+    logger.info('Advertisement registered on %s', adapter_path)
+
+
+async def register_application(bus, adapter_path: str, app):
+    """
+    Register GATT application on an adapter
+    """
+    await call(bus, adapter_path, GATT_MANAGER_IFACE, 'RegisterApplication', 'oa{sv}', [app.path, {}])
+    logger.info('GATT application registered on %s', adapter_path)
+
+
+async def register_adapter(bus, adapter_path: str, app, advertisement):
+    """
+    Register advertisement and GATT application on an adapter, return False if it failed
+    """
+    try:
+        await asyncio.gather(register_advertisement(bus, adapter_path, advertisement),
+                             register_application(bus, adapter_path, app))
+        return True
+    except DBusError as exc:
+        logger.error('Failed to register on %s: %s', adapter_path, exc)
+        return False
+
+
+async def aio_main(adapter_alias: str = None):
+    """
+    Asyncio engine main
+    """
+    bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
+    adapter_paths = await find_adapters(bus)
+
+    nm_client = NetworkManagerClient(bus)
+    await asyncio.gather(nm_client.start(), *[enable_adapter(bus, path, adapter_alias) for path in adapter_paths])
+
+    # One application and one advertisement are shared by every adapter
+    app = Application(nm_client)
+    app.export(bus)
+    advertisement = DeviceAdvertisement(0)
+    bus.export(advertisement.path, advertisement)
+    registered = await asyncio.gather(register_agent(bus),
+                                      *[register_adapter(bus, path, app, advertisement) for path in adapter_paths])
+    if not any(registered[1:]):
+        raise RuntimeError('registration failed on every adapter')
+
+    # Trap sigint signal for program termination
+    stop = asyncio.Event()
+    asyncio.get_event_loop().add_signal_handler(signal.SIGINT, stop.set)
+    await stop.wait()
+    await asyncio.gather(*[disable_adapter(bus, path) for path in adapter_paths])
+    bus.disconnect()
@@ -0,0 +1,298 @@
+"""
+Awaitable NetworkManager client of the asyncio engine
+
+Calls are raw messages without introspection so independent calls can be issued
+concurrently with `asyncio.gather`, state and saved connections are cached and kept up to date through NM signals
+"""
+import asyncio
+import logging
+from uuid import uuid4
+from dbus_next import Message, MessageType, DBusError, Variant
+from ..constants import (DBUS_PROP_IFACE, NM_SERVICE_NAME, NM_PATH, NM_IFACE, NM_DEVICE_IFACE, NM_SETTINGS_PATH,
+                         NM_SETTINGS_IFACE, NM_CONNECTION_IFACE, NM_ACTIVE_CONNECTION_IFACE, NM_DEVICE_TYPES,
+                         WIRELESS_CONNECTION_TYPE)
+from ..nm.common import deep_get, NetworkState, ConnectionTable
+
+logger = logging.getLogger('wfbt')
+
+MATCH_RULES = [
+    f"type='signal',sender='{NM_SERVICE_NAME}',interface='{DBUS_PROP_IFACE}',member='PropertiesChanged'",
+    f"type='signal',sender='{NM_SERVICE_NAME}',interface='{NM_IFACE}',member='DeviceAdded'",
+    f"type='signal',sender='{NM_SERVICE_NAME}',interface='{NM_IFACE}',member='DeviceRemoved'",
+    f"type='signal',sender='{NM_SERVICE_NAME}',interface='{NM_DEVICE_IFACE}',member='StateChanged'",
+    f"type='signal',sender='{NM_SERVICE_NAME}',interface='{NM_SETTINGS_IFACE}',member='NewConnection'",
+    f"type='signal',sender='{NM_SERVICE_NAME}',interface='{NM_SETTINGS_IFACE}',member='ConnectionRemoved'",
+    f"type='signal',sender='{NM_SERVICE_NAME}',interface='{NM_CONNECTION_IFACE}',member='Updated'",
+    f"type='signal',sender='{NM_SERVICE_NAME}',interface='{NM_CONNECTION_IFACE}',member='Removed'",
+]
+
+
+def unpack(value):
+    """
+    Convert variants to plain values recursively
+    """
+    if isinstance(value, Variant):
+        return unpack(value.value)
+    if isinstance(value, dict):
+        return {key: unpack(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [unpack(item) for item in value]
+    return value
+
+
+def pack(value):
+    """
+    Convert a plain setting value to variant
+    """
+    if isinstance(value, bytes):
+        return Variant('ay', bytes(value))
+    if isinstance(value, bool):
+        return Variant('b', value)
+    if isinstance(value, int):
+        return Variant('u', value)
+    return Variant('s', str(value))
+
+
+def pack_settings(settings: dict):
+    """
+    Convert plain connection settings to variants
+    """
+    return {group: {key: pack(value) for key, value in values.items()} for group, values in settings.items()}
+
+
+def wireless_connection_settings(ssid: str, password: str):
+    """
+    Build wireless connection settings
+    """
+    return pack_settings({
+        '802-11-wireless': {'ssid': ssid.encode()},
+        '802-11-wireless-security': wireless_security_settings(password),
+        'connection': {'id': ssid, 'type': WIRELESS_CONNECTION_TYPE, 'uuid': str(uuid4())},
+        'ipv4': {'method': 'auto'},
+        'ipv6': {'method': 'auto'},
+    })
+
+
+def wireless_security_settings(password: str):
+    """
+    Build wireless security settings
+    """
+    return {'key-mgmt': 'wpa-psk', 'auth-alg': 'open', 'psk': password}
+
+
+class NetworkManagerClient(NetworkState):
+    """
+    Network manager state, devices and wireless provisioning over dbus-next
+    """
+
+    def __init__(self, bus):
+        NetworkState.__init__(self)
+        self.bus = bus
+        self.devices = {}
+        self.connections = ConnectionTable()
+        self.fetching = set()
+        self.active_settings = {}
+
+    async def start(self):
+        """
+        Subscribe to NM signals then read manager state, devices and saved connections concurrently
+        """
+        self.bus.add_message_handler(self.on_message)
+        await asyncio.gather(*[self.bus_call('org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus',
+                                             'AddMatch', 's', [rule]) for rule in MATCH_RULES])
+        manager, device_paths, connection_paths = await asyncio.gather(
+            self.get_all(NM_PATH, NM_IFACE),
+            self.call(NM_PATH, NM_IFACE, 'GetDevices'),
+            self.call(NM_SETTINGS_PATH, NM_SETTINGS_IFACE, 'ListConnections'))
+        self.update_manager_state(manager)
+        await asyncio.gather(*[self.add_device(path) for path in device_paths[0]],
+                             *[self.fetch_connection(path) for path in connection_paths[0]])
+        logger.info('NM state: %r, devices: %r, connections: %d',
+                    self.get_manager_state(), self.devices, len(self.connections.connections))
+
+    async def bus_call(self, destination: str, path: str, interface: str, member: str,  # pylint: disable=too-many-arguments
+                       signature: str = '', body: list = None):
+        """
+        Call a method and return the reply body, errors are raised as `DBusError`
+        """
+        reply = await self.bus.call(Message(destination=destination, path=path, interface=interface, member=member,
+                                            signature=signature, body=body or []))
+        if reply.message_type == MessageType.ERROR:
+            raise DBusError(reply.error_name, reply.body[0] if reply.body else '')
+        return reply.body
+
+    async def call(self, path: str, interface: str, member: str, signature: str = '', body: list = None):  # pylint: disable=too-many-arguments
+        """
+        Call a NM method
+        """
+        return await self.bus_call(NM_SERVICE_NAME, path, interface, member, signature, body)
+
+    async def get_all(self, path: str, interface: str):
+        """
+        Get all properties of a NM object as plain values
+        """
+        return unpack((await self.call(path, DBUS_PROP_IFACE, 'GetAll', 's', [interface]))[0])
+
+    async def get(self, path: str, interface: str, name: str):
+        """
+        Get a property of a NM object as plain value
+        """
+        return unpack((await self.call(path, DBUS_PROP_IFACE, 'Get', 'ss', [interface, name]))[0])
+
+    async def add_device(self, path: str):
+        """
+        Index device by type
+        """
+        properties = await self.get_all(path, NM_DEVICE_IFACE)
+        device_type = NM_DEVICE_TYPES.get(properties['DeviceType'], str(properties['DeviceType']))
+        self.devices[path] = device_type
+        self.device_states[path] = [int(properties['StateReason'][0]), int(properties['StateReason'][1])]
+
+    async def fetch_connection(self, path: str):
+        """
+        Fetch connection settings and index them, skipped if the connection was removed meanwhile
+        """
+        self.fetching.add(path)
+        try:
+            settings = unpack((await self.call(path, NM_CONNECTION_IFACE, 'GetSettings'))[0])
+        except DBusError as exc:
+            logger.warning('unable to read settings of connection %s: %s', path, exc)
+            self.remove_connection(path)
+            return
+        if path in self.fetching:
+            self.fetching.discard(path)
+            self.connections.add_connection(path, settings)
+
+    def remove_connection(self, path: str):
+        """
+        Forget connection
+        """
+        self.fetching.discard(path)
+        self.connections.remove_connection(path)
+
+    def get_current_device_path(self, device_type: str):
+        """
+        Get current device object path by type
+        """
+        return next((path for path, path_type in self.devices.items() if path_type == device_type), None)
+
+    def get_device_state(self, device_type: str):
+        """
+        Get current device state as [state, reason], empty if there is no such device
+        """
+        path = self.get_current_device_path(device_type)
+        return [] if path is None else list(self.device_states[path])
+
+    async def get_active_connection_settings(self, device_type: str):
+        """
+        Get settings of the active connection of the current device of a type, cached until it changes
+        """
+        path = self.get_current_device_path(device_type)
+        if path is None:
+            return {}
+        if path not in self.active_settings:
+            self.active_settings[path] = asyncio.ensure_future(self.fetch_active_connection_settings(path))
+        try:
+            return await asyncio.shield(self.active_settings[path])
+        except DBusError as exc:
+            logger.debug('unable to read active connection settings of %s: %s', path, exc)
+            self.active_settings.pop(path, None)
+            return {}
+
+    async def fetch_active_connection_settings(self, path: str):
+        """
+        Read settings of the active connection of a device
+        """
+        active_path = await self.get(path, NM_DEVICE_IFACE, 'ActiveConnection')
+        if active_path == '/':
+            return {}
+        connection_path = await self.get(active_path, NM_ACTIVE_CONNECTION_IFACE, 'Connection')
+        return unpack((await self.call(connection_path, NM_CONNECTION_IFACE, 'GetSettings'))[0])
+
+    def on_message(self, msg):
+        """
+        NM signal handler
+        """
+        if msg.message_type != MessageType.SIGNAL or not msg.path.startswith(NM_PATH):
+            return
+        if msg.interface == DBUS_PROP_IFACE and msg.member == 'PropertiesChanged':
+            interface, changed = msg.body[0], unpack(msg.body[1])
+            if interface == NM_IFACE and msg.path == NM_PATH:
+                self.update_manager_state(changed)
+            elif interface == NM_DEVICE_IFACE and 'ActiveConnection' in changed:
+                self.active_settings.pop(msg.path, None)
+        elif msg.interface == NM_DEVICE_IFACE and msg.member == 'StateChanged':
+            if msg.path in self.devices:
+                self.update_device_state(msg.path, [int(msg.body[0]), int(msg.body[2])])
+        elif msg.interface == NM_IFACE and msg.member == 'DeviceAdded':
+            asyncio.ensure_future(self.add_device(msg.body[0]))
+        elif msg.interface == NM_IFACE and msg.member == 'DeviceRemoved':
+            self.devices.pop(msg.body[0], None)
+            self.device_states.pop(msg.body[0], None)
+        elif msg.interface in (NM_SETTINGS_IFACE, NM_CONNECTION_IFACE):
+            self.on_connection_signal(msg)
+
+    def on_connection_signal(self, msg):
+        """
+        NM settings and connection signal handler, keep the connection index up to date
+        """
+        if msg.interface == NM_SETTINGS_IFACE and msg.member == 'NewConnection':
+            asyncio.ensure_future(self.fetch_connection(msg.body[0]))
+        elif msg.interface == NM_SETTINGS_IFACE and msg.member == 'ConnectionRemoved':
+            self.remove_connection(msg.body[0])
+        elif msg.interface == NM_CONNECTION_IFACE:
+            self.active_settings.clear()
+            if msg.member == 'Removed':
+                self.remove_connection(msg.path)
+            elif msg.member == 'Updated' and msg.path in self.connections.connections:
+                asyncio.ensure_future(self.fetch_connection(msg.path))
+
+    async def apply(self, ssid: str, psk: str):
+        """
+        Add or update the wireless connection of a SSID and return 'unchanged', 'updated', 'added' or 'removed'
+        An empty SSID removes every wireless connection, connections are looked up in the index
+        """
+        if not ssid:
+            await asyncio.gather(*[self.call(path, NM_CONNECTION_IFACE, 'Delete')
+                                   for path in self.connections.get_connections_by_type(WIRELESS_CONNECTION_TYPE)])
+            return 'removed'
+
+        paths = self.connections.get_connections_by_ssid(ssid)
+        if paths:
+            return await self.update(paths[0], psk)
+        return await self.add(ssid, psk)
+
+    async def add(self, ssid: str, psk: str):
+        """
+        Add wireless connection and activate it on the wifi device
+        """
+        logger.info('add wireless connection for ssid: %s', ssid)
+        settings = wireless_connection_settings(ssid, psk)
+        device_path = self.get_current_device_path('wifi')
+        if device_path is None:
+            await self.call(NM_SETTINGS_PATH, NM_SETTINGS_IFACE, 'AddConnection', 'a{sa{sv}}', [settings])
+        else:
+            await self.call(NM_PATH, NM_IFACE, 'AddAndActivateConnection', 'a{sa{sv}}oo', [settings, device_path, '/'])
+        return 'added'
+
+    async def update(self, path: str, psk: str):
+        """
+        Update wireless connection pre-shared key in place if it changed and activate it
+        Settings are read as variants so the update keeps their types
+        """
+        try:
+            secrets = unpack((await self.call(path, NM_CONNECTION_IFACE, 'GetSecrets', 's', ['802-11-wireless-security']))[0])
+            if deep_get(secrets, '802-11-wireless-security.psk') == psk:
+                logger.info('wireless connection %s is unchanged', path)
+                return 'unchanged'
+        except DBusError as exc:
+            logger.debug('unable to read secrets of %s: %s', path, exc)
+
+        logger.info('update wireless connection: %s', path)
+        settings = (await self.call(path, NM_CONNECTION_IFACE, 'GetSettings'))[0]
+        settings['802-11-wireless-security'] = {key: pack(value) for key, value in wireless_security_settings(psk).items()}
+        await self.call(path, NM_CONNECTION_IFACE, 'Update', 'a{sa{sv}}', [settings])
+        device_path = self.get_current_device_path('wifi')
+        if device_path is not None:
+            await self.call(NM_PATH, NM_IFACE, 'ActivateConnection', 'ooo', [path, device_path, '/'])
+        return 'updated'
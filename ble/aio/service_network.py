@@ -0,0 +1,279 @@
+"""
+BLE network configurator service of the asyncio engine
+
+Same UUIDs and values as `ble.service_network`, reads are served from the client cache
+or awaited concurrently and wireless configurations are applied one at a time in background tasks
+"""
+import asyncio
+import logging
+import struct
+from dbus_next import DBusError
+from .. import protocol
+from ..nm.common import deep_get
+from ..nm.queue import ProvisioningQueue
+from .gatt_server import Service, Characteristic, Descriptor
+
+logger = logging.getLogger('wfbt')
+
+
+class TaskProvisioner:
+    """
+    Apply wireless configurations of `ProvisioningQueue` in background tasks
+    """
+
+    def __init__(self, nm_client):
+        self.nm_client = nm_client
+        self.tasks = set()
+
+    def apply(self, ssid: str, psk: str, reply_handler, error_handler):
+        """
+        Apply wireless configuration, handlers are called once it completed
+        """
+        task = asyncio.ensure_future(self.run(ssid, psk, reply_handler, error_handler))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run(self, ssid: str, psk: str, reply_handler, error_handler):
+        """
+        Await the NM client and report the result, every outcome calls exactly one handler
+        so the queue never waits on a request forever
+        """
+        try:
+            result = await self.nm_client.apply(ssid, psk)
+        except DBusError as exc:
+            error_handler(exc)
+            return
+        except asyncio.CancelledError as exc:
+            error_handler(exc)
+            raise
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.exception('unexpected error applying wireless configuration')
+            error_handler(exc)
+            return
+        reply_handler(result, None)
+
+
+class NetworkService(Service):
+    """
+    BLE Network configurator service
+    """
+    NETWORK_SVC_UUID = '22345678-1234-5678-1234-56789abcdef1'
+
+    def __init__(self, index, nm_client):
+        Service.__init__(self, index, self.NETWORK_SVC_UUID, True)
+
+        logger.info('initialize NM service: %s', self.NETWORK_SVC_UUID)
+
+        NETWORK_MANAGER_DEVICE_WIFI_STATE_CHRC_UUID = '32345678-1234-5678-1234-56781abcdee2'
+        NETWORK_MANAGER_DEVICE_ETHERNET_STATE_CHRC_UUID = '42345678-1234-5678-1234-56781abcdee2'
+
+        self.add_characteristic(
+            NetworkManagerStateCharacteristic(1, self, nm_client))
+        self.add_characteristic(
+            NetworkWirelessConfigurationCharacteristic(2, self, nm_client))
+        self.add_characteristic(
+            NetworkManagerDeviceStateCharacteristic(3, self, nm_client,
+                                                    NETWORK_MANAGER_DEVICE_ETHERNET_STATE_CHRC_UUID, 'ethernet'))
+        self.add_characteristic(
+            NetworkManagerDeviceStateCharacteristic(4, self, nm_client,
+                                                    NETWORK_MANAGER_DEVICE_WIFI_STATE_CHRC_UUID, 'wifi'))
+
+
+class NetworkManagerDeviceStateCharacteristic(Characteristic):
+    """
+    Device state characteristic
+    Expose device state and device state reason
+    """
+    VALUE_LAYOUT = struct.Struct('BB')
+
+    def __init__(self, index, service, nm_client, uuid, device_type):  # pylint: disable=too-many-arguments
+        Characteristic.__init__(self, index, uuid, ['read', 'notify'], service)
+
+        logger.info('initialize NM %s device state characteristic: %s', device_type, uuid)
+
+        self.device_type = device_type
+        self.nm_client = nm_client
+
+        CONN_TYPE_DESC_UUID = '72345678-1234-5678-1234-56789abcdef2'
+        CONN_ID_DESC_UUID = '72345678-1234-5678-1234-56789abcdef3'
+        CONN_UUID_DESC_UUID = '72345678-1234-5678-1234-56789abcdef4'
+        self.add_descriptor(
+            NetworkManagerDeviceActiveConnectionDescriptor(0, CONN_TYPE_DESC_UUID, self, 'connection.type'))
+        self.add_descriptor(
+            NetworkManagerDeviceActiveConnectionDescriptor(1, CONN_ID_DESC_UUID, self, 'connection.id'))
+        self.add_descriptor(
+            NetworkManagerDeviceActiveConnectionDescriptor(2, CONN_UUID_DESC_UUID, self, 'connection.uuid'))
+
+        self.value = self.encode(nm_client.get_device_state(device_type))
+        nm_client.add_device_listener(self.on_device_state_changed)
+
+    def encode(self, state: list) -> bytes:
+        """
+        Encode device state, empty if there is no such device
+        """
+        return self.VALUE_LAYOUT.pack(*state) if state else b''
+
+    def on_device_state_changed(self, path, state):
+        """
+        Device state listener
+        """
+        if self.nm_client.get_current_device_path(self.device_type) == path and self.notifying:
+            logger.debug('notify NM device %s state %r', self.device_type, state)
+            self.notify_value(self.encode(state))
+
+    async def read_value(self, _options):
+        """
+        Read value
+        """
+        state = self.nm_client.get_device_state(self.device_type)
+        self.value = self.encode(state)
+        logger.info('read NM device state: %r', state)
+        return self.value
+
+    async def start_notify(self):
+        """
+        Start notifying
+        """
+        logger.info('start notifying NM device %s state', self.device_type)
+        if self.start_notifying():
+            self.notify_value(self.encode(self.nm_client.get_device_state(self.device_type)))
+
+    async def stop_notify(self):
+        """
+        Stop notifying
+        """
+        logger.info('stop notifying NM device %s state', self.device_type)
+        self.stop_notifying()
+
+
+class NetworkManagerDeviceActiveConnectionDescriptor(Descriptor):
+    """
+    Device active connection descriptor
+    """
+
+    def __init__(self, index: int, uuid: str, characteristic: Characteristic, key: str):
+        Descriptor.__init__(self, index, uuid, ['read'], characteristic)
+        self.key = key
+
+    async def read_value(self, _options):
+        """
+        Read value, concurrent reads share the same NM calls
+        """
+        settings = await self.chrc.nm_client.get_active_connection_settings(self.chrc.device_type)
+        value = deep_get(settings, self.key, '')
+        logger.info('read NM %s device active connection setting %s=%s', self.chrc.device_type, self.key, value)
+        return str(value).encode('utf-8')
+
+
+class NetworkManagerStateCharacteristic(Characteristic):
+    """
+    Service for network manager state
+    Expose wireless enabled, networking enabled, connectivity state and network manager state
+    """
+    NETWORK_MANAGER_STATE_CHRC_UUID = '22345678-1234-5678-1234-56781abcdee2'
+    VALUE_LAYOUT = struct.Struct('BBBB')
+
+    def __init__(self, index, service, nm_client):
+        Characteristic.__init__(self, index, self.NETWORK_MANAGER_STATE_CHRC_UUID, ['read', 'notify'], service)
+
+        logger.info('initialize NM state characteristic: %s', self.NETWORK_MANAGER_STATE_CHRC_UUID)
+
+        self.nm_client = nm_client
+        self.value = self.encode(nm_client.get_manager_state())
+        nm_client.add_manager_listener(self.on_manager_state_changed)
+
+    def encode(self, state: list) -> bytes:
+        """
+        Encode network manager state, empty until it is known
+        """
+        return self.VALUE_LAYOUT.pack(*state) if state else b''
+
+    def on_manager_state_changed(self, state):
+        """
+        Network manager state listener
+        """
+        if self.notifying:
+            logger.debug('notify NM state %r', state)
+            self.notify_value(self.encode(state))
+
+    async def read_value(self, _options):
+        """
+        Read value
+        """
+        state = self.nm_client.get_manager_state()
+        self.value = self.encode(state)
+        logger.info('read NM state: %r', state)
+        return self.value
+
+    async def start_notify(self):
+        """
+        Start notifying
+        """
+        logger.info('start notifying NM state')
+        if self.start_notifying():
+            self.notify_value(self.encode(self.nm_client.get_manager_state()))
+
+    async def stop_notify(self):
+        """
+        Stop notifying
+        """
+        logger.info('stop notifying NM state')
+        self.stop_notifying()
+
+
+class NetworkWirelessConfigurationCharacteristic(Characteristic):
+    """
+    Configure wireless network
+    """
+    CHRC_UUID = '97345678-1234-5678-1234-56781abddee2'
+
+    def __init__(self, index, service, nm_client):
+        Characteristic.__init__(self, index, self.CHRC_UUID, ['write'], service)
+
+        logger.info('initialize NM network configuration characteristic: %s', self.CHRC_UUID)
+
+        self.assembler = protocol.WriteAssembler()
+        self.queue = ProvisioningQueue(TaskProvisioner(nm_client))
+
+    async def write_value(self, value, options):
+        """
+        Write value
+        The write is acknowledged before NM is configured, see `ble.protocol` for the format
+        """
+        logger.info('write value to network wireless configuration')
+        device = options['device'].value if 'device' in options else ''
+        offset = options['offset'].value if 'offset' in options else 0
+        try:
+            value = self.assembler.feed(str(device), int(offset), value)
+            if value is None:
+                return
+            config = protocol.decode_wireless_configuration(value)
+        except protocol.ProtocolError as exc:
+            raise DBusError(exc.dbus_error_name, str(exc)) from exc
+
+        ssid = config.get('ssid')
+        psk = config.get('psk')
+        logger.debug('SSID: %s', ssid)
+        if ssid and not psk:
+            logger.warning('missing psk for ssid %s, wireless configuration ignored', ssid)
+            return
+
+        self.queue.submit(str(device), ssid, psk, self.on_applied, self.on_apply_error, self.on_superseded)
+
+    def on_applied(self, device, result, _active_path):
+        """
+        Wireless configuration applied
+        """
+        logger.info('wireless configuration of %s %s', device, result)
+
+    def on_apply_error(self, device, error):
+        """
+        Wireless configuration failed
+        """
+        logger.error('failed to apply wireless configuration of %s: %s', device, error)
+
+    def on_superseded(self, device):
+        """
+        Wireless configuration replaced by a newer one before it was applied
+        """
+        logger.info('wireless configuration of %s superseded', device)
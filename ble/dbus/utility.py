@@ -1,11 +1,45 @@
+import struct
 import dbus
 
 
-def str_to_byte_array(string: str) -> bytearray:
+def to_byte_array(data) -> dbus.ByteArray:
+    """
+    Convert bytes or memoryview to DBus byte array without copying it byte by byte
+    """
+    return dbus.ByteArray(data)
+
+
+def str_to_byte_array(string: str) -> dbus.ByteArray:
     """
     Convert string to DBus byte array
     """
-    byte_array = []
-    for c in string:
-        byte_array.append(dbus.Byte(ord(c)))
-    return byte_array
+    return to_byte_array(string.encode('utf-8'))
+
+
+def struct_to_byte_array(layout: struct.Struct):
+    """
+    Get encoder packing a sequence of values with layout to DBus byte array, empty sequences give an empty array
+    """
+    def encode(values) -> dbus.ByteArray:
+        return to_byte_array(layout.pack(*values) if values else b'')
+    return encode
+
+
+class CachedByteArray:
+    """
+    Encode values to DBus byte array, unchanged values reuse the last encoded array
+    """
+
+    def __init__(self, encoder):
+        self.encoder = encoder
+        self.value = None
+        self.encoded = None
+
+    def encode(self, value) -> dbus.ByteArray:
+        """
+        Encode value
+        """
+        if self.encoded is None or value != self.value:
+            self.value = value
+            self.encoded = self.encoder(value)
+        return self.encoded
@@ -26,13 +26,6 @@ class NotPermittedException(dbus.exceptions.DBusException):
     _dbus_error_name = 'org.bluez.Error.NotPermitted'
 
 
-class InvalidValueLengthException(dbus.exceptions.DBusException):
-    """
-    Invalid value length
-    """
-    _dbus_error_name = 'org.bluez.Error.InvalidValueLength'
-
-
 class FailedException(dbus.exceptions.DBusException):
     """
     General failure
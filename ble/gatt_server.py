@@ -1,15 +1,75 @@
 from __future__ import print_function
 import logging
+import os
 import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
-from . import exceptions
+from gi.repository import GLib
+from . import exceptions, metrics
 from .constants import DBUS_PROP_IFACE, GATT_SERVICE_IFACE, GATT_CHRC_IFACE, GATT_DESC_IFACE
 
 logger = logging.getLogger('wfbt')
 
 
+class Scheduler:
+    """
+    Periodic work of characteristics
+
+    Timers of a characteristic are only armed while it has subscribers and use
+    `timeout_add_seconds` so wakeups are grouped with the other second-based timers
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self.subscribers = {}
+        self.timers = {}
+
+    def register(self, characteristic, interval: int, callback):
+        """
+        Register callback to run every interval seconds while the characteristic has subscribers
+        """
+        self.tasks.setdefault(characteristic.path, []).append((interval, callback))
+        if self.subscribers.get(characteristic.path, 0) > 0:
+            self.arm(characteristic.path, interval, callback)
+
+    def subscribe(self, characteristic):
+        """
+        Add a subscriber to characteristic, arm its timers on first subscriber
+        """
+        count = self.subscribers.get(characteristic.path, 0) + 1
+        self.subscribers[characteristic.path] = count
+        if count == 1:
+            for interval, callback in self.tasks.get(characteristic.path, []):
+                self.arm(characteristic.path, interval, callback)
+
+    def unsubscribe(self, characteristic):
+        """
+        Remove a subscriber from characteristic, disarm its timers on last subscriber
+        """
+        count = max(self.subscribers.get(characteristic.path, 0) - 1, 0)
+        self.subscribers[characteristic.path] = count
+        if count == 0:
+            for source_id in self.timers.pop(characteristic.path, []):
+                GLib.source_remove(source_id)
+
+    def arm(self, path: str, interval: int, callback):
+        """
+        Arm periodic timer
+        """
+        logger.debug('arm %ss timer for %s', interval, path)
+        source_id = GLib.timeout_add_seconds(interval, self.run, path, callback)
+        self.timers.setdefault(path, []).append(source_id)
+
+    def run(self, path: str, callback):
+        """
+        Timer callback, wakeups are counted in `wfbt_scheduler_wakeups_total`
+        """
+        metrics.increment('wfbt_scheduler_wakeups', (('path', path),))
+        callback()
+        return True
+
+
 class Service(dbus.service.Object):
     """
     org.bluez.GattService1 interface implementation
@@ -27,21 +87,34 @@ class Service(dbus.service.Object):
         self.uuid = uuid
         self.primary = primary
         self.characteristics = []
+        self.scheduler = Scheduler()
+        self.application = None
+        self.properties = None
         dbus.service.Object.__init__(self, bus, self.path)
 
     def get_properties(self):
         """
-        Get properties
-        """
-        return {
-            GATT_SERVICE_IFACE: {
-                'UUID': self.uuid,
-                'Primary': self.primary,
-                'Characteristics': dbus.Array(
-                    self.get_characteristic_paths(),
-                    signature='o')
+        Get properties, built once until the hierarchy changes
+        """
+        if self.properties is None:
+            self.properties = {
+                GATT_SERVICE_IFACE: {
+                    'UUID': self.uuid,
+                    'Primary': self.primary,
+                    'Characteristics': dbus.Array(
+                        self.get_characteristic_paths(),
+                        signature='o')
+                }
             }
-        }
+        return self.properties
+
+    def invalidate(self):
+        """
+        Drop cached properties and the application object tree
+        """
+        self.properties = None
+        if self.application is not None:
+            self.application.invalidate()
 
     def get_path(self):
         """
@@ -54,6 +127,7 @@ class Service(dbus.service.Object):
         Add characteristic
         """
         self.characteristics.append(characteristic)
+        self.invalidate()
 
     def get_characteristic_paths(self):
         """
@@ -73,6 +147,7 @@ class Service(dbus.service.Object):
     @dbus.service.method(DBUS_PROP_IFACE,
                          in_signature='s',
                          out_signature='a{sv}')
+    @metrics.instrumented
     def GetAll(self, interface):
         """"
         Get all
@@ -86,7 +161,12 @@ class Service(dbus.service.Object):
 class Characteristic(dbus.service.Object):
     """
     org.bluez.GattCharacteristic1 interface implementation
+
+    Notifications sent through `notify_value` are coalesced within `NOTIFY_DEBOUNCE_MS`,
+    spaced by at least `NOTIFY_MIN_INTERVAL_MS` and only sent when the value changed
     """
+    NOTIFY_DEBOUNCE_MS = int(os.environ.get('NOTIFY_DEBOUNCE_MS', '100'))
+    NOTIFY_MIN_INTERVAL_MS = int(os.environ.get('NOTIFY_MIN_INTERVAL_MS', '250'))
 
     def __init__(self, bus, index, uuid, flags, service):  # pylint: disable=too-many-arguments
         self.path = service.path + '/char' + str(index)
@@ -100,22 +180,38 @@ class Characteristic(dbus.service.Object):
         self.service = service
         self.flags = flags
         self.descriptors = []
+        self.notifying = False
+        self.subscribers = 0
+        self.notify_timer = None
+        self.pending_value = None
+        self.notified_value = None
+        self.last_notify_time = 0
+        self.properties = None
         dbus.service.Object.__init__(self, bus, self.path)
 
     def get_properties(self):
         """
-        Get properties
-        """
-        return {
-            GATT_CHRC_IFACE: {
-                'Service': self.service.get_path(),
-                'UUID': self.uuid,
-                'Flags': self.flags,
-                'Descriptors': dbus.Array(
-                    self.get_descriptor_paths(),
-                    signature='o')
+        Get properties, built once until the hierarchy changes
+        """
+        if self.properties is None:
+            self.properties = {
+                GATT_CHRC_IFACE: {
+                    'Service': self.service.get_path(),
+                    'UUID': self.uuid,
+                    'Flags': self.flags,
+                    'Descriptors': dbus.Array(
+                        self.get_descriptor_paths(),
+                        signature='o')
+                }
             }
-        }
+        return self.properties
+
+    def invalidate(self):
+        """
+        Drop cached properties and the application object tree
+        """
+        self.properties = None
+        self.service.invalidate()
 
     def get_path(self):
         """
@@ -128,6 +224,7 @@ class Characteristic(dbus.service.Object):
         Add descriptor to descriptor list
         """
         self.descriptors.append(descriptor)
+        self.invalidate()
 
     def get_descriptor_paths(self):
         """
@@ -144,7 +241,71 @@ class Characteristic(dbus.service.Object):
         """
         return self.descriptors
 
+    def add_periodic_task(self, interval: int, callback):
+        """
+        Run callback every interval seconds while notifying
+        """
+        self.service.scheduler.register(self, interval, callback)
+
+    def start_notifying(self):
+        """
+        Start notifying, return False if it was already notifying
+
+        The application is registered on every adapter and each one calls StartNotify and StopNotify,
+        notifications stop once every adapter stopped them
+        """
+        self.subscribers += 1
+        self.service.scheduler.subscribe(self)
+        if self.notifying:
+            return False
+        self.notifying = True
+        self.reset_notification()
+        return True
+
+    def stop_notifying(self):
+        """
+        Stop notifying, return False if it was not notifying or other adapters still are
+        """
+        if self.subscribers == 0:
+            return False
+        self.subscribers -= 1
+        self.service.scheduler.unsubscribe(self)
+        if self.subscribers > 0:
+            return False
+        self.notifying = False
+        return True
+
+    def notify_value(self, value):
+        """
+        Queue value notification
+        """
+        self.pending_value = value
+        if self.notify_timer is None:
+            elapsed_ms = (GLib.get_monotonic_time() - self.last_notify_time) // 1000
+            delay_ms = max(self.NOTIFY_DEBOUNCE_MS, self.NOTIFY_MIN_INTERVAL_MS - elapsed_ms)
+            self.notify_timer = GLib.timeout_add(delay_ms, self.flush_notification)
+
+    def reset_notification(self):
+        """
+        Forget the last notified value so the next one is always sent
+        """
+        self.notified_value = None
+
+    def flush_notification(self):
+        """
+        Send the latest queued value if it changed since the last notification
+        """
+        self.notify_timer = None
+        value = self.pending_value
+        self.pending_value = None
+        if self.notifying and value is not None and value != self.notified_value:
+            self.notified_value = value
+            self.last_notify_time = GLib.get_monotonic_time()
+            self.PropertiesChanged(GATT_CHRC_IFACE, {'Value': value}, [])
+        return False
+
     @dbus.service.method(DBUS_PROP_IFACE, in_signature='s', out_signature='a{sv}')
+    @metrics.instrumented
     def GetAll(self, interface):
         """
         Get all
@@ -155,6 +316,7 @@ class Characteristic(dbus.service.Object):
         return self.get_properties()[GATT_CHRC_IFACE]
 
     @dbus.service.method(GATT_CHRC_IFACE, in_signature='a{sv}', out_signature='ay')
+    @metrics.instrumented
     def ReadValue(self, _options):
         """
         Read value
@@ -163,6 +325,7 @@ class Characteristic(dbus.service.Object):
         raise exceptions.NotSupportedException()
 
     @dbus.service.method(GATT_CHRC_IFACE, in_signature='aya{sv}')
+    @metrics.instrumented
     def WriteValue(self, _value, _options):
         """
         Write value
@@ -171,6 +334,7 @@ class Characteristic(dbus.service.Object):
         raise exceptions.NotSupportedException()
 
     @dbus.service.method(GATT_CHRC_IFACE)
+    @metrics.instrumented
     def StartNotify(self):
         """
         Start notify
@@ -179,6 +343,7 @@ class Characteristic(dbus.service.Object):
         raise exceptions.NotSupportedException()
 
     @dbus.service.method(GATT_CHRC_IFACE)
+    @metrics.instrumented
     def StopNotify(self):
         """
         Stop notify
@@ -204,19 +369,22 @@ class Descriptor(dbus.service.Object):
         self.uuid = uuid
         self.flags = flags
         self.chrc = characteristic
+        self.properties = None
         dbus.service.Object.__init__(self, bus, self.path)
 
     def get_properties(self):
         """
-        Get properties
+        Get properties, built once
         """
-        return {
-            GATT_DESC_IFACE: {
-                'Characteristic': self.chrc.get_path(),
-                'UUID': self.uuid,
-                'Flags': self.flags,
+        if self.properties is None:
+            self.properties = {
+                GATT_DESC_IFACE: {
+                    'Characteristic': self.chrc.get_path(),
+                    'UUID': self.uuid,
+                    'Flags': self.flags,
+                }
             }
-        }
+        return self.properties
 
     def get_path(self):
         """
@@ -225,6 +393,7 @@ class Descriptor(dbus.service.Object):
         return dbus.ObjectPath(self.path)
 
     @dbus.service.method(DBUS_PROP_IFACE, in_signature='s', out_signature='a{sv}')
+    @metrics.instrumented
     def GetAll(self, interface):
         """
         Get all
@@ -235,6 +404,7 @@ class Descriptor(dbus.service.Object):
         return self.get_properties()[GATT_DESC_IFACE]
 
     @dbus.service.method(GATT_DESC_IFACE, in_signature='a{sv}', out_signature='ay')
+    @metrics.instrumented
     def ReadValue(self, _options):
         """
         Read value
@@ -243,6 +413,7 @@ class Descriptor(dbus.service.Object):
         raise exceptions.NotSupportedException()
 
     @dbus.service.method(GATT_DESC_IFACE, in_signature='aya{sv}')
+    @metrics.instrumented
     def WriteValue(self, _value, _options):
         """
         Write value
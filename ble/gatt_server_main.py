@@ -5,6 +5,7 @@ import dbus
 import dbus.exceptions
 from ble.service_network import NetworkService
 from .constants import BLUEZ_SERVICE_NAME, DBUS_OM_IFACE, GATT_MANAGER_IFACE
+from . import metrics, startup
 
 logger = logging.getLogger('wfbt')
 
@@ -14,13 +15,14 @@ class Application(dbus.service.Object):
     org.bluez.GattApplication1 interface implementation
     """
 
-    def __init__(self, bus):
+    def __init__(self, bus, nm_state):
         self.path = '/'
         self.services = []
+        self.managed_objects = None
         dbus.service.Object.__init__(self, bus, self.path)
 
         # Register network ble service
-        self.add_service(NetworkService(bus, 0))
+        self.add_service(NetworkService(bus, 0, nm_state))
 
     def get_path(self):
         """
@@ -32,53 +34,79 @@ class Application(dbus.service.Object):
         """
         Add service to list services
         """
+        service.application = self
         self.services.append(service)
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Drop the managed object tree, it is rebuilt on next request
+        """
+        self.managed_objects = None
+
+    def get_managed_objects(self):
+        """
+        Get managed object tree, built once until the hierarchy changes
+        """
+        if self.managed_objects is None:
+            response = {}
+            for service in self.services:
+                response[service.get_path()] = service.get_properties()
+                chrcs = service.get_characteristics()
+                for chrc in chrcs:
+                    response[chrc.get_path()] = chrc.get_properties()
+                    descs = chrc.get_descriptors()
+                    for desc in descs:
+                        response[desc.get_path()] = desc.get_properties()
+            self.managed_objects = response
+        return self.managed_objects
 
     @dbus.service.method(DBUS_OM_IFACE, out_signature='a{oa{sa{sv}}}')
+    @metrics.instrumented
     def GetManagedObjects(self):
         """
         Get managed objects
         """
-        response = {}
-        for service in self.services:
-            response[service.get_path()] = service.get_properties()
-            chrcs = service.get_characteristics()
-            for chrc in chrcs:
-                response[chrc.get_path()] = chrc.get_properties()
-                descs = chrc.get_descriptors()
-                for desc in descs:
-                    response[desc.get_path()] = desc.get_properties()
+        return self.get_managed_objects()
 
-        return response
 
-
-def register_app_cb():
+def register_app_cb(adapter_path):
     """
     Callback for application registration
     """
-    logger.info('GATT application registered')
+    logger.info('GATT application registered on %s after %.1f ms', adapter_path, startup.elapsed_ms())
 
 
-def register_app_error_cb(mainloop, error):
+def register_app_error_cb(mainloop, adapters, failed, adapter_path, error):  # pylint: disable=too-many-arguments
     """
-    Callback for application registration error
+    Callback for application registration error, quit once it failed on every adapter
     """
-    logger.error(f"Failed to register application: {str(error)}")
-    mainloop.quit()
+    logger.error('Failed to register application on %s: %s', adapter_path, error)
+    failed.add(adapter_path)
+    adapter_paths = adapters.get_adapter_paths()
+    if adapter_paths and failed.issuperset(adapter_paths):
+        mainloop.quit()
 
 
-def gatt_server_main(mainloop, bus, adapter):
+def gatt_server_main(mainloop, bus, adapters, nm_state):
     """
-    GATT server main
+    GATT server main, one application sharing the state cache is registered on every adapter
     """
-    service_manager = dbus.Interface(
-        bus.get_object(BLUEZ_SERVICE_NAME, adapter.get_path()),
-        GATT_MANAGER_IFACE)
+    app = Application(bus, nm_state)
+    failed = set()
+
+    def register(adapter):
+        service_manager = dbus.Interface(
+            bus.get_object(BLUEZ_SERVICE_NAME, adapter.get_path()),
+            GATT_MANAGER_IFACE)
 
-    app = Application(bus)
+        logger.info('Registering GATT application on %s...', adapter.get_path())
 
-    logger.info('Registering GATT application...')
+        service_manager.RegisterApplication(app.get_path(), {},
+                                            reply_handler=functools.partial(register_app_cb, adapter.get_path()),
+                                            error_handler=functools.partial(register_app_error_cb, mainloop, adapters,
+                                                                            failed, adapter.get_path()))
 
-    service_manager.RegisterApplication(app.get_path(), {},
-                                        reply_handler=register_app_cb,
-                                        error_handler=functools.partial(register_app_error_cb, mainloop))
+    adapters.add_listener(register)
+    # a replugged adapter gets a new chance
+    adapters.add_remove_listener(failed.discard)
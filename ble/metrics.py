@@ -0,0 +1,272 @@
+"""
+Latency histograms and call counters exposed in Prometheus text format on a Unix socket
+
+Instrumentation is only installed when `METRICS_SOCKET` is set or the loop monitor is enabled,
+otherwise decorators return the original methods and handlers are passed through untouched
+"""
+import bisect
+import contextlib
+import functools
+import inspect
+import logging
+import os
+import socket
+import time
+from gi.repository import GLib
+from . import watchdog
+
+logger = logging.getLogger('wfbt')
+
+METRICS_SOCKET = os.environ.get('METRICS_SOCKET')
+ENABLED = bool(METRICS_SOCKET)
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """
+    Latency histogram with call and error counters
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool):
+        """
+        Record a call duration
+        """
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        if error:
+            self.errors += 1
+
+
+class Registry:
+    """
+    Histograms and counters by metric name and labels
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.counters = {}
+
+    def observe(self, name: str, labels: tuple, seconds: float, error: bool = False):  # pylint: disable=too-many-arguments
+        """
+        Record a call duration
+        """
+        histogram = self.metrics.get((name, labels))
+        if histogram is None:
+            histogram = self.metrics[(name, labels)] = Histogram()
+        histogram.observe(seconds, error)
+
+    def increment(self, name: str, labels: tuple):
+        """
+        Increment a counter
+        """
+        self.counters[(name, labels)] = self.counters.get((name, labels), 0) + 1
+
+    def render(self) -> str:
+        """
+        Render metrics in Prometheus text format
+        """
+        lines = []
+        for name in sorted({name for name, _labels in self.metrics}):
+            durations = [f'# TYPE {name}_duration_seconds histogram']
+            calls = [f'# TYPE {name}_calls_total counter']
+            errors = [f'# TYPE {name}_errors_total counter']
+            for (metric, labels), histogram in sorted(self.metrics.items(), key=lambda item: item[0]):
+                if metric != name:
+                    continue
+                label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), histogram.buckets):
+                    cumulative += count
+                    durations.append(f'{name}_duration_seconds_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                durations.append(f'{name}_duration_seconds_sum{{{label_text}}} {histogram.sum}')
+                durations.append(f'{name}_duration_seconds_count{{{label_text}}} {histogram.count}')
+                calls.append(f'{name}_calls_total{{{label_text}}} {histogram.count}')
+                errors.append(f'{name}_errors_total{{{label_text}}} {histogram.errors}')
+            lines += durations + calls + errors
+        for name in sorted({name for name, _labels in self.counters}):
+            lines.append(f'# TYPE {name}_total counter')
+            for (metric, labels), count in sorted(self.counters.items(), key=lambda item: item[0]):
+                if metric == name:
+                    label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+                    lines.append(f'{name}_total{{{label_text}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def increment(name: str, labels: tuple):
+    """
+    Increment a counter when metrics are enabled
+    """
+    if ENABLED:
+        registry.increment(name, labels)
+
+
+def instrumented(func):
+    """
+    Record latency of an exported DBus method, asynchronous methods are measured until their reply
+
+    The time spent on the main loop by the method itself is reported to the loop monitor
+    """
+    if not ENABLED and not watchdog.ENABLED:
+        return func
+
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        labels = (('method', name), ('path', self.path))
+        start = time.perf_counter()
+        if 'reply_handler' in kwargs:
+            kwargs['reply_handler'], kwargs['error_handler'] = track(
+                'wfbt_dbus_method', labels, kwargs['reply_handler'], kwargs['error_handler'], start)
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                watchdog.record_callback(f'{name} {self.path}', time.perf_counter() - start)
+        error = True
+        try:
+            result = func(self, *args, **kwargs)
+            error = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            if ENABLED:
+                registry.observe('wfbt_dbus_method', labels, elapsed, error)
+            watchdog.record_callback(f'{name} {self.path}', elapsed)
+
+    # dbus-python reads the method arguments from the signature
+    wrapper.__signature__ = inspect.signature(func)
+    return wrapper
+
+
+def track(name: str, labels: tuple, reply_handler, error_handler, start: float = None):  # pylint: disable=too-many-arguments
+    """
+    Wrap asynchronous call handlers to record the latency until the reply or the error
+    """
+    if not ENABLED:
+        return reply_handler, error_handler
+
+    start = time.perf_counter() if start is None else start
+
+    def on_reply(*args):
+        registry.observe(name, labels, time.perf_counter() - start)
+        return reply_handler(*args)
+
+    def on_error(*args):
+        registry.observe(name, labels, time.perf_counter() - start, True)
+        return error_handler(*args)
+
+    return on_reply, on_error
+
+
+def track_nm(method: str, reply_handler, error_handler):
+    """
+    Wrap handlers of an asynchronous NM call
+    """
+    return track('wfbt_nm_call', (('method', method),), reply_handler, error_handler)
+
+
+@contextlib.contextmanager
+def _measure(name: str, labels: tuple, callback: str):
+    start = time.perf_counter()
+    error = True
+    try:
+        yield
+        error = False
+    finally:
+        elapsed = time.perf_counter() - start
+        if ENABLED:
+            registry.observe(name, labels, elapsed, error)
+        watchdog.record_callback(callback, elapsed)
+
+
+def measure_nm(method: str):
+    """
+    Context manager recording the latency of a blocking NM call, it blocks the main loop meanwhile
+    """
+    if not ENABLED and not watchdog.ENABLED:
+        return contextlib.nullcontext()
+    return _measure('wfbt_nm_call', (('method', method),), f'NM {method}')
+
+
+class MetricsServer:
+    """
+    Serve the registry to every connection on a Unix socket as an HTTP response, rendered only when scraped
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.responses = {}
+        if os.path.exists(path):
+            os.unlink(path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(path)
+        self.socket.listen(4)
+        self.socket.setblocking(False)
+        GLib.io_add_watch(self.socket.fileno(), GLib.IO_IN, self.on_connection)
+        logger.info('metrics served on %s', path)
+
+    def on_connection(self, _fd, _condition):
+        """
+        Accept a scrape and write the metrics, what the socket does not accept at once is written once it is writable
+        """
+        try:
+            connection, _address = self.socket.accept()
+        except BlockingIOError:
+            return True
+        connection.setblocking(False)
+        body = registry.render().encode('utf-8')
+        response = (b'HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                    + f'Content-Length: {len(body)}\r\n\r\n'.encode('ascii') + body)
+        remainder = self.write(connection, memoryview(response))
+        if remainder is not None:
+            self.responses[connection.fileno()] = (connection, remainder)
+            GLib.io_add_watch(connection.fileno(), GLib.IO_OUT | GLib.IO_ERR | GLib.IO_HUP, self.on_writable)
+        return True
+
+    def on_writable(self, fd, _condition):
+        """
+        Write the remainder of a response
+        """
+        connection, data = self.responses.pop(fd)
+        remainder = self.write(connection, data)
+        if remainder is None:
+            return False
+        self.responses[fd] = (connection, remainder)
+        return True
+
+    @staticmethod
+    def write(connection, data):
+        """
+        Write what the socket accepts without blocking, return the remainder or None once the connection is closed
+        """
+        try:
+            data = data[connection.send(data):]
+        except BlockingIOError:
+            pass
+        except OSError as error:
+            logger.debug('metrics scrape failed: %s', error)
+            data = data[:0]
+        if data:
+            return data
+        connection.close()
+        return None
+
+
+def metrics_main():
+    """
+    Start the metrics server when `METRICS_SOCKET` is set
+    """
+    if ENABLED:
+        return MetricsServer(METRICS_SOCKET)
+    return None
@@ -0,0 +1,81 @@
+"""
+Active connection activation tracking
+"""
+import logging
+import os
+from gi.repository import GLib
+from ..constants import DBUS_PROP_IFACE, NM_SERVICE_NAME, NM_ACTIVE_CONNECTION_IFACE
+from . import utility as nm_util
+
+logger = logging.getLogger('wfbt')
+
+ACTIVATION_TIMEOUT_SECONDS = int(os.environ.get('ACTIVATION_TIMEOUT_SECONDS', '30'))
+
+# NMActiveConnectionState
+ACTIVE_CONNECTION_STATE_ACTIVATED = 2
+ACTIVE_CONNECTION_STATE_DEACTIVATED = 4
+
+
+class ActiveConnectionTracker:
+    """
+    Follow `StateChanged` signals of an active connection until it is activated,
+    deactivated or the timeout expires
+    """
+
+    def __init__(self, bus, path: str, state_callback, timeout_callback, timeout: int = ACTIVATION_TIMEOUT_SECONDS):  # pylint: disable=too-many-arguments
+        self.path = path
+        self.state_callback = state_callback
+        self.timeout_callback = timeout_callback
+        self.last_state = None
+        self.match = bus.add_signal_receiver(self.on_state_changed,
+                                             signal_name='StateChanged',
+                                             dbus_interface=NM_ACTIVE_CONNECTION_IFACE,
+                                             bus_name=NM_SERVICE_NAME,
+                                             path=path)
+        self.timer = GLib.timeout_add_seconds(timeout, self.on_timeout)
+
+        # the state may have changed before the signal was subscribed
+        properties = nm_util.get_interface(bus, path, DBUS_PROP_IFACE)
+        nm_util.call_async(properties, 'Get', NM_ACTIVE_CONNECTION_IFACE, 'State',
+                           reply_handler=lambda state: self.on_state_changed(state, 0),
+                           error_handler=lambda error: logger.debug('unable to read state of %s: %s', path, error))
+
+    def is_tracking(self):
+        """
+        Check if the active connection is still followed
+        """
+        return self.match is not None
+
+    def on_state_changed(self, state, reason):
+        """
+        Active connection `StateChanged` signal handler
+        """
+        if not self.is_tracking() or self.last_state == (int(state), int(reason)):
+            return
+        self.last_state = (int(state), int(reason))
+        logger.info('active connection %s state: %s, reason: %s', self.path, int(state), int(reason))
+        self.state_callback(int(state), int(reason))
+        if int(state) in [ACTIVE_CONNECTION_STATE_ACTIVATED, ACTIVE_CONNECTION_STATE_DEACTIVATED]:
+            self.stop()
+
+    def on_timeout(self):
+        """
+        Activation timeout handler
+        """
+        self.timer = None
+        if self.is_tracking():
+            logger.warning('active connection %s activation timed out', self.path)
+            self.stop()
+            self.timeout_callback()
+        return False
+
+    def stop(self):
+        """
+        Stop following the active connection
+        """
+        if self.match is not None:
+            self.match.remove()
+            self.match = None
+        if self.timer is not None:
+            GLib.source_remove(self.timer)
+            self.timer = None
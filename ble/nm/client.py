@@ -0,0 +1,87 @@
+"""
+Thin NetworkManager client reading properties through cached proxies
+"""
+import logging
+from typing import NamedTuple
+from ..constants import DBUS_PROP_IFACE, NM_SERVICE_NAME, NM_PATH, NM_IFACE, NM_DEVICE_IFACE
+from . import utility as nm_util
+
+logger = logging.getLogger('wfbt')
+
+
+class ManagerState(NamedTuple):
+    """
+    Network manager state properties
+    """
+    wireless_enabled: int
+    networking_enabled: int
+    connectivity: int
+    state: int
+
+
+class DeviceState(NamedTuple):
+    """
+    Device state and state reason
+    """
+    state: int
+    reason: int
+
+
+class NetworkManagerClient:
+    """
+    Read NM properties without python-networkmanager
+
+    Properties of an object are fetched with a single asynchronous `GetAll` or `Get` call, proxies are created once
+    per object path on the main bus connection and dropped when the device is removed
+    """
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.proxies = {}
+
+        bus.add_signal_receiver(self.on_device_removed,
+                                signal_name='DeviceRemoved',
+                                dbus_interface=NM_IFACE,
+                                bus_name=NM_SERVICE_NAME,
+                                path=NM_PATH)
+
+    def reset(self):
+        """
+        Drop every proxy, they are bound to the NM connection that created them
+        """
+        self.proxies = {}
+
+    def get_properties(self, path: str):
+        """
+        Get cached properties interface of a NM object
+        """
+        properties = self.proxies.get(path)
+        if properties is None:
+            properties = nm_util.get_interface(self.bus, path, DBUS_PROP_IFACE)
+            self.proxies[path] = properties
+        return properties
+
+    def get_manager_state(self, reply_handler, error_handler):
+        """
+        Read network manager state with a single `GetAll`, reply handler is called with a `ManagerState`
+        """
+        def on_properties(properties):
+            reply_handler(ManagerState(int(properties['WirelessEnabled']), int(properties['NetworkingEnabled']),
+                                       int(properties['Connectivity']), int(properties['State'])))
+        nm_util.call_async(self.get_properties(NM_PATH), 'GetAll', NM_IFACE,
+                           reply_handler=on_properties, error_handler=error_handler)
+
+    def get_device_state(self, path: str, reply_handler, error_handler):
+        """
+        Read device state and state reason, reply handler is called with a `DeviceState`
+        """
+        nm_util.call_async(self.get_properties(path), 'Get', NM_DEVICE_IFACE, 'StateReason',
+                           reply_handler=lambda state_reason: reply_handler(DeviceState(int(state_reason[0]),
+                                                                                        int(state_reason[1]))),
+                           error_handler=error_handler)
+
+    def on_device_removed(self, path):
+        """
+        NM `DeviceRemoved` signal handler
+        """
+        self.proxies.pop(str(path), None)
@@ -0,0 +1,165 @@
+"""
+NM settings helpers, state and connection index shared by the GLib and asyncio engines, without DBus bindings
+"""
+import functools
+import logging
+from ..constants import NM_STATE_PROPERTIES, WIRELESS_CONNECTION_TYPE
+
+logger = logging.getLogger('wfbt')
+
+
+def deep_get(dictionary, keys, default=None):
+    """
+    Retrieve value by key in deep object
+    """
+    return functools.reduce(lambda d, key: d.get(key, default) if isinstance(d, dict) else default, keys.split('.'), dictionary)
+
+
+def get_ssid(settings: dict):
+    """
+    Get SSID of wireless connection settings as text, the settings carry it as a byte array
+    """
+    ssid = settings.get(WIRELESS_CONNECTION_TYPE, {}).get('ssid')
+    return None if ssid is None else bytes(ssid).decode('utf-8', 'replace')
+
+
+class NetworkState:
+    """
+    Network manager and device states, listeners are called as soon as a value changes
+    """
+
+    def __init__(self):
+        self.manager_state = {}
+        self.device_states = {}
+        self.manager_listeners = []
+        self.device_listeners = []
+
+    def clear_states(self):
+        """
+        Forget manager and device states
+        """
+        self.manager_state = {}
+        self.device_states = {}
+
+    def get_manager_state(self):
+        """
+        Get network manager state as [wireless enabled, networking enabled, connectivity, state],
+        empty until every property is known
+        """
+        if len(self.manager_state) < len(NM_STATE_PROPERTIES):
+            return []
+        return [self.manager_state[name] for name in NM_STATE_PROPERTIES]
+
+    def add_manager_listener(self, callback):
+        """
+        Register callback called with the new network manager state
+        """
+        self.manager_listeners.append(callback)
+
+    def add_device_listener(self, callback):
+        """
+        Register callback called with the device path and the new device state
+        """
+        self.device_listeners.append(callback)
+
+    def update_manager_state(self, changed: dict):
+        """
+        Store network manager state properties and call listeners if they changed
+        """
+        updated = False
+        for name in NM_STATE_PROPERTIES:
+            if name in changed and self.manager_state.get(name) != int(changed[name]):
+                self.manager_state[name] = int(changed[name])
+                updated = True
+        # listeners are only called once every property is known
+        state = self.get_manager_state()
+        if updated and state:
+            logger.debug('NM state changed %r', state)
+            for callback in self.manager_listeners:
+                callback(state)
+
+    def update_device_state(self, path: str, state: list):
+        """
+        Store device state and call listeners if it changed
+        """
+        if self.device_states.get(path) == state:
+            return
+        self.device_states[path] = state
+        logger.debug('NM device %s state changed %r', path, state)
+        for callback in self.device_listeners:
+            callback(path, list(state))
+
+
+class ConnectionTable:
+    """
+    Saved connection paths indexed by type, UUID and SSID along with their settings
+    """
+
+    def __init__(self):
+        self.connections = {}
+        self.by_type = {}
+        self.by_uuid = {}
+        self.by_ssid = {}
+
+    def clear(self):
+        """
+        Forget every connection
+        """
+        self.connections = {}
+        self.by_type = {}
+        self.by_uuid = {}
+        self.by_ssid = {}
+
+    def add_connection(self, path: str, settings: dict):
+        """
+        Add connection to the index
+        """
+        self.remove_connection(path)
+
+        settings_conn = settings.get('connection', {})
+        conn_type = settings_conn.get('type')
+        conn_uuid = settings_conn.get('uuid')
+        ssid = get_ssid(settings)
+        logger.debug('index %s connection %s: %s', conn_type, conn_uuid, path)
+
+        self.connections[path] = settings
+        self.by_type.setdefault(conn_type, []).append(path)
+        if conn_uuid is not None:
+            self.by_uuid[conn_uuid] = path
+        if ssid is not None:
+            self.by_ssid.setdefault(ssid, []).append(path)
+
+    def remove_connection(self, path: str):
+        """
+        Remove connection from the index
+        """
+        if path not in self.connections:
+            return
+        settings = self.connections.pop(path)
+        settings_conn = settings.get('connection', {})
+        self.by_type[settings_conn.get('type')].remove(path)
+        if self.by_uuid.get(settings_conn.get('uuid')) == path:
+            del self.by_uuid[settings_conn.get('uuid')]
+        ssid = get_ssid(settings)
+        if ssid is not None:
+            self.by_ssid[ssid].remove(path)
+            if not self.by_ssid[ssid]:
+                del self.by_ssid[ssid]
+
+    def get_connections_by_type(self, conn_type: str):
+        """
+        Get connection paths by type
+        """
+        return list(self.by_type.get(conn_type, []))
+
+    def get_connections_by_ssid(self, ssid: str):
+        """
+        Get wireless connection paths by SSID
+        """
+        return list(self.by_ssid.get(ssid, []))
+
+    def get_settings(self, path: str):
+        """
+        Get indexed settings of a connection
+        """
+        return self.connections.get(path)
@@ -0,0 +1,135 @@
+"""
+NetworkManager connection index kept up to date through NM signals
+"""
+import functools
+import logging
+from ..constants import NM_SERVICE_NAME, NM_SETTINGS_PATH, NM_SETTINGS_IFACE, NM_CONNECTION_IFACE
+from .common import ConnectionTable
+from . import utility as nm_util
+
+logger = logging.getLogger('wfbt')
+
+
+class ConnectionIndex(ConnectionTable):
+    """
+    Index of saved connection paths by type, UUID and SSID
+
+    Connections and their settings are listed asynchronously on first `load` then maintained from `NewConnection`,
+    `ConnectionRemoved` and connection `Updated` signals, settings are fetched without blocking the main loop
+    """
+
+    def __init__(self, bus):
+        ConnectionTable.__init__(self)
+        self.bus = bus
+        self.loader = nm_util.AsyncLoader(self.start_load)
+        self.fetching = set()
+
+        bus.add_signal_receiver(self.on_new_connection,
+                                signal_name='NewConnection',
+                                dbus_interface=NM_SETTINGS_IFACE,
+                                bus_name=NM_SERVICE_NAME,
+                                path=NM_SETTINGS_PATH)
+        bus.add_signal_receiver(self.on_connection_removed,
+                                signal_name='ConnectionRemoved',
+                                dbus_interface=NM_SETTINGS_IFACE,
+                                bus_name=NM_SERVICE_NAME,
+                                path=NM_SETTINGS_PATH)
+        bus.add_signal_receiver(self.on_connection_updated,
+                                signal_name='Updated',
+                                dbus_interface=NM_CONNECTION_IFACE,
+                                bus_name=NM_SERVICE_NAME,
+                                path_keyword='path')
+
+    def load(self, reply_handler, error_handler):
+        """
+        List connections on first use, reply handler is called once every connection is indexed
+        """
+        self.loader.load(reply_handler, error_handler)
+
+    def start_load(self, generation: int):
+        """
+        List connections of NM
+        """
+        nm_util.call_async(nm_util.get_interface(self.bus, NM_SETTINGS_PATH, NM_SETTINGS_IFACE), 'ListConnections',
+                           reply_handler=functools.partial(self.on_connections_listed, generation),
+                           error_handler=functools.partial(self.on_load_error, generation))
+
+    def reset(self):
+        """
+        Forget every connection, replies of the previous NM instance are ignored and a load
+        in progress is started again so its callers get the new connections
+        """
+        self.fetching = set()
+        self.clear()
+        self.loader.reset()
+
+    def fetch_settings(self, generation: int, path: str):
+        """
+        Fetch connection settings and index them
+        """
+        self.fetching.add(path)
+        nm_util.call_async(nm_util.get_interface(self.bus, path, NM_CONNECTION_IFACE), 'GetSettings',
+                           reply_handler=functools.partial(self.on_settings, generation, path),
+                           error_handler=functools.partial(self.on_settings_error, generation, path))
+
+    def on_connections_listed(self, generation: int, paths):
+        """
+        `ListConnections` reply handler, fetch the settings of every connection
+        """
+        if not self.loader.is_current(generation):
+            return
+        paths = [str(path) for path in paths]
+        self.loader.expect(generation, paths)
+        for path in paths:
+            self.fetch_settings(generation, path)
+
+    def on_load_error(self, generation: int, error):
+        """
+        `ListConnections` error handler, the next load tries again
+        """
+        if self.loader.is_current(generation):
+            logger.error('unable to list connections: %s', error)
+            self.loader.failed(generation, error)
+
+    def on_settings(self, generation: int, path: str, settings):
+        """
+        `GetSettings` reply handler, skipped if the connection was removed meanwhile
+        """
+        if not self.loader.is_current(generation):
+            return
+        if path in self.fetching:
+            self.fetching.discard(path)
+            self.add_connection(path, settings)
+        self.loader.fetched(generation, path)
+
+    def on_settings_error(self, generation: int, path: str, error):
+        """
+        `GetSettings` error handler, the connection was most likely removed meanwhile
+        """
+        if not self.loader.is_current(generation):
+            return
+        logger.warning('unable to read settings of connection %s: %s', path, error)
+        self.fetching.discard(path)
+        self.remove_connection(path)
+        self.loader.fetched(generation, path)
+
+    def on_new_connection(self, path):
+        """
+        Settings `NewConnection` signal handler
+        """
+        if self.loader.loaded or self.loader.loading:
+            self.fetch_settings(self.loader.generation, str(path))
+
+    def on_connection_removed(self, path):
+        """
+        Settings `ConnectionRemoved` signal handler
+        """
+        self.fetching.discard(str(path))
+        self.remove_connection(str(path))
+
+    def on_connection_updated(self, path=None):
+        """
+        Connection `Updated` signal handler
+        """
+        if str(path) in self.connections:
+            self.fetch_settings(self.loader.generation, str(path))
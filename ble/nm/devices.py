@@ -0,0 +1,154 @@
+"""
+NetworkManager device index kept up to date through NM signals
+"""
+import functools
+import logging
+from ..constants import DBUS_PROP_IFACE, NM_SERVICE_NAME, NM_PATH, NM_IFACE, NM_DEVICE_IFACE, NM_DEVICE_TYPES
+from . import utility as nm_util
+
+logger = logging.getLogger('wfbt')
+
+
+class DeviceIndex:
+    """
+    Index of network devices by device type and interface name
+
+    Devices are enumerated asynchronously on first `load` then added and removed from `DeviceAdded`
+    and `DeviceRemoved` signals, lookups never call NM and find nothing until the index is loaded
+    """
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.loader = nm_util.AsyncLoader(self.start_load)
+        self.devices = {}
+        self.by_type = {}
+        self.by_interface = {}
+        self.adding = set()
+
+        bus.add_signal_receiver(self.on_device_added,
+                                signal_name='DeviceAdded',
+                                dbus_interface=NM_IFACE,
+                                bus_name=NM_SERVICE_NAME,
+                                path=NM_PATH)
+        bus.add_signal_receiver(self.on_device_removed,
+                                signal_name='DeviceRemoved',
+                                dbus_interface=NM_IFACE,
+                                bus_name=NM_SERVICE_NAME,
+                                path=NM_PATH)
+
+    def load(self, reply_handler, error_handler):
+        """
+        Enumerate devices on first use, reply handler is called once every device is indexed
+        """
+        self.loader.load(reply_handler, error_handler)
+
+    def start_load(self, generation: int):
+        """
+        List devices of NM
+        """
+        nm_util.call_async(nm_util.get_interface(self.bus, NM_PATH, NM_IFACE), 'GetAllDevices',
+                           reply_handler=functools.partial(self.on_devices_listed, generation),
+                           error_handler=functools.partial(self.loader.failed, generation))
+
+    def reset(self):
+        """
+        Forget every device, they are enumerated again
+        """
+        self.devices = {}
+        self.by_type = {}
+        self.by_interface = {}
+        self.adding = set()
+        self.loader.reset()
+
+    def fetch_device(self, generation: int, path: str):
+        """
+        Fetch device properties and index it
+        """
+        self.adding.add(path)
+        nm_util.call_async(nm_util.get_interface(self.bus, path, DBUS_PROP_IFACE), 'GetAll', NM_DEVICE_IFACE,
+                           reply_handler=functools.partial(self.on_device_properties, generation, path),
+                           error_handler=functools.partial(self.on_device_error, generation, path))
+
+    def add_device(self, path: str, properties: dict):
+        """
+        Add device to the index from its properties
+        """
+        if path in self.devices:
+            return
+        device_type = NM_DEVICE_TYPES.get(int(properties['DeviceType']), str(properties['DeviceType']))
+        interface = str(properties['Interface'])
+        logger.debug('index %s device %s: %s', device_type, interface, path)
+        self.devices[path] = (device_type, interface)
+        self.by_type.setdefault(device_type, []).append(path)
+        self.by_interface[interface] = path
+
+    def remove_device(self, path: str):
+        """
+        Remove device from the index
+        """
+        if path not in self.devices:
+            return
+        device_type, interface = self.devices.pop(path)
+        logger.debug('remove %s device %s: %s', device_type, interface, path)
+        self.by_type[device_type].remove(path)
+        if self.by_interface.get(interface) == path:
+            del self.by_interface[interface]
+
+    def get_current_device_path(self, device_type: str):
+        """
+        Get current device object path by type
+        """
+        paths = self.by_type.get(device_type)
+        return None if not paths else paths[0]
+
+    def get_device_path_by_interface(self, interface: str):
+        """
+        Get device object path by interface name
+        """
+        return self.by_interface.get(interface)
+
+    def on_devices_listed(self, generation: int, paths):
+        """
+        `GetAllDevices` reply handler, fetch the properties of every device
+        """
+        if not self.loader.is_current(generation):
+            return
+        paths = [str(path) for path in paths]
+        self.loader.expect(generation, paths)
+        for path in paths:
+            self.fetch_device(generation, path)
+
+    def on_device_properties(self, generation: int, path: str, properties: dict):
+        """
+        Device properties reply handler, skipped if the device was removed meanwhile
+        """
+        if not self.loader.is_current(generation):
+            return
+        if path in self.adding:
+            self.adding.discard(path)
+            self.add_device(path, properties)
+        self.loader.fetched(generation, path)
+
+    def on_device_error(self, generation: int, path: str, error):
+        """
+        Device properties error handler, the device was most likely removed meanwhile
+        """
+        if not self.loader.is_current(generation):
+            return
+        logger.warning('unable to read device %s: %s', path, error)
+        self.adding.discard(path)
+        self.loader.fetched(generation, path)
+
+    def on_device_added(self, path):
+        """
+        NM `DeviceAdded` signal handler
+        """
+        if self.loader.loaded or self.loader.loading:
+            self.fetch_device(self.loader.generation, str(path))
+
+    def on_device_removed(self, path):
+        """
+        NM `DeviceRemoved` signal handler
+        """
+        self.adding.discard(str(path))
+        self.remove_device(str(path))
@@ -0,0 +1,151 @@
+"""
+Wireless provisioning driven through asynchronous NM calls
+"""
+import functools
+import logging
+import dbus
+from ..constants import NM_PATH, NM_IFACE, NM_SETTINGS_PATH, NM_SETTINGS_IFACE, NM_CONNECTION_IFACE, WIRELESS_CONNECTION_TYPE
+from .common import deep_get
+from . import utility as nm_util
+
+logger = logging.getLogger('wfbt')
+
+CONNECTION_SETTINGS_SIGNATURE = 'a{sa{sv}}'
+
+
+class WirelessProvisioner:
+    """
+    Apply wireless configurations without blocking the main loop
+
+    Every NM call is issued with reply and error handlers, the result is reported
+    through the handlers given to `apply` as 'unchanged', 'updated', 'added' or 'removed'
+    along with the path of the active connection if one was activated
+    """
+
+    def __init__(self, bus, nm_state):
+        self.bus = bus
+        self.nm_state = nm_state
+
+    def apply(self, ssid: str, psk: str, reply_handler, error_handler):
+        """
+        Add or update the wireless connection of a SSID, other connections are left untouched
+        An empty SSID removes every wireless connection
+        """
+        devices, connections = self.nm_state.devices, self.nm_state.connections
+        devices.load(lambda: connections.load(lambda: self.apply_loaded(ssid, psk, reply_handler, error_handler),
+                                              error_handler),
+                     error_handler)
+
+    def apply_loaded(self, ssid: str, psk: str, reply_handler, error_handler):
+        """
+        Apply wireless configuration once devices and saved connections are indexed
+        """
+        if not ssid:
+            self.remove_all(reply_handler, error_handler)
+            return
+
+        connections = self.nm_state.connections
+        for path in connections.get_connections_by_ssid(ssid):
+            if deep_get(connections.get_settings(path), 'connection.type') == WIRELESS_CONNECTION_TYPE:
+                self.update(path, psk, reply_handler, error_handler)
+                return
+
+        self.add(ssid, psk, reply_handler, error_handler)
+
+    def add(self, ssid: str, psk: str, reply_handler, error_handler):
+        """
+        Add wireless connection and activate it on the wifi device
+        """
+        logger.info('add wireless connection for ssid: %s', ssid)
+        settings = nm_util.wireless_connection_settings(ssid, psk)
+        device_path = self.nm_state.devices.get_current_device_path('wifi')
+        if device_path is None:
+            nm_util.call_async(
+                nm_util.get_interface(self.bus, NM_SETTINGS_PATH, NM_SETTINGS_IFACE), 'AddConnection',
+                settings, signature=CONNECTION_SETTINGS_SIGNATURE,
+                reply_handler=lambda _path: reply_handler('added', None),
+                error_handler=error_handler)
+            return
+
+        nm_util.call_async(
+            nm_util.get_interface(self.bus, NM_PATH, NM_IFACE), 'AddAndActivateConnection',
+            settings, dbus.ObjectPath(device_path), dbus.ObjectPath('/'),
+            signature=CONNECTION_SETTINGS_SIGNATURE + 'oo',
+            reply_handler=lambda _path, active_path: reply_handler('added', str(active_path)),
+            error_handler=error_handler)
+
+    def update(self, path: str, psk: str, reply_handler, error_handler):
+        """
+        Update wireless connection pre-shared key in place if it changed
+        """
+        connection = nm_util.get_interface(self.bus, path, NM_CONNECTION_IFACE)
+
+        def on_settings(settings):
+            logger.info('update wireless connection: %s', path)
+            settings['802-11-wireless-security'] = nm_util.wireless_security_settings(psk)
+            nm_util.call_async(connection, 'Update', settings, signature=CONNECTION_SETTINGS_SIGNATURE,
+                               reply_handler=lambda: self.activate(path, 'updated', reply_handler, error_handler),
+                               error_handler=error_handler)
+
+        def on_secrets(secrets):
+            if deep_get(secrets, '802-11-wireless-security.psk') == psk:
+                logger.info('wireless connection %s is unchanged', path)
+                reply_handler('unchanged', None)
+                return
+            nm_util.call_async(connection, 'GetSettings', reply_handler=on_settings, error_handler=error_handler)
+
+        def on_secrets_error(error):
+            logger.debug('unable to read secrets of %s: %s', path, error)
+            nm_util.call_async(connection, 'GetSettings', reply_handler=on_settings, error_handler=error_handler)
+
+        nm_util.call_async(connection, 'GetSecrets', '802-11-wireless-security',
+                           reply_handler=on_secrets, error_handler=on_secrets_error)
+
+    def activate(self, path: str, result: str, reply_handler, error_handler):
+        """
+        Activate connection on the wifi device
+        """
+        device_path = self.nm_state.devices.get_current_device_path('wifi')
+        if device_path is None:
+            reply_handler(result, None)
+            return
+
+        nm_util.call_async(
+            nm_util.get_interface(self.bus, NM_PATH, NM_IFACE), 'ActivateConnection',
+            dbus.ObjectPath(path), dbus.ObjectPath(device_path), dbus.ObjectPath('/'),
+            reply_handler=lambda active_path: reply_handler(result, str(active_path)),
+            error_handler=error_handler)
+
+    def remove_all(self, reply_handler, error_handler):
+        """
+        Remove every wireless connection, a single handler is called once every `Delete` returned
+        with the first error if any of them failed
+        """
+        paths = self.nm_state.connections.get_connections_by_type(WIRELESS_CONNECTION_TYPE)
+        if not paths:
+            reply_handler('removed', None)
+            return
+
+        pending = set(paths)
+        errors = []
+
+        def on_deleted(path, error=None):
+            if path not in pending:
+                return
+            pending.discard(path)
+            if error is not None:
+                logger.error('failed to delete network connection %s: %s', path, error)
+                errors.append(error)
+            if pending:
+                return
+            if errors:
+                error_handler(errors[0])
+            else:
+                reply_handler('removed', None)
+
+        for path in paths:
+            logger.info('delete network connection: %s', path)
+            nm_util.call_async(
+                nm_util.get_interface(self.bus, path, NM_CONNECTION_IFACE), 'Delete',
+                reply_handler=functools.partial(on_deleted, path),
+                error_handler=functools.partial(on_deleted, path))
@@ -0,0 +1,120 @@
+"""
+Ordered apply queue for wireless configurations written by several centrals
+"""
+import logging
+
+logger = logging.getLogger('wfbt')
+
+
+class ProvisioningRequest:
+    """
+    Wireless configuration and the writers waiting for its result
+    """
+
+    def __init__(self, ssid: str, psk: str):
+        self.ssid = ssid
+        self.psk = psk
+        self.waiters = []
+        self.done = False
+
+    def matches(self, ssid: str, psk: str):
+        """
+        Check if the request applies the same configuration
+        """
+        return self.ssid == ssid and self.psk == psk
+
+    def add_waiter(self, writer: str, reply_handler, error_handler, superseded_handler):  # pylint: disable=too-many-arguments
+        """
+        Add a writer waiting for the result
+        """
+        self.waiters.append((writer, reply_handler, error_handler, superseded_handler))
+
+
+class ProvisioningQueue:
+    """
+    Apply wireless configurations one at a time, in write order
+
+    A configuration written while another one is applied waits for it, the last writer wins:
+    a newer configuration replaces the waiting one and its writers are told they were superseded.
+    Writers of a configuration identical to the applied or waiting one share its result
+    so NM work is never repeated
+    """
+
+    def __init__(self, provisioner):
+        self.provisioner = provisioner
+        self.current = None
+        self.pending = None
+
+    def submit(self, writer: str, ssid: str, psk: str, reply_handler, error_handler, superseded_handler):  # pylint: disable=too-many-arguments
+        """
+        Queue a wireless configuration, handlers are called with the writer once it is applied, failed or superseded
+        """
+        if self.pending is not None and self.pending.matches(ssid, psk):
+            logger.debug('wireless configuration of %s joins the waiting one', writer)
+            self.pending.add_waiter(writer, reply_handler, error_handler, superseded_handler)
+            return
+
+        self.supersede(writer)
+        if self.current is not None and self.current.matches(ssid, psk):
+            logger.debug('wireless configuration of %s joins the one in progress', writer)
+            self.current.add_waiter(writer, reply_handler, error_handler, superseded_handler)
+            return
+
+        self.pending = ProvisioningRequest(ssid, psk)
+        self.pending.add_waiter(writer, reply_handler, error_handler, superseded_handler)
+        if self.current is None:
+            self.next()
+
+    def supersede(self, writer: str):
+        """
+        Drop the waiting configuration, replaced by the one of writer
+        """
+        if self.pending is None:
+            return
+        for waiter, _reply_handler, _error_handler, superseded_handler in self.pending.waiters:
+            logger.info('wireless configuration of %s superseded by %s', waiter, writer)
+            superseded_handler(waiter)
+        self.pending = None
+
+    def next(self):
+        """
+        Apply the waiting configuration
+        """
+        self.current, self.pending = self.pending, None
+        if self.current is None:
+            return
+        request = self.current
+        self.provisioner.apply(request.ssid, request.psk,
+                               lambda result, active_path: self.on_applied(request, result, active_path),
+                               lambda error: self.on_apply_error(request, error))
+
+    def complete(self, request):
+        """
+        Mark the request done, return False if it already completed or is not the one being applied
+        """
+        if request.done or request is not self.current:
+            logger.warning('ignore extra completion of wireless configuration %s', request.ssid)
+            return False
+        request.done = True
+        self.current = None
+        return True
+
+    def on_applied(self, request, result: str, active_path):
+        """
+        Configuration applied, notify its writers and apply the next one
+        """
+        if not self.complete(request):
+            return
+        for writer, reply_handler, _error_handler, _superseded_handler in request.waiters:
+            reply_handler(writer, result, active_path)
+        self.next()
+
+    def on_apply_error(self, request, error):
+        """
+        Configuration failed, notify its writers and apply the next one
+        """
+        if not self.complete(request):
+            return
+        for writer, _reply_handler, error_handler, _superseded_handler in request.waiters:
+            error_handler(writer, error)
+        self.next()
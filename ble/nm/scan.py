@@ -0,0 +1,194 @@
+"""
+Wireless access point scan cache
+"""
+import logging
+import os
+import dbus
+from gi.repository import GLib
+from ..constants import DBUS_PROP_IFACE, NM_SERVICE_NAME, NM_WIRELESS_IFACE, NM_ACCESS_POINT_IFACE
+from . import utility as nm_util
+
+logger = logging.getLogger('wfbt')
+
+SCAN_CACHE_TTL_SECONDS = int(os.environ.get('SCAN_CACHE_TTL_SECONDS', '30'))
+SCAN_TIMEOUT_SECONDS = 10
+
+# NM80211ApFlags privacy flag
+AP_FLAGS_PRIVACY = 0x1
+
+
+class WirelessScanCache:
+    """
+    Cache of nearby access points, deduplicated by SSID keeping the strongest one
+
+    Access points are served from memory, a scan is requested in the background
+    when they are older than `SCAN_CACHE_TTL_SECONDS`, listeners are called with the
+    new access points once the scan completes
+    """
+
+    def __init__(self, bus, devices, ttl: int = SCAN_CACHE_TTL_SECONDS):
+        self.bus = bus
+        self.devices = devices
+        self.ttl = ttl
+        self.access_points = []
+        self.updated_time = None
+        self.scan_device_path = None
+        self.scan_timer = None
+        self.listeners = []
+
+        bus.add_signal_receiver(self.on_properties_changed,
+                                signal_name='PropertiesChanged',
+                                dbus_interface=DBUS_PROP_IFACE,
+                                bus_name=NM_SERVICE_NAME,
+                                path_keyword='path')
+
+    def reset(self):
+        """
+        Drop access points and forget the scan in progress, NM restarted
+        """
+        if self.scan_timer is not None:
+            GLib.source_remove(self.scan_timer)
+            self.scan_timer = None
+        self.scan_device_path = None
+        self.access_points = []
+        self.updated_time = None
+
+    def add_listener(self, callback):
+        """
+        Register callback called with the access points after each scan
+        """
+        self.listeners.append(callback)
+
+    def is_fresh(self):
+        """
+        Check if access points are younger than the TTL
+        """
+        return self.updated_time is not None and GLib.get_monotonic_time() - self.updated_time < self.ttl * 1000000
+
+    def is_scanning(self):
+        """
+        Check if a scan is in progress
+        """
+        return self.scan_device_path is not None
+
+    def get_access_points(self):
+        """
+        Get access points as (ssid, strength, secured) tuples sorted by strength,
+        a scan is requested if they are stale
+        """
+        if not self.is_fresh():
+            self.request_scan()
+        return self.access_points
+
+    def request_scan(self):
+        """
+        Request scan on the wifi device, does nothing if a scan is in progress
+        """
+        device_path = self.devices.get_current_device_path('wifi')
+        if self.is_scanning() or device_path is None:
+            return
+
+        logger.info('request wireless scan on %s', device_path)
+        self.scan_device_path = device_path
+        self.scan_timer = GLib.timeout_add_seconds(SCAN_TIMEOUT_SECONDS, self.on_scan_timeout)
+        nm_util.call_async(
+            nm_util.get_interface(self.bus, device_path, NM_WIRELESS_IFACE), 'RequestScan',
+            dbus.Dictionary({}, signature='sv'),
+            reply_handler=lambda: None,
+            error_handler=self.on_scan_error)
+
+    def on_scan_error(self, error):
+        """
+        RequestScan error handler, NM refuses scans right after a previous one
+        so access points known to NM are collected anyway
+        """
+        logger.debug('wireless scan request failed: %s', error)
+        self.collect()
+
+    def on_scan_timeout(self):
+        """
+        Scan timeout handler, for NM versions without `LastScan`
+        """
+        self.scan_timer = None
+        self.collect()
+        return False
+
+    def on_properties_changed(self, interface, changed, _invalidated, path=None):
+        """
+        Wireless device `PropertiesChanged` signal handler
+        """
+        if interface == NM_WIRELESS_IFACE and 'LastScan' in changed and str(path) == self.scan_device_path:
+            self.collect()
+
+    def collect(self):
+        """
+        Collect access points of the scanned device
+        """
+        if not self.is_scanning():
+            return
+        if self.scan_timer is not None:
+            GLib.source_remove(self.scan_timer)
+            self.scan_timer = None
+
+        device = nm_util.get_interface(self.bus, self.scan_device_path, NM_WIRELESS_IFACE)
+        nm_util.call_async(device, 'GetAllAccessPoints',
+                           reply_handler=self.on_access_point_paths, error_handler=self.on_collect_error)
+
+    def on_access_point_paths(self, paths):
+        """
+        GetAllAccessPoints reply handler, fetch properties of every access point
+        """
+        pending = {str(path) for path in paths}
+        found = []
+        if not pending:
+            self.update([])
+            return
+
+        def on_properties(path, properties):
+            found.append(properties)
+            done(path)
+
+        def on_error(path, error):
+            logger.debug('unable to read access point %s: %s', path, error)
+            done(path)
+
+        def done(path):
+            pending.discard(path)
+            if not pending:
+                self.update(found)
+
+        for path in list(pending):
+            nm_util.call_async(
+                nm_util.get_interface(self.bus, path, DBUS_PROP_IFACE), 'GetAll',
+                NM_ACCESS_POINT_IFACE,
+                reply_handler=lambda properties, path=path: on_properties(path, properties),
+                error_handler=lambda error, path=path: on_error(path, error))
+
+    def on_collect_error(self, error):
+        """
+        GetAllAccessPoints error handler
+        """
+        logger.error('failed to collect access points: %s', error)
+        self.scan_device_path = None
+
+    def update(self, found: list):
+        """
+        Store access points, keeping the strongest of each SSID
+        """
+        strongest = {}
+        for properties in found:
+            ssid = bytes(properties.get('Ssid', b''))
+            if not ssid:
+                continue
+            strength = int(properties.get('Strength', 0))
+            secured = bool(int(properties.get('Flags', 0)) & AP_FLAGS_PRIVACY
+                           or int(properties.get('WpaFlags', 0)) or int(properties.get('RsnFlags', 0)))
+            if ssid not in strongest or strongest[ssid][1] < strength:
+                strongest[ssid] = (ssid, strength, secured)
+
+        self.access_points = sorted(strongest.values(), key=lambda ap: ap[1], reverse=True)
+        self.updated_time = GLib.get_monotonic_time()
+        self.scan_device_path = None
+        logger.info('wireless scan found %s networks', len(self.access_points))
+        for callback in self.listeners:
+            callback(self.access_points)
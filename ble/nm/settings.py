@@ -0,0 +1,101 @@
+"""
+Active connection settings snapshot shared by device descriptors
+"""
+import logging
+from ..constants import (DBUS_PROP_IFACE, DBUS_SERVICE_NAME, DBUS_IFACE, NM_SERVICE_NAME, NM_DEVICE_IFACE, NM_CONNECTION_IFACE,
+                         NM_ACTIVE_CONNECTION_IFACE)
+from . import utility as nm_util
+
+logger = logging.getLogger('wfbt')
+
+
+class ActiveConnectionSettings:
+    """
+    Snapshot of the settings of the active connection of the current device of a type
+
+    Settings are fetched on first access and invalidated when the device `ActiveConnection`
+    changes, when the connection is updated or removed or when NM restarts
+    """
+
+    def __init__(self, bus, devices, device_type: str):
+        self.bus = bus
+        self.devices = devices
+        self.device_type = device_type
+        self.device_path = None
+        self.connection_path = None
+        self.settings = None
+
+        bus.add_signal_receiver(self.on_device_properties_changed,
+                                signal_name='PropertiesChanged',
+                                dbus_interface=DBUS_PROP_IFACE,
+                                bus_name=NM_SERVICE_NAME,
+                                path_keyword='path')
+        bus.add_signal_receiver(self.on_connection_changed,
+                                signal_name='Updated',
+                                dbus_interface=NM_CONNECTION_IFACE,
+                                bus_name=NM_SERVICE_NAME,
+                                path_keyword='path')
+        bus.add_signal_receiver(self.on_name_owner_changed,
+                                signal_name='NameOwnerChanged',
+                                dbus_interface=DBUS_IFACE,
+                                bus_name=DBUS_SERVICE_NAME,
+                                arg0=NM_SERVICE_NAME)
+        bus.add_signal_receiver(self.on_connection_changed,
+                                signal_name='Removed',
+                                dbus_interface=NM_CONNECTION_IFACE,
+                                bus_name=NM_SERVICE_NAME,
+                                path_keyword='path')
+
+    def get_settings(self):
+        """
+        Get active connection settings, empty if the device has no active connection
+        """
+        device_path = self.devices.get_current_device_path(self.device_type)
+        if self.settings is None or device_path != self.device_path:
+            self.refresh(device_path)
+        return self.settings
+
+    def refresh(self, device_path):
+        """
+        Fetch active connection settings of the device
+        """
+        self.device_path = device_path
+        self.connection_path = None
+        self.settings = {}
+        if device_path is None:
+            return
+
+        device = nm_util.get_interface(self.bus, device_path, DBUS_PROP_IFACE)
+        active_path = str(nm_util.call(device, 'Get', NM_DEVICE_IFACE, 'ActiveConnection'))
+        if active_path != '/':
+            active_conn = nm_util.get_interface(self.bus, active_path, DBUS_PROP_IFACE)
+            self.connection_path = str(nm_util.call(active_conn, 'Get', NM_ACTIVE_CONNECTION_IFACE, 'Connection'))
+            connection = nm_util.get_interface(self.bus, self.connection_path, NM_CONNECTION_IFACE)
+            self.settings = nm_util.call(connection, 'GetSettings') or {}
+        logger.debug('fetched %s active connection settings: %s', self.device_type, self.connection_path)
+
+    def invalidate(self):
+        """
+        Drop the snapshot, settings are fetched again on next access
+        """
+        self.settings = None
+
+    def on_device_properties_changed(self, interface, changed, _invalidated, path=None):
+        """
+        Device `PropertiesChanged` signal handler
+        """
+        if interface == NM_DEVICE_IFACE and 'ActiveConnection' in changed and str(path) == self.device_path:
+            self.invalidate()
+
+    def on_connection_changed(self, path=None):
+        """
+        Connection `Updated` and `Removed` signal handler
+        """
+        if self.connection_path is not None and str(path) == self.connection_path:
+            self.invalidate()
+
+    def on_name_owner_changed(self, _name, _old_owner, _new_owner):
+        """
+        `NameOwnerChanged` signal handler, the object paths of the snapshot are gone when NM restarts
+        """
+        self.invalidate()
@@ -0,0 +1,124 @@
+"""
+NetworkManager state cache kept up to date through NM signals
+"""
+import logging
+from ..constants import (DBUS_PROP_IFACE, DBUS_SERVICE_NAME, DBUS_IFACE, NM_SERVICE_NAME, NM_PATH, NM_IFACE, NM_DEVICE_IFACE,
+                         NM_STATE_PROPERTIES)
+from .common import NetworkState
+from .client import NetworkManagerClient
+from .devices import DeviceIndex
+from .connections import ConnectionIndex
+from .scan import WirelessScanCache
+
+logger = logging.getLogger('wfbt')
+
+
+class NetworkManagerStateCache(NetworkState):
+    """
+    Cache of network manager and device states
+
+    Values are read asynchronously on creation then updated from `PropertiesChanged` and device `StateChanged` signals,
+    listeners are called as soon as a value changes, reads never call NM. Everything is read again when NM restarts
+    """
+
+    def __init__(self, bus):
+        NetworkState.__init__(self)
+        self.bus = bus
+        self.client = NetworkManagerClient(bus)
+        self.devices = DeviceIndex(bus)
+        self.connections = ConnectionIndex(bus)
+        self.scan = WirelessScanCache(bus, self.devices)
+
+        bus.add_signal_receiver(self.on_properties_changed,
+                                signal_name='PropertiesChanged',
+                                dbus_interface=DBUS_PROP_IFACE,
+                                bus_name=NM_SERVICE_NAME,
+                                path_keyword='path')
+        bus.add_signal_receiver(self.on_device_state_changed,
+                                signal_name='StateChanged',
+                                dbus_interface=NM_DEVICE_IFACE,
+                                bus_name=NM_SERVICE_NAME,
+                                path_keyword='path')
+        bus.add_signal_receiver(self.on_name_owner_changed,
+                                signal_name='NameOwnerChanged',
+                                dbus_interface=DBUS_IFACE,
+                                bus_name=DBUS_SERVICE_NAME,
+                                arg0=NM_SERVICE_NAME)
+
+        # states are read in the background, device states once devices are indexed
+        self.refresh_manager_state()
+        self.devices.load(self.on_devices_loaded, self.on_devices_error)
+
+    def refresh_manager_state(self):
+        """
+        Read network manager state from NM in the background, listeners are called if it changed
+        """
+        self.client.get_manager_state(
+            lambda state: self.update_manager_state(dict(zip(NM_STATE_PROPERTIES, state))),
+            lambda error: logger.error('unable to read NM state: %s', error))
+
+    def refresh_device_state(self, device_type: str):
+        """
+        Read current device state of a type from NM in the background, listeners are called if it changed
+        """
+        path = self.devices.get_current_device_path(device_type)
+        if path is not None:
+            self.client.get_device_state(
+                path,
+                lambda state: self.update_device_state(path, list(state)),
+                lambda error: logger.error('unable to read NM device %s state: %s', path, error))
+
+    def get_device_state(self, device_type: str):
+        """
+        Get current device state as [state, reason], empty if there is no such device or until it was read
+        """
+        path = self.devices.get_current_device_path(device_type)
+        if path is None:
+            return []
+        return list(self.device_states.get(path, []))
+
+    def on_devices_loaded(self):
+        """
+        Device index loaded, read the state of the current devices
+        """
+        for device_type in ['ethernet', 'wifi']:
+            self.refresh_device_state(device_type)
+
+    def on_devices_error(self, error):
+        """
+        Device index load error handler
+        """
+        logger.error('unable to enumerate NM devices: %s', error)
+
+    def on_properties_changed(self, interface, changed, _invalidated, path=None):
+        """
+        NM `PropertiesChanged` signal handler
+        """
+        if interface == NM_IFACE and path == NM_PATH:
+            self.update_manager_state(changed)
+        elif interface == NM_DEVICE_IFACE and 'StateReason' in changed:
+            state_reason = changed['StateReason']
+            self.update_device_state(str(path), [int(state_reason[0]), int(state_reason[1])])
+
+    def on_device_state_changed(self, new_state, _old_state, reason, path=None):
+        """
+        NM device `StateChanged` signal handler
+        """
+        self.update_device_state(str(path), [int(new_state), int(reason)])
+
+    def on_name_owner_changed(self, _name, _old_owner, new_owner):
+        """
+        `NameOwnerChanged` signal handler, signals are missed while NM is not running and its object paths
+        change so every cache is dropped, states are read again in the background once NM is back
+        """
+        self.client.reset()
+        self.devices.reset()
+        self.connections.reset()
+        self.scan.reset()
+        self.clear_states()
+        if not new_owner:
+            logger.warning('NM stopped')
+            return
+        logger.info('NM started, resync state')
+        self.refresh_manager_state()
+        self.devices.load(self.on_devices_loaded, self.on_devices_error)
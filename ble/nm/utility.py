@@ -1,79 +1,148 @@
 from uuid import uuid4
 import logging
-from NetworkManager import NetworkManager, const, Settings
+import dbus
+from .. import metrics
+from ..constants import NM_SERVICE_NAME
 
 logger = logging.getLogger('wfbt')
 
 
-def get_devices():
+def wireless_security_settings(password: str):
     """
-    Get all network devices
+    Build wireless security settings
     """
-    return NetworkManager.GetAllDevices()
+    return {
+        "key-mgmt": "wpa-psk",
+        "auth-alg": "open",
+        "psk": password
+    }
 
 
-def get_devices_by_type(device_type: str):
+def wireless_connection_settings(ssid: str, password: str):
     """
-    Get devices by type
+    Build wireless connection settings as DBus values
     """
-    return list(filter(lambda _device: const('device_type', _device.DeviceType) in [device_type], get_devices()))
+    return {
+        '802-11-wireless': {
+            'ssid': dbus.ByteArray(ssid.encode()),
+        },
+        '802-11-wireless-security': wireless_security_settings(password),
+        'connection': {
+            'id': ssid,
+            'type': '802-11-wireless',
+            'uuid': str(uuid4())
+        },
+        'ipv4': {'method': 'auto'},
+        'ipv6': {'method': 'auto'}
+    }
 
 
-def get_current_device(device_type: str):
+def get_interface(bus, path: str, interface: str):
     """
-    Get current device by type
+    Get NM object interface without introspecting it
     """
-    logger.debug(f'get current device by type {device_type}')
-    devices = get_devices_by_type(device_type)
-    return None if len(devices) <= 0 else devices[0]
+    return dbus.Interface(bus.get_object(NM_SERVICE_NAME, path, introspect=False), interface)
 
 
-def get_all_wireless_connections():
+def call_async(interface, method: str, *args, reply_handler, error_handler, **kwargs):
     """
-    Get all wireless connections
+    Issue asynchronous NM call, its latency is recorded when metrics are enabled
     """
-    logger.debug('get all wireless connection')
-    wireless_connections = []
-    connections = Settings.ListConnections()
-    # filter connections
-    for conn in connections:
-        settings = conn.GetSettings()
-        settings_conn = settings['connection']
-        if "type" in settings_conn:
-            if settings_conn['type'] == "802-11-wireless":
-                wireless_connections.append(conn)
-    return wireless_connections
-
-
-def delete_network_connection_by_uuid(uuid: str):
+    reply_handler, error_handler = metrics.track_nm(method, reply_handler, error_handler)
+    getattr(interface, method)(*args, reply_handler=reply_handler, error_handler=error_handler, **kwargs)
+
+
+def call(interface, method: str, *args, **kwargs):
     """
-    Delete network connection by UUID
+    Issue blocking NM call, its latency is recorded when metrics are enabled
     """
-    logger.info(f'delete network connection by id: {uuid}')
-    connection = Settings.GetConnectionByUuid(uuid)
-    return connection.Delete()
+    with metrics.measure_nm(method):
+        return getattr(interface, method)(*args, **kwargs)
 
 
-def add_wireless_connection(ssid: str, password: str):
+class AsyncLoader:
     """
-    Add wireless connection
+    State of an asynchronous load shared by every caller waiting for it
+
+    `start` is called with the generation of the load. A reset starts a new generation, replies of
+    older generations are ignored and a load in progress is started again for the new one
     """
-    logger.info(f'add wireless connection for ssid: {ssid}')
-    conn = {
-        '802-11-wireless': {
-            'ssid': ssid,
-        },
-        '802-11-wireless-security': {
-            "key-mgmt": "wpa-psk",
-            "auth-alg": "open",
-            "psk": password
-        },
-        'connection': {
-            'id': ssid,
-            'type': '802-11-wireless',
-            'uuid': str(uuid4())
-        },
-        'ipv4': {'method': 'auto'},
-        'ipv6': {'method': 'auto'}
-    }
-    return Settings.AddConnection(conn)
+
+    def __init__(self, start):
+        self.start = start
+        self.generation = 0
+        self.loading = False
+        self.loaded = False
+        self.pending = set()
+        self.handlers = []
+
+    def load(self, reply_handler, error_handler):
+        """
+        Start loading on first use, reply handler is called once loaded
+        """
+        if self.loaded:
+            reply_handler()
+            return
+        self.handlers.append((reply_handler, error_handler))
+        if not self.loading:
+            self.loading = True
+            self.start(self.generation)
+
+    def is_current(self, generation: int):
+        """
+        Check if a reply belongs to the current generation
+        """
+        return generation == self.generation
+
+    def expect(self, generation: int, keys):
+        """
+        Wait for every key to be fetched before the load completes
+        """
+        if not self.is_current(generation):
+            return
+        self.pending = set(keys)
+        if not self.pending:
+            self.done(generation)
+
+    def fetched(self, generation: int, key):
+        """
+        Key fetched, complete the load once every expected key is
+        """
+        if self.is_current(generation) and key in self.pending:
+            self.pending.discard(key)
+            if not self.pending:
+                self.done(generation)
+
+    def done(self, generation: int):
+        """
+        Load completed, call reply handlers
+        """
+        if not self.is_current(generation):
+            return
+        self.loading = False
+        self.loaded = True
+        handlers, self.handlers = self.handlers, []
+        for reply_handler, _error_handler in handlers:
+            reply_handler()
+
+    def failed(self, generation: int, error):
+        """
+        Load failed, call error handlers, the next load tries again
+        """
+        if not self.is_current(generation):
+            return
+        self.loading = False
+        self.pending = set()
+        handlers, self.handlers = self.handlers, []
+        for _reply_handler, error_handler in handlers:
+            error_handler(error)
+
+    def reset(self):
+        """
+        Forget the loaded state, a load in progress is started again
+        """
+        self.generation += 1
+        self.loaded = False
+        self.pending = set()
+        if self.loading:
+            self.start(self.generation)
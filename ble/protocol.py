@@ -0,0 +1,203 @@
+"""
+Wireless configuration protocol
+
+A frame is made of a version byte, the payload length as a big-endian unsigned short
+and a payload of TLV records, each one being a type byte, a length byte and the value.
+Frames longer than the ATT MTU are split over long or prepared writes and reassembled
+from their offsets.
+
+Payloads that don't start with the version byte are decoded with the legacy
+`ssid=...&psk=...` query string format.
+
+Invalid values raise `ProtocolError`, each engine reports it with its DBus error name.
+
+Scanned access points are encoded as a list of records, each one being the signal
+strength, the flags and the SSID length bytes followed by the SSID. Notifications
+split them in pages starting with the page index and the page count, long reads
+serve every chunk from the value read at offset 0.
+"""
+import struct
+import urllib.parse
+
+PROTOCOL_VERSION = 0x01
+FRAME_HEADER = struct.Struct('>BH')
+TLV_HEADER = struct.Struct('>BB')
+MAX_FRAME_LENGTH = 512
+
+
+class ProtocolError(Exception):
+    """
+    Invalid written value
+    """
+    dbus_error_name = 'org.freedesktop.DBus.Error.InvalidArgs'
+
+
+class InvalidOffsetError(ProtocolError):
+    """
+    Chunk offset does not follow the previous chunks or is past the end of the value
+    """
+    dbus_error_name = 'org.bluez.Error.InvalidOffset'
+
+
+class InvalidValueLengthError(ProtocolError):
+    """
+    Reassembled value longer than a frame
+    """
+    dbus_error_name = 'org.bluez.Error.InvalidValueLength'
+
+
+TLV_SSID = 0x01
+TLV_PSK = 0x02
+TLV_NAMES = {
+    TLV_SSID: 'ssid',
+    TLV_PSK: 'psk',
+}
+
+
+def encode_frame(records: dict) -> bytes:
+    """
+    Encode wireless configuration frame from a dict of record name to value
+    """
+    payload = bytearray()
+    for tlv_type, name in TLV_NAMES.items():
+        if name in records:
+            value = records[name].encode('utf-8')
+            payload += TLV_HEADER.pack(tlv_type, len(value)) + value
+    return FRAME_HEADER.pack(PROTOCOL_VERSION, len(payload)) + payload
+
+
+def decode_frame(frame: bytes) -> dict:
+    """
+    Decode wireless configuration frame, unknown records are skipped
+    """
+    view = memoryview(frame)
+    if len(view) < FRAME_HEADER.size:
+        raise ProtocolError('truncated frame header')
+    version, length = FRAME_HEADER.unpack_from(view)
+    if version != PROTOCOL_VERSION or len(view) != FRAME_HEADER.size + length:
+        raise ProtocolError('invalid frame header')
+
+    records = {}
+    offset = FRAME_HEADER.size
+    while offset < len(view):
+        if offset + TLV_HEADER.size > len(view):
+            raise ProtocolError('truncated record header')
+        tlv_type, tlv_length = TLV_HEADER.unpack_from(view, offset)
+        offset += TLV_HEADER.size
+        if offset + tlv_length > len(view):
+            raise ProtocolError('truncated record value')
+        if tlv_type in TLV_NAMES:
+            try:
+                records[TLV_NAMES[tlv_type]] = str(view[offset:offset + tlv_length], 'utf-8')
+            except UnicodeDecodeError as exc:
+                raise ProtocolError('invalid record encoding') from exc
+        offset += tlv_length
+    return records
+
+
+def decode_legacy(value: bytes) -> dict:
+    """
+    Decode legacy `ssid=...&psk=...` wireless configuration
+    """
+    try:
+        parsed_values = urllib.parse.parse_qs(str(value, 'utf-8'))
+    except UnicodeDecodeError as exc:
+        raise ProtocolError('invalid encoding') from exc
+    return {key: values[0] for key, values in parsed_values.items() if values}
+
+
+def decode_wireless_configuration(value: bytes) -> dict:
+    """
+    Decode wireless configuration in framed or legacy format
+    """
+    if len(value) > 0 and value[0] == PROTOCOL_VERSION:
+        return decode_frame(value)
+    return decode_legacy(value)
+
+
+class WriteAssembler:
+    """
+    Reassemble long and prepared writes by writer
+    """
+
+    def __init__(self):
+        self.buffers = {}
+
+    def feed(self, writer: str, offset: int, value: bytes):
+        """
+        Add written chunk at offset, return the complete value or None if more chunks are expected
+        """
+        buffer = self.buffers.pop(writer, None) if offset > 0 else None
+        if buffer is None:
+            if offset > 0:
+                raise InvalidOffsetError()
+            buffer = bytearray()
+        if offset > len(buffer):
+            raise InvalidOffsetError()
+        if offset + len(value) > MAX_FRAME_LENGTH:
+            raise InvalidValueLengthError()
+
+        buffer[offset:] = value
+        if len(buffer) == 0 or buffer[0] != PROTOCOL_VERSION:
+            # legacy values are never split
+            return bytes(buffer)
+        if len(buffer) >= FRAME_HEADER.size:
+            _version, length = FRAME_HEADER.unpack_from(buffer)
+            if len(buffer) >= FRAME_HEADER.size + length:
+                return bytes(buffer[:FRAME_HEADER.size + length])
+
+        self.buffers[writer] = buffer
+        return None
+
+
+class ReadSnapshots:
+    """
+    Keep the value of long reads by reader so every chunk comes from the same value
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def read(self, reader: str, offset: int, mtu: int, get_value):
+        """
+        Get the value read from offset, it is taken from get_value at offset 0 and kept until its last chunk is read
+        """
+        value = get_value() if offset == 0 else self.values.get(reader)
+        if value is None or offset > len(value):
+            raise InvalidOffsetError()
+        # a read response carries up to mtu - 1 bytes
+        if offset + mtu - 1 < len(value):
+            self.values[reader] = value
+        else:
+            self.values.pop(reader, None)
+        return value
+
+
+ACCESS_POINT_HEADER = struct.Struct('>BBB')
+PAGE_HEADER = struct.Struct('>BB')
+AP_SECURED = 0x01
+
+
+def encode_access_points(access_points) -> bytes:
+    """
+    Encode (ssid, strength, secured) access points as strength, flags, SSID length and SSID records,
+    records that don't fit in `MAX_FRAME_LENGTH` are dropped
+    """
+    data = bytearray()
+    for ssid, strength, secured in access_points:
+        record = ACCESS_POINT_HEADER.pack(strength, AP_SECURED if secured else 0, len(ssid)) + ssid
+        if len(data) + len(record) > MAX_FRAME_LENGTH:
+            break
+        data += record
+    return bytes(data)
+
+
+def paginate(data: bytes, page_size: int) -> list:
+    """
+    Split data in pages of page_size bytes, each page starts with its index and the page count
+    """
+    chunk_size = page_size - PAGE_HEADER.size
+    view = memoryview(data)
+    count = max(1, -(-len(view) // chunk_size))
+    return [PAGE_HEADER.pack(index, count) + view[index * chunk_size:(index + 1) * chunk_size]
+            for index in range(count)]
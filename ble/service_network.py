@@ -1,23 +1,23 @@
-import urllib.parse
 import logging
-import functools
+import os
+import struct
 import dbus
-from gi.repository import GObject
-from NetworkManager import const, NetworkManager
-from ble.exceptions import InvalidArgsException
+import dbus.exceptions
+from gi.repository import GLib
+from . import protocol, metrics
 from .dbus import utility as dbus_util
-from .nm import utility as nm_util
+from .nm.common import deep_get
+from .nm.settings import ActiveConnectionSettings
+from .nm.provisioning import WirelessProvisioner
+from .nm.queue import ProvisioningQueue
+from .nm.activation import ActiveConnectionTracker
 from .constants import GATT_CHRC_IFACE
 from .gatt_server import Service, Characteristic, Descriptor
 
 logger = logging.getLogger('wfbt')
 
-
-def deep_get(dictionary, keys, default=None):
-    """
-    Retrieve value by key in deep object
-    """
-    return functools.reduce(lambda d, key: d.get(key, default) if isinstance(d, dict) else default, keys.split('.'), dictionary)
+# NM restarts are resynced from `NameOwnerChanged`, periodic resync is only needed if signals are lost otherwise
+STATE_RESYNC_SECONDS = int(os.environ.get('STATE_RESYNC_SECONDS', '0'))
 
 
 class NetworkService(Service):
@@ -26,31 +26,40 @@ class NetworkService(Service):
     """
     NETWORK_SVC_UUID = '22345678-1234-5678-1234-56789abcdef1'
 
-    def __init__(self, bus, index):
+    def __init__(self, bus, index, nm_state):
         Service.__init__(self, bus, index, self.NETWORK_SVC_UUID, True)
 
         logger.info(
-            f'initialize NM service: {self.NETWORK_SVC_UUID}')
+            'initialize NM service: %s', self.NETWORK_SVC_UUID)
 
         NETWORK_MANAGER_DEVICE_WIFI_STATE_CHRC_UUID = '32345678-1234-5678-1234-56781abcdee2'
         NETWORK_MANAGER_DEVICE_ETHERNET_STATE_CHRC_UUID = '42345678-1234-5678-1234-56781abcdee2'
 
+        provisioning_status = NetworkProvisioningStatusCharacteristic(bus, 6, self)
+
         self.add_characteristic(
-            NetworkManagerStateCharacteristic(bus, 1, self))
+            NetworkManagerStateCharacteristic(bus, 1, self, nm_state))
         self.add_characteristic(
-            NetworkWirelessConfigurationCharacteristic(bus, 2, self))
+            NetworkWirelessConfigurationCharacteristic(bus, 2, self, nm_state, provisioning_status))
         self.add_characteristic(
-            NetworkManagerDeviceStateCharacteristic(bus, 3, self, NETWORK_MANAGER_DEVICE_ETHERNET_STATE_CHRC_UUID, "ethernet"))
+            NetworkManagerDeviceStateCharacteristic(bus, 3, self, nm_state,
+                                                    NETWORK_MANAGER_DEVICE_ETHERNET_STATE_CHRC_UUID, "ethernet"))
         self.add_characteristic(
-            NetworkManagerDeviceStateCharacteristic(bus, 4, self, NETWORK_MANAGER_DEVICE_WIFI_STATE_CHRC_UUID, "wifi"))
+            NetworkManagerDeviceStateCharacteristic(bus, 4, self, nm_state,
+                                                    NETWORK_MANAGER_DEVICE_WIFI_STATE_CHRC_UUID, "wifi"))
+        self.add_characteristic(
+            NetworkWirelessScanCharacteristic(bus, 5, self, nm_state))
+        self.add_characteristic(provisioning_status)
 
 
 class NetworkManagerDeviceStateCharacteristic(Characteristic):
     """
     Device state characteristic
+    Expose device state and device state reason
     """
+    VALUE_LAYOUT = struct.Struct('BB')
 
-    def __init__(self, bus, index, service, uuid, device_type):  # pylint: disable=too-many-arguments
+    def __init__(self, bus, index, service, nm_state, uuid, device_type):  # pylint: disable=too-many-arguments
         Characteristic.__init__(
             self, bus, index,
             uuid,
@@ -58,7 +67,11 @@ class NetworkManagerDeviceStateCharacteristic(Characteristic):
             service)
 
         logger.info(
-            f'initialize NM {device_type} device state characteristic: {uuid}')
+            'initialize NM %s device state characteristic: %s', device_type, uuid)
+
+        self.device_type = device_type
+        self.nm_state = nm_state
+        self.active_connection = ActiveConnectionSettings(bus, nm_state.devices, device_type)
 
         # Add descriptors
         CONN_TYPE_DESC_UUID = '72345678-1234-5678-1234-56789abcdef2'
@@ -72,20 +85,31 @@ class NetworkManagerDeviceStateCharacteristic(Characteristic):
             NetworkManagerDeviceActiveConnectionDescriptor(bus, 2, CONN_UUID_DESC_UUID, self, device_type, 'connection.uuid'))
 
         # initialize value
-        self.device_type = device_type
         self.notifying = False
-        self.value = self.read_network_manager_device_state()
-        GObject.timeout_add(5000, self.notify_network_manager_device_state)
+        self.encoder = dbus_util.CachedByteArray(dbus_util.struct_to_byte_array(self.VALUE_LAYOUT))
+        self.value = self.encoder.encode([])
+        nm_state.add_device_listener(self.on_device_state_changed)
+        if STATE_RESYNC_SECONDS > 0:
+            self.add_periodic_task(STATE_RESYNC_SECONDS, self.resync_network_manager_device_state)
 
     def read_network_manager_device_state(self):
         """
         Read network manager device state
         """
-        device = nm_util.get_current_device(self.device_type)
-        if device is None:
-            return []
+        return self.nm_state.get_device_state(self.device_type)
 
-        return [device.StateReason[0], device.StateReason[1]]
+    def resync_network_manager_device_state(self):
+        """
+        Read device state from NM in case a signal was missed, listeners are called if it changed
+        """
+        self.nm_state.refresh_device_state(self.device_type)
+
+    def on_device_state_changed(self, path, _state):
+        """
+        Device state cache listener
+        """
+        if self.nm_state.devices.get_current_device_path(self.device_type) == path:
+            self.notify_network_manager_device_state()
 
     def notify_network_manager_device_state(self):
         """
@@ -94,45 +118,41 @@ class NetworkManagerDeviceStateCharacteristic(Characteristic):
         if self.notifying:
             new_value = self.read_network_manager_device_state()
             logger.debug(
-                f'notify NM device {self.device_type} state {repr(new_value)}')
-            self.value = new_value
+                'notify NM device %s state %r', self.device_type, new_value)
+            self.value = self.encoder.encode(new_value)
 
             # Notify only if value exist
             if len(new_value) == 2:
-                # TODO: Find a better way
-                self.PropertiesChanged(
-                    GATT_CHRC_IFACE, {'Value': [
-                        dbus.Byte(new_value[0]),
-                        dbus.Byte(new_value[1]),
-                    ]}, [])
-        return True
+                self.notify_value(self.value)
 
+    @metrics.instrumented
     def ReadValue(self, _options):
         """
         Read value
         """
-        self.value = self.read_network_manager_device_state()
-        logger.info(f"read NM device state: {repr(self.value)}")
+        state = self.read_network_manager_device_state()
+        self.value = self.encoder.encode(state)
+        logger.info('read NM device state: %r', state)
         return self.value
 
+    @metrics.instrumented
     def StartNotify(self):
         """
         Start notifying
         """
         logger.info(
-            f'start notifying NM device {self.device_type} state')
-        if not self.notifying:
-            self.notifying = True
+            'start notifying NM device %s state', self.device_type)
+        if self.start_notifying():
             self.notify_network_manager_device_state()
 
+    @metrics.instrumented
     def StopNotify(self):
         """
         Stop notifying
         """
         logger.info(
-            f'stop notifying NM device {self.device_type} state')
-        if self.notifying:
-            self.notifying = False
+            'stop notifying NM device %s state', self.device_type)
+        self.stop_notifying()
 
 
 class NetworkManagerDeviceActiveConnectionDescriptor(Descriptor):
@@ -144,30 +164,24 @@ class NetworkManagerDeviceActiveConnectionDescriptor(Descriptor):
         Descriptor.__init__(self, bus, index, uuid, ['read'], characteristic)
         self.device_type = device_type
         self.key = key
-        self.value = dbus_util.str_to_byte_array(
-            self.read_network_device_active_connection_setting())
+        self.encoder = dbus_util.CachedByteArray(dbus_util.str_to_byte_array)
+        self.value = self.encoder.encode('')
 
     def read_network_device_active_connection_setting(self):
         """
         Read network device active connection setting
         """
-        device = nm_util.get_current_device(self.device_type)
-        if device is not None:
-            active_conn = device.ActiveConnection
-            if active_conn is not None:
-                conn_sets = active_conn.Connection.GetSettings()
-                if conn_sets is not None:
-                    return deep_get(conn_sets, self.key, "")
-        return ""
+        return deep_get(self.chrc.active_connection.get_settings(), self.key, "")
 
+    @metrics.instrumented
     def ReadValue(self, _options):
         """
         Read value
         """
         set_value = self.read_network_device_active_connection_setting()
-        self.value = dbus_util.str_to_byte_array(set_value)
+        self.value = self.encoder.encode(set_value)
         logger.info(
-            f"read NM {self.device_type} device active connection setting {self.key}={set_value}")
+            'read NM %s device active connection setting %s=%s', self.device_type, self.key, set_value)
         return self.value
 
 
@@ -177,8 +191,9 @@ class NetworkManagerStateCharacteristic(Characteristic):
     Expose wireless enabled, networking enabled, connectivity state and network manager state
     """
     NETWORK_MANAGER_STATE_CHRC_UUID = '22345678-1234-5678-1234-56781abcdee2'
+    VALUE_LAYOUT = struct.Struct('BBBB')
 
-    def __init__(self, bus, index, service):
+    def __init__(self, bus, index, service, nm_state):
         Characteristic.__init__(
             self, bus, index,
             self.NETWORK_MANAGER_STATE_CHRC_UUID,
@@ -186,23 +201,33 @@ class NetworkManagerStateCharacteristic(Characteristic):
             service)
 
         # initialize value
+        self.nm_state = nm_state
         self.notifying = False
         logger.info(
-            f'initialize NM state characteristic: {self.NETWORK_MANAGER_STATE_CHRC_UUID}')
-        self.value = self.read_network_manager_state()
-        GObject.timeout_add(5000, self.notify_network_manager_state)
+            'initialize NM state characteristic: %s', self.NETWORK_MANAGER_STATE_CHRC_UUID)
+        self.encoder = dbus_util.CachedByteArray(dbus_util.struct_to_byte_array(self.VALUE_LAYOUT))
+        self.value = self.encoder.encode([])
+        nm_state.add_manager_listener(self.on_manager_state_changed)
+        if STATE_RESYNC_SECONDS > 0:
+            self.add_periodic_task(STATE_RESYNC_SECONDS, self.resync_network_manager_state)
 
     def read_network_manager_state(self):
         """
         Read network manager state
         """
-        wireless_enabled = NetworkManager.WirelessEnabled
-        networking_enabled = NetworkManager.NetworkingEnabled
-        connectivity = NetworkManager.Connectivity
-        state = NetworkManager.State
-        logger.info(
-            f"""NM state: wireless enabled: {wireless_enabled}, networking enabled: {networking_enabled}, connectivity state: {const('connectivity', connectivity)}, state: {const('state', state)}""")  # pylint: disable=line-too-long
-        return [wireless_enabled, networking_enabled, connectivity, state]
+        return self.nm_state.get_manager_state()
+
+    def resync_network_manager_state(self):
+        """
+        Read network manager state from NM in case a signal was missed, listeners are called if it changed
+        """
+        self.nm_state.refresh_manager_state()
+
+    def on_manager_state_changed(self, _state):
+        """
+        Network manager state cache listener
+        """
+        self.notify_network_manager_state()
 
     def notify_network_manager_state(self):
         """
@@ -210,41 +235,36 @@ class NetworkManagerStateCharacteristic(Characteristic):
         """
         if self.notifying:
             new_value = self.read_network_manager_state()
-            logger.debug(f'notify NM state {repr(new_value)}')
-            self.value = new_value
-            # TODO: Find a better way
-            self.PropertiesChanged(
-                GATT_CHRC_IFACE, {'Value': [
-                    dbus.Byte(new_value[0]),
-                    dbus.Byte(new_value[1]),
-                    dbus.Byte(new_value[2]),
-                    dbus.Byte(new_value[3])]}, [])
-        return True
+            logger.debug('notify NM state %r', new_value)
+            self.value = self.encoder.encode(new_value)
+            self.notify_value(self.value)
 
+    @metrics.instrumented
     def ReadValue(self, _options):
         """
         Read value
         """
-        self.value = self.read_network_manager_state()
-        logger.info(f"read NM state: {repr(self.value)}")
+        state = self.read_network_manager_state()
+        self.value = self.encoder.encode(state)
+        logger.info('read NM state: %r', state)
         return self.value
 
+    @metrics.instrumented
     def StartNotify(self):
         """
         Start notifying
         """
         logger.info('start notifying NM state')
-        if not self.notifying:
-            self.notifying = True
+        if self.start_notifying():
             self.notify_network_manager_state()
 
+    @metrics.instrumented
     def StopNotify(self):
         """
         Stop notifying
         """
         logger.info('stop notifying NM state')
-        if self.notifying:
-            self.notifying = False
+        self.stop_notifying()
 
 
 class NetworkWirelessConfigurationCharacteristic(Characteristic):
@@ -253,50 +273,294 @@ class NetworkWirelessConfigurationCharacteristic(Characteristic):
     """
     CHRC_UUID = '97345678-1234-5678-1234-56781abddee2'
 
-    def __init__(self, bus, index, service):
+    def __init__(self, bus, index, service, nm_state, provisioning_status):  # pylint: disable=too-many-arguments
         Characteristic.__init__(
             self, bus, index,
             self.CHRC_UUID,
             ['write'], # TODO: secure-write must be enabled
             service)
 
+        self.nm_state = nm_state
+        self.provisioning_status = provisioning_status
+        self.queue = ProvisioningQueue(WirelessProvisioner(bus, nm_state))
+        self.assembler = protocol.WriteAssembler()
         self.value = []
         logger.info(
-            f'initialize NM network configuration characteristic: {self.CHRC_UUID}')
+            'initialize NM network configuration characteristic: %s', self.CHRC_UUID)
 
-    def WriteValue(self, value, _options):
+    @dbus.service.method(GATT_CHRC_IFACE, in_signature='aya{sv}', byte_arrays=True,
+                         async_callbacks=('reply_handler', 'error_handler'))
+    @metrics.instrumented
+    def WriteValue(self, value, options, reply_handler, error_handler):  # pylint: disable=arguments-differ
         """
         Write value
-        it would be better to serialize wifi configuration value like this :
-        https://github.com/zxing/zxing/wiki/Barcode-Contents#wi-fi-network-config-android-ios-11
+        The write is acknowledged before NM is configured, configurations of every central
+        are applied one at a time through the queue, the last writer wins
+        Long values are reassembled from the write offsets, see `ble.protocol` for the format
+        """
+        device = str(options.get('device', ''))
+        logger.info('write value to network wireless configuration from %s', device)
+        try:
+            value = self.assembler.feed(device, int(options.get('offset', 0)), value)
+            if value is None:
+                reply_handler()
+                return
+            config = protocol.decode_wireless_configuration(value)
+        except protocol.ProtocolError as exc:
+            error_handler(dbus.exceptions.DBusException(str(exc), name=exc.dbus_error_name))
+            return
+
+        ssid = config.get('ssid')
+        psk = config.get('psk')
+        logger.debug('SSID: %s', ssid)
+
+        reply_handler()
+        if ssid and not psk:
+            logger.warning('missing psk for ssid %s, wireless configuration ignored', ssid)
+            return
+        self.provisioning_status.start(device)
+        self.queue.submit(device, ssid, psk, self.on_applied, self.on_apply_error, self.provisioning_status.superseded)
+
+    def on_applied(self, device, result, active_path):
+        """
+        Wireless configuration applied callback
         """
-        logger.info('write value to network wireless configuration')
+        logger.info('wireless configuration of %s %s, active connection: %s', device, result, active_path)
+        self.provisioning_status.applied(device, result, active_path)
+
+    def on_apply_error(self, device, error):
+        """
+        Wireless configuration error callback
+        """
+        logger.error('failed to apply wireless configuration of %s: %s', device, error)
+        self.provisioning_status.failed(device)
+
+
+class NetworkWirelessScanCharacteristic(Characteristic):
+    """
+    Nearby wireless networks
+    Served from the scan cache, stale results trigger a background scan
+    and subscribers are notified with the new results in MTU sized pages.
+    Long reads are served from the results read at offset 0 so they can't change between chunks
+    """
+    CHRC_UUID = '52345678-1234-5678-1234-56781abcdee2'
+    DEFAULT_MTU = 23
+    ATT_HEADER_SIZE = 3
+
+    def __init__(self, bus, index, service, nm_state):
+        Characteristic.__init__(
+            self, bus, index,
+            self.CHRC_UUID,
+            ['read', 'notify'],
+            service)
+
+        self.nm_state = nm_state
+        self.mtu = self.DEFAULT_MTU
+        self.snapshots = protocol.ReadSnapshots()
+        self.encoder = dbus_util.CachedByteArray(
+            lambda access_points: dbus_util.to_byte_array(protocol.encode_access_points(access_points)))
+        self.value = self.encoder.encode([])
+        logger.info(
+            'initialize NM wireless scan characteristic: %s', self.CHRC_UUID)
+        nm_state.scan.add_listener(self.on_scan_completed)
+
+    def on_scan_completed(self, access_points):
+        """
+        Scan cache listener
+        """
+        self.value = self.encoder.encode(access_points)
+        self.notify_access_points()
+
+    def notify_access_points(self):
+        """
+        Notify access points in pages
+        """
+        if not self.notifying:
+            return
+        pages = protocol.paginate(self.value, self.mtu - self.ATT_HEADER_SIZE)
+        logger.debug('notify wireless scan in %s pages', len(pages))
+        for page in pages:
+            self.PropertiesChanged(GATT_CHRC_IFACE, {'Value': dbus_util.to_byte_array(page)}, [])
+
+    @metrics.instrumented
+    def ReadValue(self, options):
+        """
+        Read value, long reads are served from the offset
+        """
+        if 'mtu' in options:
+            self.mtu = int(options['mtu'])
+        offset = int(options.get('offset', 0))
+        logger.info('read wireless scan from offset %s', offset)
         try:
-            parsed_values = urllib.parse.parse_qs(
-                ''.join([str(v) for v in value]))
-
-            # TODO: Better extraction of values
-            ssid = deep_get(parsed_values, 'ssid', None)
-            if ssid is not None:
-                logger.debug(f"SSID: {ssid}")
-                if len(ssid) >= 1:
-                    ssid = ssid[0]
-
-            psk = deep_get(parsed_values, 'psk', None)
-            if psk is not None:
-                logger.debug(f"password: {psk}")
-                if len(psk) >= 1:
-                    psk = psk[0]
-
-            # TODO: Better handling of wireless connections instead of nuking them
-            wireless_connections = nm_util.get_all_wireless_connections()
-            for conn in wireless_connections:
-                conn_uuid = conn.GetSettings()['connection']['uuid']
-                nm_util.delete_network_connection_by_uuid(conn_uuid)
-
-            # TODO: Better handling of networking configuration
-            if ssid != "" and psk != "":
-                nm_util.add_wireless_connection(ssid, psk)
-
-        except TypeError as exc:
-            raise InvalidArgsException() from exc
+            value = self.snapshots.read(str(options.get('device', '')), offset, self.mtu, self.read_access_points)
+        except protocol.ProtocolError as exc:
+            raise dbus.exceptions.DBusException(str(exc), name=exc.dbus_error_name) from exc
+        return value if offset == 0 else dbus_util.to_byte_array(value[offset:])
+
+    def read_access_points(self):
+        """
+        Encode cached access points
+        """
+        self.value = self.encoder.encode(self.nm_state.scan.get_access_points())
+        return self.value
+
+    @metrics.instrumented
+    def StartNotify(self):
+        """
+        Start notifying, cached results are sent right away
+        """
+        logger.info('start notifying wireless scan')
+        if self.start_notifying():
+            access_points = self.nm_state.scan.get_access_points()
+            if self.nm_state.scan.is_fresh():
+                self.on_scan_completed(access_points)
+
+    @metrics.instrumented
+    def StopNotify(self):
+        """
+        Stop notifying
+        """
+        logger.info('stop notifying wireless scan')
+        self.stop_notifying()
+
+
+class ProvisioningSession:
+    """
+    Provisioning status of the last wireless configuration written by a central
+    """
+
+    def __init__(self, device: str, value):
+        self.device = device
+        self.value = value
+        self.start_time = None
+        self.tracker = None
+
+    def stop_tracking(self):
+        """
+        Stop following the active connection
+        """
+        if self.tracker is not None:
+            self.tracker.stop()
+            self.tracker = None
+
+
+class NetworkProvisioningStatusCharacteristic(Characteristic):
+    """
+    Progress of the last wireless configuration
+    Expose the event, the state, the reason and the elapsed milliseconds since the write,
+    subscribers are notified of every activation step of the new active connection
+
+    Every central has its own session keyed by its BlueZ device path, reads return
+    the status of the reading central and notifications the status of the last update
+    """
+    CHRC_UUID = '62345678-1234-5678-1234-56781abcdee2'
+    VALUE_LAYOUT = struct.Struct('>BBBI')
+    MAX_SESSIONS = 16
+
+    EVENT_IDLE = 0x00
+    EVENT_ACCEPTED = 0x01
+    EVENT_APPLIED = 0x02
+    EVENT_ACTIVATION = 0x03
+    EVENT_TIMEOUT = 0x04
+    EVENT_FAILED = 0x05
+    EVENT_SUPERSEDED = 0x06
+    APPLY_RESULTS = ['unchanged', 'updated', 'added', 'removed']
+
+    def __init__(self, bus, index, service):
+        Characteristic.__init__(
+            self, bus, index,
+            self.CHRC_UUID,
+            ['read', 'notify'],
+            service)
+
+        self.sessions = {}
+        self.encoder = dbus_util.struct_to_byte_array(self.VALUE_LAYOUT)
+        self.value = self.encoder([self.EVENT_IDLE, 0, 0, 0])
+        logger.info(
+            'initialize NM provisioning status characteristic: %s', self.CHRC_UUID)
+
+    def get_session(self, device: str):
+        """
+        Get session of a central, the oldest session is dropped when there are too many
+        """
+        session = self.sessions.pop(device, None)
+        if session is None:
+            session = ProvisioningSession(device, self.encoder([self.EVENT_IDLE, 0, 0, 0]))
+            if len(self.sessions) >= self.MAX_SESSIONS:
+                oldest = self.sessions.pop(next(iter(self.sessions)))
+                oldest.stop_tracking()
+        self.sessions[device] = session
+        return session
+
+    def start(self, device: str):
+        """
+        Wireless configuration of a central accepted
+        """
+        session = self.get_session(device)
+        session.stop_tracking()
+        session.start_time = GLib.get_monotonic_time()
+        self.update(session, self.EVENT_ACCEPTED)
+
+    def applied(self, device: str, result: str, active_path):
+        """
+        Wireless configuration applied, follow the activation of the active connection if any
+        """
+        session = self.get_session(device)
+        # a previous configuration of the central may still be tracked
+        session.stop_tracking()
+        self.update(session, self.EVENT_APPLIED, self.APPLY_RESULTS.index(result))
+        if active_path is not None:
+            session.tracker = ActiveConnectionTracker(
+                self.bus, active_path,
+                lambda state, reason: self.update(session, self.EVENT_ACTIVATION, state, reason),
+                lambda: self.update(session, self.EVENT_TIMEOUT))
+
+    def failed(self, device: str):
+        """
+        Wireless configuration failed
+        """
+        self.update(self.get_session(device), self.EVENT_FAILED)
+
+    def superseded(self, device: str):
+        """
+        Wireless configuration replaced by a newer one before being applied
+        """
+        self.update(self.get_session(device), self.EVENT_SUPERSEDED)
+
+    def update(self, session: ProvisioningSession, event: int, state: int = 0, reason: int = 0):  # pylint: disable=too-many-arguments
+        """
+        Store and notify status, every step is notified so the notification queue is bypassed
+        """
+        elapsed_ms = 0 if session.start_time is None else (GLib.get_monotonic_time() - session.start_time) // 1000
+        session.value = self.encoder([event, state, min(reason, 0xff), min(elapsed_ms, 0xffffffff)])
+        self.value = session.value
+        logger.debug('provisioning status of %s event: %s, state: %s, reason: %s, elapsed: %sms',
+                     session.device, event, state, reason, elapsed_ms)
+        if self.notifying:
+            self.PropertiesChanged(GATT_CHRC_IFACE, {'Value': self.value}, [])
+
+    @metrics.instrumented
+    def ReadValue(self, options):
+        """
+        Read value, the status of the reading central if it has a session
+        """
+        device = str(options.get('device', ''))
+        logger.info('read NM provisioning status from %s', device)
+        session = self.sessions.get(device)
+        return self.value if session is None else session.value
+
+    @metrics.instrumented
+    def StartNotify(self):
+        """
+        Start notifying
+        """
+        logger.info('start notifying NM provisioning status')
+        self.start_notifying()
+
+    @metrics.instrumented
+    def StopNotify(self):
+        """
+        Stop notifying
+        """
+        logger.info('stop notifying NM provisioning status')
+        self.stop_notifying()
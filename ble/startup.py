@@ -0,0 +1,37 @@
+"""
+Startup timing, phases are measured from the import of this module
+"""
+import logging
+import time
+
+logger = logging.getLogger('wfbt')
+
+STARTED_AT = time.monotonic()
+
+phases = []
+
+
+def elapsed_ms() -> float:
+    """
+    Get milliseconds elapsed since start
+    """
+    return (time.monotonic() - STARTED_AT) * 1000
+
+
+def mark(phase: str):
+    """
+    Record the end of a startup phase
+    """
+    phases.append((phase, elapsed_ms()))
+
+
+def log_summary():
+    """
+    Log duration of every recorded phase
+    """
+    previous = 0.0
+    parts = []
+    for phase, at in phases:
+        parts.append(f'{phase}: {at - previous:.1f} ms')
+        previous = at
+    logger.info('startup phases: %s, total: %.1f ms', ', '.join(parts), previous)
@@ -0,0 +1,183 @@
+"""
+GLib main loop lag monitor feeding the systemd watchdog
+
+A probe timer measures how late the main loop runs it, durations of exported DBus methods and
+blocking NM calls are recorded per callback to name the worst offenders when the loop lags.
+`WATCHDOG=1` stops being sent to systemd once several probes in a row lag above the threshold.
+The monitor only runs when the systemd watchdog or the stall exit is configured
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from gi.repository import GLib
+
+logger = logging.getLogger('wfbt')
+
+# Probe interval, shortened to half the systemd watchdog timeout
+LOOP_LAG_INTERVAL_SECONDS = int(os.environ.get('LOOP_LAG_INTERVAL_SECONDS', '5'))
+# Above the up to 1 s delay of second-based timers
+LOOP_LAG_THRESHOLD_MS = int(os.environ.get('LOOP_LAG_THRESHOLD_MS', '2000'))
+# Consecutive lagging probes before the systemd watchdog stops being pinged, a single short stall is tolerated
+LOOP_LAG_UNHEALTHY_PROBES = int(os.environ.get('LOOP_LAG_UNHEALTHY_PROBES', '3'))
+# Exit when the loop did not run the probe for that long so docker restarts the container, 0 disables it
+LOOP_STALL_EXIT_SECONDS = int(os.environ.get('LOOP_STALL_EXIT_SECONDS', '0'))
+
+WORST_CALLBACKS = 5
+
+
+def sd_notify(state: str):
+    """
+    Send state to systemd, return False if not run by systemd with a notify socket
+    """
+    address = os.environ.get('NOTIFY_SOCKET')
+    if not address:
+        return False
+    if address.startswith('@'):
+        address = '\0' + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall(state.encode('ascii'))
+        return True
+    except OSError as error:
+        logger.debug('sd_notify %s failed: %s', state, error)
+        return False
+
+
+def get_watchdog_usec():
+    """
+    Get systemd watchdog timeout in µs, 0 if the watchdog is not enabled for this process
+    """
+    watchdog_pid = os.environ.get('WATCHDOG_PID')
+    if watchdog_pid and int(watchdog_pid) != os.getpid():
+        return 0
+    return int(os.environ.get('WATCHDOG_USEC', '0'))
+
+
+ENABLED = get_watchdog_usec() > 0 or LOOP_STALL_EXIT_SECONDS > 0
+
+
+class LoopMonitor:
+    """
+    Measure main loop scheduling delay and the callbacks blocking it
+    """
+
+    def __init__(self, interval_seconds: int = LOOP_LAG_INTERVAL_SECONDS, threshold_ms: int = LOOP_LAG_THRESHOLD_MS):
+        self.interval_ms = interval_seconds * 1000
+        self.threshold_ms = threshold_ms
+        self.callbacks = {}
+        self.expected_time = None
+        self.last_probe_time = None
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.unhealthy_probes = 0
+        self.watchdog = False
+
+    def record_callback(self, name: str, seconds: float):
+        """
+        Record time spent on the main loop by a callback as [calls, slow calls, worst ms]
+        """
+        elapsed_ms = seconds * 1000
+        stats = self.callbacks.setdefault(name, [0, 0, 0.0])
+        stats[0] += 1
+        stats[2] = max(stats[2], elapsed_ms)
+        if elapsed_ms >= self.threshold_ms:
+            stats[1] += 1
+            logger.warning('%s blocked the main loop for %.1f ms', name, elapsed_ms)
+
+    def get_worst_callbacks(self, count: int = WORST_CALLBACKS):
+        """
+        Get (name, calls, slow calls, worst ms) of the callbacks that blocked the loop the longest
+        """
+        worst = sorted(self.callbacks.items(), key=lambda item: item[1][2], reverse=True)[:count]
+        return [(name, calls, slow, worst_ms) for name, (calls, slow, worst_ms) in worst]
+
+    def is_healthy(self):
+        """
+        Check if the last probe ran in time
+        """
+        return self.last_lag_ms < self.threshold_ms
+
+    def start(self):
+        """
+        Arm the probe and the systemd watchdog
+        """
+        watchdog_usec = get_watchdog_usec()
+        if watchdog_usec:
+            # probe and ping twice per watchdog timeout
+            self.watchdog = True
+            self.interval_ms = min(self.interval_ms, max(1, watchdog_usec // 2000))
+            logger.info('systemd watchdog enabled, timeout: %d ms', watchdog_usec // 1000)
+        if LOOP_STALL_EXIT_SECONDS > 0:
+            # probe at least twice per stall timeout
+            self.interval_ms = min(self.interval_ms, max(1, LOOP_STALL_EXIT_SECONDS * 500))
+
+        self.last_probe_time = GLib.get_monotonic_time()
+        self.expected_time = self.last_probe_time + self.interval_ms * 1000
+        if self.interval_ms % 1000 == 0:
+            # grouped with the other second-based timers
+            GLib.timeout_add_seconds(self.interval_ms // 1000, self.probe)
+        else:
+            GLib.timeout_add(self.interval_ms, self.probe)
+
+        if LOOP_STALL_EXIT_SECONDS > 0:
+            threading.Thread(target=self.watch_stall, args=(LOOP_STALL_EXIT_SECONDS,), daemon=True).start()
+
+    def probe(self):
+        """
+        Probe timer, measure how late it runs and ping the watchdog
+        until `LOOP_LAG_UNHEALTHY_PROBES` probes in a row lagged
+        """
+        now = GLib.get_monotonic_time()
+        self.last_lag_ms = max(0.0, (now - self.expected_time) / 1000)
+        self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+        self.last_probe_time = now
+        self.expected_time = now + self.interval_ms * 1000
+
+        if self.is_healthy():
+            self.unhealthy_probes = 0
+        else:
+            self.unhealthy_probes += 1
+            logger.warning('main loop lagged %.1f ms (%d in a row), worst callbacks: %r',
+                           self.last_lag_ms, self.unhealthy_probes, self.get_worst_callbacks())
+        if self.watchdog and self.unhealthy_probes < LOOP_LAG_UNHEALTHY_PROBES:
+            sd_notify('WATCHDOG=1')
+        return True
+
+    def watch_stall(self, timeout: int):
+        """
+        Background thread exiting the process once the probe stopped running for timeout seconds
+        """
+        while True:
+            time.sleep(self.interval_ms / 1000)
+            stalled_ms = (GLib.get_monotonic_time() - self.last_probe_time) / 1000
+            if stalled_ms >= timeout * 1000:
+                logger.critical('main loop stalled for %.1f ms, worst callbacks: %r, exiting',
+                                stalled_ms, self.get_worst_callbacks())
+                # let the writer thread flush the record
+                time.sleep(1)
+                os._exit(1)  # pylint: disable=protected-access
+
+
+monitor = LoopMonitor()
+
+
+def record_callback(name: str, seconds: float):
+    """
+    Record time spent on the main loop by a callback when the monitor is enabled
+    """
+    if ENABLED:
+        monitor.record_callback(name, seconds)
+
+
+def watchdog_main():
+    """
+    Tell systemd the service is ready and start the loop monitor when it is configured
+    """
+    sd_notify('READY=1')
+    if ENABLED:
+        monitor.start()
+        return monitor
+    return None
@@ -1,20 +1,146 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import time
 
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# 'text' or 'json' for one JSON object per line
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+# Records waiting for the writer thread, records are dropped when it is full
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+# Records of a same message below WARNING kept per interval, 0 disables sampling
+LOG_SAMPLE_BURST = int(os.environ.get('LOG_SAMPLE_BURST', '10'))
+LOG_SAMPLE_INTERVAL_SECONDS = float(os.environ.get('LOG_SAMPLE_INTERVAL_SECONDS', '10'))
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as JSON objects
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep at most `burst` records of a same message per interval
+
+    Messages are told apart by their unformatted template, the first record of the next interval
+    carries how many were dropped in its `suppressed` attribute. Warnings and errors are never sampled,
+    windows idle for two intervals are dropped along with their count
+    """
+
+    def __init__(self, burst: int = LOG_SAMPLE_BURST, interval: float = LOG_SAMPLE_INTERVAL_SECONDS):
+        logging.Filter.__init__(self)
+        self.burst = burst
+        self.interval = interval
+        self.windows = {}
+        self.last_prune = time.monotonic()
+
+    def prune(self, now: float):
+        """
+        Drop windows idle for two intervals
+        """
+        self.last_prune = now
+        self.windows = {key: window for key, window in self.windows.items() if now - window[0] < 2 * self.interval}
+
+    def filter(self, record):
+        if self.burst <= 0 or record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        if now - self.last_prune >= self.interval:
+            self.prune(now)
+        started, count, suppressed = self.windows.get(key, (now, 0, 0))
+        if now - started >= self.interval:
+            if suppressed:
+                record.suppressed = suppressed
+            started, count, suppressed = now, 0, 0
+
+        if count >= self.burst:
+            self.windows[key] = (started, count, suppressed + 1)
+            return False
+        self.windows[key] = (started, count + 1, suppressed)
+        return True
+
+
+EXCEPTION_FORMATTER = logging.Formatter()
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue records for the writer thread without waiting for room
+
+    Records dropped by the level or the sampling filter are never formatted, the message of the others
+    is merged with its arguments and the sampling count here, while they cannot change, the writer thread
+    only serializes it
+    """
+
+    def __init__(self, log_queue):
+        logging.handlers.QueueHandler.__init__(self, log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            record.msg = f'{record.msg} ({suppressed} similar messages suppressed)'
+        if record.exc_info:
+            record.exc_text = EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': record.name, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': '%d log records dropped, log queue full', 'args': (self.dropped,),
+                }))
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
 
 def setup_custom_logger(name):
     """
-    Setup custom logger
+    Setup custom logger, records are written to stderr by a background thread
     """
-    formatter = logging.Formatter(
-        fmt='%(asctime)s - %(levelname)s - %(message)s', datefmt="%Y-%m-%d %H:%M:%S")
+    if LOG_FORMAT == 'json':
+        formatter = JsonFormatter(datefmt="%Y-%m-%d %H:%M:%S")
+    else:
+        formatter = logging.Formatter(
+            fmt='%(asctime)s - %(levelname)s - %(message)s', datefmt="%Y-%m-%d %H:%M:%S")
 
     handler = logging.StreamHandler()
     handler.setFormatter(formatter)
 
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+
     logger = logging.getLogger(name)
     logger.setLevel(LOG_LEVEL)
-    logger.addHandler(handler)
+    logger.addHandler(queue_handler)
     return logger
@@ -1,36 +1,101 @@
 #!/usr/bin/env python3
+import os
 import signal
-import dbus
-from gi.repository import GLib
+# imported first, it records the start time
+from ble import startup
 import log
-from ble.adapter import Adapter
-from ble.advertising_main import advertising_main
-from ble.gatt_server_main import gatt_server_main
-from ble.agent_main import agent_main
-import os
 
-if __name__ == "__main__":
-    logger = log.setup_custom_logger('wfbt')
-    logger.info('wfbt started')
+
+def glib_services(loop, bus, adapter_alias):
+    """
+    Setup adapters, NM state cache and BLE services, return the adapters and the advertising manager
+    """
+    # engine modules are imported once the engine is selected, pylint: disable=import-outside-toplevel
+    from ble.adapters import AdapterManager
+    from ble.advertising_main import advertising_main
+    from ble.gatt_server_main import gatt_server_main
+    from ble.agent_main import agent_main
+    from ble.nm.state import NetworkManagerStateCache
+    startup.mark('service imports')
+
+    # Setup every adapter, property changes are sent without waiting for replies
+    adapters = AdapterManager(bus, adapter_alias)
+    startup.mark('adapters')
+
+    # Setup network manager state cache, NM states are read in the background
+    nm_state = NetworkManagerStateCache(bus)
+    startup.mark('nm state')
+
+    # Setup BLE services, registrations are sent concurrently and complete in the main loop
+    advertising = advertising_main(loop, bus, adapters, nm_state)
+    gatt_server_main(loop, bus, adapters, nm_state)
+    agent_main(loop, bus)
+    startup.mark('registrations')
+    return adapters, advertising
+
+
+def glib_main(adapter_alias):
+    """
+    dbus-python engine running on the GLib main loop
+    """
+    # engine modules are imported once the engine is selected, pylint: disable=import-outside-toplevel
+    import dbus
+    import dbus.mainloop.glib
+    from gi.repository import GLib
+    from ble.metrics import metrics_main
+    from ble.watchdog import watchdog_main
+    startup.mark('imports')
 
     # GLib main loop configuration
     dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
     bus = dbus.SystemBus()
     loop = GLib.MainLoop()
+    startup.mark('bus')
 
-    # Setup adapter
-    adapter_alias = os.getenv("ADAPTER_ALIAS")
-    adapter = Adapter(bus, adapter_alias)
+    adapters, _advertising = glib_services(loop, bus, adapter_alias)
 
-    # Setup BLE services
-    advertising_main(loop, bus, adapter)
-    gatt_server_main(loop, bus, adapter)
-    agent_main(loop, bus)
+    # Serve metrics when METRICS_SOCKET is set
+    _metrics_server = metrics_main()
 
     # Trap sigint signal for program termination
     def ex(_sig, _frame):
-        adapter.disable_adapter()
+        adapters.disable_adapters()
         loop.quit()
     signal.signal(signal.SIGINT, ex)
 
+    startup.log_summary()
+
+    # Monitor main loop lag and feed the systemd watchdog while it is healthy
+    _loop_monitor = watchdog_main()
     loop.run()
+
+
+def asyncio_main(adapter_alias):
+    """
+    dbus-next engine running on asyncio
+    """
+    # engine modules are imported once the engine is selected, pylint: disable=import-outside-toplevel
+    import asyncio
+    from ble.aio.main import aio_main
+
+    asyncio.run(aio_main(adapter_alias))
+
+
+def main():
+    """
+    Run the engine selected by `BLE_ENGINE`
+    """
+    logger = log.setup_custom_logger('wfbt')
+
+    adapter_alias = os.getenv("ADAPTER_ALIAS")
+    ble_engine = os.getenv("BLE_ENGINE", "glib")
+    logger.info('wfbt started with %s engine', ble_engine)
+
+    if ble_engine == "asyncio":
+        asyncio_main(adapter_alias)
+    else:
+        glib_main(adapter_alias)
+
+
+if __name__ == "__main__":
+    main()